@@ -38,7 +38,7 @@ setup(
     ],
     entry_points={
         "console_scripts": [
-            "cocktail = cocktail.ui.__main__:main",
+            "cocktail = cocktail.cli.__main__:main",
         ],
     },
     extras_require={
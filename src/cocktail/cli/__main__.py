@@ -0,0 +1,251 @@
+"""
+Headless command line interface.
+
+    cocktail sync [--period Day|Week|Month|Year|AllTime]
+    cocktail query [text] [--type TYPE] [--tag TAG ...] [--limit N] [--after CURSOR]
+    cocktail maintenance [--images-per-version N]
+    cocktail serve [--host HOST] [--port PORT] [--workers N]
+
+Runs on a QCoreApplication and only imports cocktail.core, so that it starts
+quickly and runs without a display, from cron for instance. Any other arguments
+start the gui. sync exits with 1 when a page could not be fetched, parsed or
+stored, so a scheduled sync can be retried.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+COMMANDS = ["sync", "query", "maintenance", "serve"]
+
+# leave a core for the writer.
+PARSE_PROCESSES = min(max((os.cpu_count() or 1) - 1, 0), 4)
+
+logger = logging.getLogger("cocktail.cli")
+
+
+def _application():
+    from PySide6 import QtCore
+
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    app.setApplicationName("Cocktail")
+    return app
+
+
+def _model_json(model) -> dict:
+    data = model._asdict()
+    # descriptions are kept compressed apart from the model row.
+    data.pop("description")
+    return data
+
+
+def sync(args) -> int:
+    """
+    bring the database up to date with the api, as the gui does on startup.
+    """
+    from cocktail.core.database import api as db_api, connections, data_classes
+    from cocktail.core.database import migrations
+    from cocktail.core.database.writer import DatabaseWriter
+    from cocktail.core.providers.model_data import ModelDataProvider
+
+    app = _application()
+    registry = connections.get_registry(args.database)
+    if not os.path.exists(registry.filepath):
+        logger.warning(f"no database at {registry.filepath}, syncing every model")
+
+    provider = ModelDataProvider(parse_processes=args.parse_processes)
+    writer = DatabaseWriter(provider.queue, registry.filepath)
+    try:
+        connection = writer.open()
+        version = db_api.get_schema_version(connection)
+        if not migrations.can_migrate(version):
+            logger.error(f"cannot migrate schema version {version}")
+            return 1
+        migrations.migrate(connection)
+        high_water_mark = db_api.get_high_water_mark(connection)
+        refresh_period = db_api.get_refresh_period(connection)
+        # the writer connection is removed on close, it must not be referenced.
+        del connection
+
+        provider.pageReady.connect(writer.processQueue)
+        provider.endRequest.connect(writer.finish)
+        writer.pageCommitted.connect(provider.resume)
+        writer.pageFailed.connect(provider.resume)
+        writer.finished.connect(app.quit)
+
+        if args.period:
+            provider.requestModelData(data_classes.Period(args.period))
+        elif refresh_period is not None:
+            # the incremental sync misses updates to older models, see
+            # ModelDataProvider.requestModelUpdates.
+            logger.info(f"refreshing models updated within {refresh_period.value}")
+            writer.beginRefresh()
+            provider.requestModelData(refresh_period)
+        else:
+            if high_water_mark is None:
+                # a sync of every model is a refresh of its own.
+                writer.beginRefresh()
+            provider.requestModelUpdates(high_water_mark)
+
+        app.exec()
+    finally:
+        provider.shutdown()
+        writer.close()
+
+    if provider.failed:
+        logger.error("sync failed, some pages could not be fetched or parsed")
+        return 1
+    if writer.failed_pages:
+        logger.error(f"sync failed, {writer.failed_pages} pages could not be stored")
+        return 1
+
+    return 0
+
+
+def query(args) -> int:
+    """
+    print the models matching the search filters as json.
+    """
+    from cocktail.core.database import connections, search
+
+    _application()
+    try:
+        connection = connections.get_registry(args.database).reader()
+    except RuntimeError as error:
+        logger.error(str(error))
+        return 1
+
+    models, cursor = search.search_models(
+        connection,
+        args.limit,
+        after=json.loads(args.after) if args.after else None,
+        text=args.text,
+        model_type=args.type,
+        category=args.category,
+        base_model=args.base_model,
+        nsfw=args.nsfw,
+        tags=args.tag,
+        tag_mode=args.tag_mode,
+        creator_id=args.creator_id,
+        sort_order=args.sort,
+    )
+    result = {
+        "count": len(models),
+        "models": [_model_json(model) for model in models],
+        "next": cursor,
+    }
+    json.dump(result, sys.stdout, indent=2 if args.indent else None)
+    sys.stdout.write("\n")
+    return 0
+
+
+def maintenance(args) -> int:
+    """
+    run the database maintenance steps and print the report as json.
+    """
+    from cocktail.core.database import connections, maintenance as db_maintenance
+
+    _application()
+    connection = connections.get_registry(args.database).writer()
+    steps = db_maintenance.retention_steps(args.images_per_version)
+    report = db_maintenance.run_maintenance(connection, steps + db_maintenance.STEPS)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+def serve(args) -> int:
+    """
+    serve a local json api over the database, see cocktail.core.http.server.
+    """
+    from cocktail.core.http import server
+
+    _application()
+    try:
+        server.serve(args.database, args.host, args.port, workers=args.workers)
+    except (OSError, RuntimeError) as error:
+        logger.error(str(error))
+        return 1
+
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cocktail", description="Headless cocktail commands."
+    )
+    parser.add_argument("--debug", action="store_true")
+    parser.add_argument(
+        "--database", help="database file, the default database when not given"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help=sync.__doc__.strip())
+    sync_parser.add_argument(
+        "--period",
+        choices=["Day", "Week", "Month", "Year", "AllTime"],
+        help="sync every model updated within the period instead of new models",
+    )
+    sync_parser.add_argument("--parse-processes", type=int, default=PARSE_PROCESSES)
+    sync_parser.set_defaults(run=sync)
+
+    query_parser = subparsers.add_parser("query", help=query.__doc__.strip())
+    query_parser.add_argument("text", nargs="?", default="")
+    query_parser.add_argument("--type", default="All")
+    query_parser.add_argument("--category", default="All")
+    query_parser.add_argument("--base-model", default="All")
+    query_parser.add_argument("--nsfw", type=int, help="maximum nsfw level")
+    query_parser.add_argument("--tag", action="append", default=[])
+    query_parser.add_argument("--tag-mode", choices=["All", "Any"], default="All")
+    query_parser.add_argument("--creator-id", type=int)
+    query_parser.add_argument(
+        "--sort", choices=["Relevance", "Updated", "Name", "Id"], default="Relevance"
+    )
+    query_parser.add_argument("--limit", type=int, default=50)
+    query_parser.add_argument(
+        "--after", help="the next cursor of a previous query, to continue from it"
+    )
+    query_parser.add_argument("--indent", action="store_true")
+    query_parser.set_defaults(run=query)
+
+    maintenance_parser = subparsers.add_parser(
+        "maintenance", help=maintenance.__doc__.strip()
+    )
+    maintenance_parser.add_argument(
+        "--images-per-version",
+        type=int,
+        help="images kept per model version, 0 keeps every image",
+    )
+    maintenance_parser.set_defaults(run=maintenance)
+
+    serve_parser = subparsers.add_parser("serve", help=serve.__doc__.strip())
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--workers", type=int, default=4)
+    serve_parser.set_defaults(run=serve)
+
+    return parser
+
+
+def main(argv=None):
+    # pages are parsed in spawned processes, which frozen builds must hand off here.
+    multiprocessing.freeze_support()
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not any(arg in COMMANDS for arg in argv):
+        # the gui and its widgets are only imported when no command is given.
+        from cocktail.ui.__main__ import main as gui_main
+
+        return gui_main()
+
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO, stream=sys.stderr
+    )
+    sys.exit(args.run(args))
+
+
+if __name__ == "__main__":
+    main()
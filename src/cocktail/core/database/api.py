@@ -1,13 +1,29 @@
 __all__ = [
     "get_connection",
     "insert_page",
+    "write_page",
+    "delete_models",
+    "get_model",
+    "get_model_versions",
+    "get_model_version",
+    "get_model_files",
+    "get_model_file",
+    "get_model_images",
+    "get_model_description",
+    "get_model_version_description",
     "get_db_update_period",
     "get_last_updated",
     "set_last_updated",
+    "get_metadata",
+    "set_metadata",
+    "get_high_water_mark",
+    "set_high_water_mark",
+    "get_last_refreshed",
+    "set_last_refreshed",
+    "get_refresh_period",
     "calculate_period",
 ]
 
-import json
 import os
 import time
 import logging
@@ -16,66 +32,196 @@ import datetime
 import platformdirs
 import importlib.resources
 from PySide6 import QtSql
-from cocktail.core.database import data_classes
-
-CURRENT_SCHEMA_VERSION = 2
+from cocktail.core.database import (
+    codec,
+    cold_storage,
+    connections,
+    creators,
+    data_classes,
+    facets,
+    images,
+    migrations,
+    search,
+    tags,
+)
+
+CURRENT_SCHEMA_VERSION = migrations.CURRENT_SCHEMA_VERSION
 
 logger = logging.getLogger(__name__)
 
 
-def insert_or_replace(db, table_name, rows: typing.Iterable[typing.NamedTuple]):
+def _bind_value(value):
+    if isinstance(value, (list, dict, codec.LazyMapping, codec.LazySequence)):
+        return codec.encode(value)
+
+    return value
+
+
+def _insert_rows(db, table_name, rows: typing.Sequence[typing.NamedTuple]):
+    """
+    insert rows into a table using a single prepared statement.
+
+    the statement is prepared once per batch and re-executed for every row, values
+    that need encoding are converted column-wise up front. QSqlQuery.execBatch is
+    not used as the sqlite driver emulates it by copying the bound lists per row,
+    which is quadratic in the batch size.
+
+    cold columns are written compressed to their side table, see cold_storage, and
+    creator columns are left to creators.resolve_creators.
+    """
+    rows = [row for row in rows if row]
     if not rows:
         logger.warning(f"Nothing to insert into {table_name}, rows is empty.")
         return
 
     start = time.time()
-    column_names = [name for name in rows[0]._fields]
-
-    column_names = ", ".join(column_names)
-    placeholder = ", ".join(["?"] * len(rows[0]._fields))
+    cold_columns = cold_storage.cold_columns(table_name)
+    excluded = cold_columns + creators.creator_columns(table_name)
+    fields = [field for field in rows[0]._fields if field not in excluded]
+    column_names = ", ".join(fields)
+    placeholder = ", ".join(["?"] * len(fields))
 
     statement = (
         f"INSERT OR REPLACE INTO {table_name} ({column_names}) VALUES({placeholder})"
     )
 
-    db.transaction()
-    for row in rows:
-        if not row:
-            logger.warning(f"Empty row found in {table_name}, discarding.")
-            continue
-
-        query = QtSql.QSqlQuery(db)
-        query.prepare(statement)
+    query = QtSql.QSqlQuery(db)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
 
-        for index, value in enumerate(row):
-            if isinstance(value, (list, dict)):
-                value = json.dumps(value)
+    columns = [[_bind_value(getattr(row, field)) for row in rows] for field in fields]
 
+    for values in zip(*columns):
+        for index, value in enumerate(values):
             query.bindValue(index, value)
 
         if not query.exec():
-            logger.error(f"Failed to execute statement: {statement} for row {row}")
+            logger.error(f"Failed to execute statement: {statement} for row {values}")
             raise RuntimeError(
                 f"Failed to execute statement: {query.lastQuery()}, {query.lastError().text()}"
             )
 
-    db.commit()
+    for column in cold_columns:
+        cold_storage.write_cold_values(
+            db, table_name, ((row.id, getattr(row, column)) for row in rows)
+        )
 
     logger.debug(
         f"Inserted {len(rows)} rows into {table_name} in {time.time() - start:.2f}s"
     )
 
 
+def insert_or_replace(db, table_name, rows: typing.Sequence[typing.NamedTuple]):
+    db.transaction()
+    try:
+        _insert_rows(db, table_name, rows)
+    except Exception:
+        db.rollback()
+        raise
+
+    db.commit()
+
+
+def write_page(db, page: data_classes.Page):
+    """
+    insert every table of a page, the caller is responsible for the transaction.
+    """
+    model_ids = [model.id for model in page.models]
+    facets.remove_models(db, model_ids)
+    tags.remove_models(db, model_ids)
+
+    _insert_rows(db, "model", creators.resolve_creators(db, page.models))
+    _insert_rows(db, "model_version", page.versions)
+    _insert_rows(db, "model_file", page.files)
+    _insert_rows(db, "model_image", images.retain_images(db, page.images))
+    _write_base_models(db, page)
+    facets.add_models(db, model_ids)
+    tags.add_models(db, page.tags)
+    search.index_models(db, page.models, page.versions)
+
+
+def _exec_for_each(db, statement, values):
+    query = QtSql.QSqlQuery(db)
+    query.prepare(statement)
+    for value in values:
+        if not isinstance(value, tuple):
+            value = (value,)
+
+        for index, item in enumerate(value):
+            query.bindValue(index, item)
+
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to execute statement: {statement}, {query.lastError().text()}"
+            )
+
+
+def _write_base_models(db, page: data_classes.Page):
+    """
+    replace the base model membership of every model in the page, this keeps the
+    base model filter a single indexed lookup instead of a join on model_version.
+    """
+    _exec_for_each(
+        db,
+        "DELETE FROM model_base_model WHERE model_id = ?",
+        [model.id for model in page.models],
+    )
+    _exec_for_each(
+        db,
+        "INSERT OR IGNORE INTO model_base_model (model_id, base_model) VALUES(?, ?)",
+        {(version.model_id, version.base_model) for version in page.versions},
+    )
+
+
 def insert_page(db, page: data_classes.Page):
-    insert_or_replace(db, "model", page.models)
-    insert_or_replace(db, "model_version", page.versions)
-    insert_or_replace(db, "model_file", page.files)
-    insert_or_replace(db, "model_image", page.images)
+    """
+    insert every table of a page inside a single transaction.
+    """
+    db.transaction()
+    try:
+        write_page(db, page)
+    except Exception:
+        db.rollback()
+        raise
+
+    db.commit()
 
 
-def get_last_updated(db):
+def delete_models(db, model_ids: typing.Sequence[int]):
+    """
+    delete models along with their versions, files and images.
+    """
+    facets.remove_models(db, model_ids)
+    tags.remove_models(db, model_ids)
+    images.remove_versions(db, model_ids)
+    cold_storage.delete_cold_values(db, "model_version", "model_id = ?", model_ids)
+    cold_storage.delete_cold_values(db, "model", "id = ?", model_ids)
+
+    # images and files are found through their versions, which are indexed by model.
+    statements = [
+        "DELETE FROM model_image WHERE model_version_id IN "
+        "(SELECT id FROM model_version WHERE model_id = ?)",
+        "DELETE FROM model_file WHERE model_version_id IN "
+        "(SELECT id FROM model_version WHERE model_id = ?)",
+        "DELETE FROM model_version WHERE model_id = ?",
+        "DELETE FROM model_base_model WHERE model_id = ?",
+        "DELETE FROM model WHERE id = ?",
+    ]
+
+    for statement in statements:
+        _exec_for_each(db, statement, model_ids)
+
+    search.unindex_models(db, model_ids)
+
+
+def get_model(db, model_id: int) -> typing.Optional[data_classes.Model]:
     query = QtSql.QSqlQuery(db)
-    query.prepare("SELECT value FROM metadata WHERE key = 'last_updated'")
+    query.prepare(
+        f"SELECT {creators.MODEL_COLUMNS} FROM {creators.MODEL_SOURCE} WHERE m.id = ?"
+    )
+    query.bindValue(0, model_id)
 
     if not query.exec():
         raise RuntimeError(f"Failed to execute statement: {query.lastError().text()}")
@@ -83,24 +229,204 @@ def get_last_updated(db):
     if not query.next():
         return None
 
-    return datetime.datetime.fromisoformat(query.value(0))
+    return data_classes.Model.from_record(query.record())
 
 
-def set_last_updated(db, dt: datetime.datetime = None):
-    dt = dt or datetime.datetime.now()
+def _select_rows(db, cls, statement: str, bind=()) -> list:
     query = QtSql.QSqlQuery(db)
-    query.prepare(
-        "INSERT OR REPLACE INTO metadata (key, value) VALUES('last_updated', ?)"
+    query.setForwardOnly(True)
+    query.prepare(statement)
+    for index, value in enumerate(bind):
+        query.bindValue(index, value)
+
+    if not query.exec():
+        raise RuntimeError(f"Failed to execute statement: {query.lastError().text()}")
+
+    rows = []
+    while query.next():
+        rows.append(cls.from_record(query.record()))
+    query.finish()
+
+    return rows
+
+
+def get_model_versions(db, model_id: int) -> typing.List[data_classes.ModelVersion]:
+    """
+    returns the versions of a model newest first, without their descriptions.
+    """
+    return _select_rows(
+        db,
+        data_classes.ModelVersion,
+        "SELECT * FROM model_version WHERE model_id = ? ORDER BY id DESC",
+        [model_id],
+    )
+
+
+def get_model_version(
+    db, model_version_id: int
+) -> typing.Optional[data_classes.ModelVersion]:
+    rows = _select_rows(
+        db,
+        data_classes.ModelVersion,
+        "SELECT * FROM model_version WHERE id = ?",
+        [model_version_id],
+    )
+    return rows[0] if rows else None
+
+
+def get_model_files(db, model_version_id: int) -> typing.List[data_classes.ModelFile]:
+    """
+    returns the safe files of a version, the primary file first.
+    """
+    return _select_rows(
+        db,
+        data_classes.ModelFile,
+        "SELECT * FROM model_file WHERE model_version_id = ? AND safe = 1 "
+        "ORDER BY is_primary DESC",
+        [model_version_id],
+    )
+
+
+def get_model_file(db, file_id: int) -> typing.Optional[data_classes.ModelFile]:
+    rows = _select_rows(
+        db, data_classes.ModelFile, "SELECT * FROM model_file WHERE id = ?", [file_id]
+    )
+    return rows[0] if rows else None
+
+
+def get_model_images(db, model_version_id: int) -> typing.List[data_classes.ModelImage]:
+    """
+    returns the stored images of a version newest first, see images.is_pruned.
+    """
+    return _select_rows(
+        db,
+        data_classes.ModelImage,
+        "SELECT * FROM model_image WHERE model_version_id = ? ORDER BY id DESC",
+        [model_version_id],
     )
-    query.bindValue(0, dt.isoformat())
+
+
+def get_model_description(db, model_id: int) -> str:
+    return cold_storage.get_cold_value(db, "model", model_id)
+
+
+def get_model_version_description(db, model_version_id: int) -> str:
+    return cold_storage.get_cold_value(db, "model_version", model_version_id)
+
+
+def get_metadata(db, key, default=None):
+    query = QtSql.QSqlQuery(db)
+    query.prepare("SELECT value FROM metadata WHERE key = ?")
+    query.bindValue(0, key)
 
     if not query.exec():
         raise RuntimeError(f"Failed to execute statement: {query.lastError().text()}")
 
+    if not query.next():
+        return default
+
+    return query.value(0)
+
+
+def set_metadata(db, key, value):
+    query = QtSql.QSqlQuery(db)
+    query.prepare("INSERT OR REPLACE INTO metadata (key, value) VALUES(?, ?)")
+    query.bindValue(0, key)
+    query.bindValue(1, str(value))
+
+    if not query.exec():
+        raise RuntimeError(f"Failed to execute statement: {query.lastError().text()}")
+
+
+def get_last_updated(db):
+    value = get_metadata(db, "last_updated")
+    if value is None:
+        return None
+
+    return datetime.datetime.fromisoformat(value)
+
+
+def set_last_updated(db, dt: datetime.datetime = None):
+    dt = dt or datetime.datetime.now()
+    set_metadata(db, "last_updated", dt.isoformat())
+
+
+# days between period syncs that catch updates to older models, see
+# get_refresh_period.
+REFRESH_INTERVAL = 7
+
+
+def get_last_refreshed(db) -> typing.Optional[datetime.datetime]:
+    value = get_metadata(db, "last_refreshed")
+    if value is None:
+        return None
+
+    return datetime.datetime.fromisoformat(value)
+
+
+def set_last_refreshed(db, dt: datetime.datetime = None):
+    dt = dt or datetime.datetime.now()
+    set_metadata(db, "last_refreshed", dt.isoformat())
+
+
+def get_refresh_period(
+    db, interval: int = REFRESH_INTERVAL
+) -> typing.Optional[data_classes.Period]:
+    """
+    returns the period to sync to catch up with models updated since the last
+    refresh, or None when the last refresh is more recent than `interval` days.
+
+    incremental syncs read models in creation order, so an older model that gets a
+    new version is not reached by them. a period sync requests every model updated
+    within the period instead.
+
+    None is also returned for an empty database, whose first incremental sync reads
+    every model and so counts as a refresh.
+    """
+    last_refreshed = get_last_refreshed(db)
+    if last_refreshed is None:
+        if get_high_water_mark(db) is None:
+            return None
+
+        # databases that hold models from before refreshes catch up with the last
+        # week.
+        return data_classes.Period.Week
+
+    if (datetime.datetime.now() - last_refreshed).days < interval:
+        return None
+
+    return calculate_period(last_refreshed)
+
+
+def get_high_water_mark(db) -> typing.Optional[int]:
+    """
+    Returns the newest model.updated_at that a completed sync has ingested.
+
+    databases that predate the watermark fall back to the newest model they contain,
+    None is returned for an empty database.
+    """
+    value = get_metadata(db, "high_water_mark")
+    if value is not None:
+        return int(value)
+
+    query = QtSql.QSqlQuery(db)
+    if not query.exec("SELECT MAX(updated_at) FROM model"):
+        raise RuntimeError(f"Failed to execute statement: {query.lastError().text()}")
+
+    if query.next() and query.value(0):
+        return int(query.value(0))
+
+    return None
+
+
+def set_high_water_mark(db, timestamp: int):
+    set_metadata(db, "high_water_mark", int(timestamp))
+
 
 def create_tables(db):
     """
-    populates the database with the schema defined in schema.sql
+    populates the database with the schema defined in schema.sql and migrates it
+    to the current version.
     """
     logger.info("creating new database")
 
@@ -117,9 +443,8 @@ def create_tables(db):
             return False
 
     query = QtSql.QSqlQuery(db)
-    query.prepare("PRAGMA user_version = ?")
-    query.bindValue(0, CURRENT_SCHEMA_VERSION)
-    query.exec()
+    query.exec(f"PRAGMA user_version = {migrations.BASE_SCHEMA_VERSION}")
+    migrations.migrate(db)
 
     epoch = datetime.datetime.fromtimestamp(0)
     set_last_updated(db, epoch)
@@ -151,15 +476,16 @@ def get_database_path():
     return os.path.join(dirname, "cocktail.sqlite3")
 
 
-def get_connection(filepath=None):
+def get_connection(filepath=None, connection_name="cocktail"):
     filepath = filepath or get_database_path()
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
 
     logger.info(f"Connecting to database at {filepath}")
 
-    db = QtSql.QSqlDatabase.addDatabase("QSQLITE", "cocktail")
+    db = QtSql.QSqlDatabase.addDatabase("QSQLITE", connection_name)
     db.setDatabaseName(filepath)
     db.open()
+    connections.apply_pragmas(db, connections.WRITE_PRAGMAS)
 
     if not db.tables():
         create_tables(db)
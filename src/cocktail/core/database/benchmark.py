@@ -0,0 +1,307 @@
+"""
+Ingest benchmarks for the database api.
+
+Run with `python -m cocktail.core.database.benchmark`, optionally passing saved
+responses from the models endpoint with --page-file to benchmark against real data.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import typing
+
+from PySide6 import QtCore, QtSql
+from cocktail.core.database import (
+    api,
+    codec,
+    cold_storage,
+    creators,
+    data_classes,
+    search,
+)
+
+WORDS = [
+    "portrait",
+    "landscape",
+    "anime",
+    "realistic",
+    "cinematic",
+    "lighting",
+    "detailed",
+    "masterpiece",
+    "castle",
+    "forest",
+    "city",
+    "night",
+]
+
+
+def _sentence(count):
+    return " ".join(random.choice(WORDS) for _ in range(count))
+
+
+def _timestamp(days_ago):
+    dt = QtCore.QDateTime.currentDateTimeUtc().addDays(-days_ago)
+    return dt.toString(QtCore.Qt.DateFormat.ISODate)
+
+
+def make_model_json(model_id: int):
+    """
+    build a model dict shaped like a response from the Civitai models endpoint.
+    """
+    versions = []
+    for version_index in range(random.randint(1, 4)):
+        version_id = model_id * 10 + version_index
+        versions.append(
+            {
+                "id": version_id,
+                "name": f"v{version_index}.0",
+                "description": f"<p>{_sentence(60)}</p>",
+                "trainedWords": [random.choice(WORDS) for _ in range(3)],
+                "baseModel": random.choice(["SD 1.5", "SDXL 1.0", "Pony"]),
+                "updatedAt": _timestamp(random.randint(0, 700)),
+                "files": [
+                    {
+                        "id": version_id * 10 + file_index,
+                        "name": f"model_{version_id}_{file_index}.safetensors",
+                        "downloadUrl": f"https://example.com/{version_id}/{file_index}",
+                        "sizeKB": random.randint(1000, 6000000),
+                        "primary": file_index == 0,
+                        "pickleScanResult": "Success",
+                        "virusScanResult": "Success",
+                        "metadata": {
+                            "fp": "fp16",
+                            "size": "pruned",
+                            "format": "SafeTensor",
+                        },
+                    }
+                    for file_index in range(random.randint(1, 3))
+                ],
+                "images": [
+                    {
+                        "id": version_id * 100 + image_index,
+                        "url": f"https://example.com/{version_id}/{image_index}.jpeg",
+                        "hash": "UBE2w*~q00Rj00D%Iot7~qWBRjof00%M-;t7",
+                        "width": 512,
+                        "height": 768,
+                        "meta": {
+                            "prompt": _sentence(40),
+                            "negativePrompt": _sentence(20),
+                            "seed": random.randint(0, 2**32),
+                            "steps": 30,
+                            "cfgScale": 7.5,
+                            "sampler": "DPM++ 2M Karras",
+                        },
+                    }
+                    for image_index in range(random.randint(2, 10))
+                ],
+            }
+        )
+
+    return {
+        "id": model_id,
+        "name": f"model {model_id} {_sentence(2)}",
+        "type": random.choice(["Checkpoint", "LORA", "TextualInversion"]),
+        "nsfwLevel": random.choice([1, 2, 4, 8]),
+        "tags": random.sample(["character", "style", "concept", "clothing"], 2),
+        "description": f"<p>{_sentence(200)}</p>",
+        "creator": {"username": f"creator_{model_id % 50}", "image": None},
+        "modelVersions": versions,
+    }
+
+
+def make_pages(page_count: int, page_size: int = 100):
+    model_id = 0
+    for _ in range(page_count):
+        items = []
+        for _ in range(page_size):
+            model_id += 1
+            items.append(make_model_json(model_id))
+        yield data_classes.deserialise_items(items)
+
+
+def load_pages(filepaths: typing.List[str]):
+    for filepath in filepaths:
+        with open(filepath) as file:
+            data = json.load(file)
+        yield data_classes.deserialise_items(data["items"])
+
+
+def insert_row_by_row(db, table_name, rows):
+    """
+    the original ingest loop, kept as the baseline: prepares and executes a fresh
+    statement for every row. cold and creator columns are left out as they are no
+    longer stored inline.
+    """
+    excluded = cold_storage.cold_columns(table_name) + creators.creator_columns(
+        table_name
+    )
+    fields = [field for field in rows[0]._fields if field not in excluded]
+    column_names = ", ".join(fields)
+    placeholder = ", ".join(["?"] * len(fields))
+    statement = (
+        f"INSERT OR REPLACE INTO {table_name} ({column_names}) VALUES({placeholder})"
+    )
+
+    db.transaction()
+    for row in rows:
+        query = QtSql.QSqlQuery(db)
+        query.prepare(statement)
+
+        for index, field in enumerate(fields):
+            value = getattr(row, field)
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value)
+
+            query.bindValue(index, value)
+
+        if not query.exec():
+            raise RuntimeError(query.lastError().text())
+
+    db.commit()
+
+
+def insert_page_row_by_row(db, page: data_classes.Page):
+    insert_row_by_row(db, "model", page.models)
+    insert_row_by_row(db, "model_version", page.versions)
+    insert_row_by_row(db, "model_file", page.files)
+    insert_row_by_row(db, "model_image", page.images)
+
+
+def count_rows(page: data_classes.Page):
+    return len(page.models) + len(page.versions) + len(page.files) + len(page.images)
+
+
+def benchmark_insert(name, insert_function, pages, directory):
+    filepath = os.path.join(directory, f"{name}.sqlite3")
+    db = api.get_connection(filepath, connection_name=f"benchmark-{name}")
+
+    rows = 0
+    start = time.perf_counter()
+    for page in pages:
+        insert_function(db, page)
+        rows += count_rows(page)
+    elapsed = time.perf_counter() - start
+
+    db.close()
+    return rows, elapsed
+
+
+def benchmark_search(db, text, limit=100):
+    """
+    time a ranked full text search up to the first `limit` rows, which is what the
+    gallery fetches before anything is shown.
+    """
+    sql, bind = search.build_search_query(text=text)
+    query = QtSql.QSqlQuery(db)
+    query.prepare(sql)
+    for key, value in bind.items():
+        query.bindValue(f":{key}", value)
+
+    start = time.perf_counter()
+    if not query.exec():
+        raise RuntimeError(query.lastError().text())
+
+    rows = 0
+    while rows < limit and query.next():
+        rows += 1
+    elapsed = time.perf_counter() - start
+    query.finish()
+
+    return rows, elapsed
+
+
+def benchmark_codec(values: typing.List):
+    """
+    compare json with the codec for a column's values, returning the mean
+    bytes per row and decode time per row for each.
+    """
+    results = []
+    for name, encode, decode in [
+        ("json", lambda value: json.dumps(value).encode("utf-8"), json.loads),
+        ("codec", lambda value: bytes(codec.encode(value)), codec.loads),
+        # what reading a record costs until the value is accessed.
+        ("lazy", lambda value: bytes(codec.encode(value)), codec.LazyMapping),
+    ]:
+        encoded = [encode(value) for value in values]
+        size = sum(len(data) for data in encoded) / len(encoded)
+
+        start = time.perf_counter()
+        for data in encoded:
+            decode(data)
+        elapsed = (time.perf_counter() - start) / len(encoded)
+
+        results.append((name, size, elapsed))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--page-file", action="append", default=[])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--search", action="append", default=[], help="search text to time"
+    )
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication([])
+    random.seed(args.seed)
+
+    if args.page_file:
+        pages = list(load_pages(args.page_file))
+    else:
+        pages = list(make_pages(args.pages, args.page_size))
+
+    search_results = []
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            (
+                "row-by-row",
+                *benchmark_insert("legacy", insert_page_row_by_row, pages, directory),
+            ),
+            (
+                "batched",
+                *benchmark_insert("batched", api.insert_page, pages, directory),
+            ),
+        ]
+
+        db = api.get_connection(
+            os.path.join(directory, "batched.sqlite3"), connection_name="search"
+        )
+        for text in args.search or ["portrait", "cast", "model 12"]:
+            search_results.append((text, *benchmark_search(db, text)))
+        db.close()
+
+    for name, rows, elapsed in results:
+        print(
+            f"{name:>12}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)"
+        )
+
+    for text, rows, elapsed in search_results:
+        print(f"search {text!r}: {rows} rows in {elapsed * 1000:.1f}ms")
+
+    columns = {
+        "generation_data": [
+            image.generation_data for page in pages for image in page.images
+        ],
+        "trained_words": [
+            version.trained_words for page in pages for version in page.versions
+        ],
+    }
+    for column, values in columns.items():
+        for name, size, elapsed in benchmark_codec(values):
+            print(
+                f"{column} {name:>5}: {size:.0f} bytes/row, "
+                f"{elapsed * 1e6:.2f}us decode/row"
+            )
+
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Compact encoding for structured column values.
+
+model_image.generation_data and model_version.trained_words were stored as json
+text, repeating every key in every row and parsing every row as it was read. They
+are stored as blobs instead:
+
+    header   one byte, the format version with FLAG_COMPRESSED set when the body
+             is zlib compressed
+    body     compact utf-8 json
+
+Bodies of COMPRESS_THRESHOLD bytes or more are compressed with KEYS as the zlib
+preset dictionary, so the keys repeated in every row cost a back reference rather
+than their text, even in a short body. KEYS is part of the format, changing it
+needs a new FORMAT_VERSION. Values read from the database are decoded when they
+are first accessed, see LazyMapping and LazySequence.
+"""
+__all__ = [
+    "FORMAT_VERSION",
+    "KEYS",
+    "LazyMapping",
+    "LazySequence",
+    "encode",
+    "loads",
+    "to_json",
+]
+
+import collections.abc
+import json
+import zlib
+
+from PySide6 import QtCore
+
+FORMAT_VERSION = 2
+FLAG_COMPRESSED = 0x80
+
+# short bodies, trained words for the most part, do not shrink enough to pay for
+# compressing them.
+COMPRESS_THRESHOLD = 256
+
+# the keys of the generation data civitai returns, most frequent last as zlib
+# prefers the end of the dictionary.
+KEYS = [
+    "Hires upscaler",
+    "Hires upscale",
+    "Hires steps",
+    "Denoising strength",
+    "ENSD",
+    "VAE",
+    "Created Date",
+    "civitaiResources",
+    "hashes",
+    "resources",
+    "weight",
+    "hash",
+    "type",
+    "name",
+    "Model hash",
+    "Model",
+    "Clip skip",
+    "Size",
+    "sampler",
+    "cfgScale",
+    "steps",
+    "seed",
+    "negativePrompt",
+    "prompt",
+]
+ZDICT = "".join(f'"{key}":' for key in KEYS).encode("utf-8")
+
+
+def _compress(data: bytes) -> bytes:
+    compressor = zlib.compressobj(zdict=ZDICT)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(data: bytes) -> bytes:
+    decompressor = zlib.decompressobj(zdict=ZDICT)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def _loads_bytes(data: bytes):
+    header = data[0]
+    version = header & ~FLAG_COMPRESSED
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported encoding version {version}")
+
+    body = data[1:]
+    if header & FLAG_COMPRESSED:
+        body = _decompress(body)
+
+    return json.loads(body)
+
+
+def loads(data):
+    """
+    decode a stored value, json from before the migration is accepted.
+    """
+    if isinstance(data, str):
+        return json.loads(data)
+
+    return _loads_bytes(bytes(data))
+
+
+class _Lazy:
+    __slots__ = ("_data", "_value")
+
+    EMPTY = None
+
+    # equal to the dicts and lists they wrap, which are not hashable either.
+    __hash__ = None
+
+    def __init__(self, data):
+        # QByteArray from QtSql, bytes from sqlite3 or str for json.
+        if data is not None and not isinstance(data, (str, bytes)):
+            data = bytes(data)
+
+        self._data = data or None
+        self._value = None
+
+    @property
+    def value(self):
+        if self._value is None:
+            value = None if self._data is None else loads(self._data)
+            self._value = type(self).EMPTY() if value is None else value
+            self._data = None
+        return self._value
+
+    def __len__(self):
+        return len(self.value)
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def __eq__(self, other):
+        if isinstance(other, _Lazy):
+            other = other.value
+        return self.value == other
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.value!r})"
+
+
+class LazyMapping(_Lazy, collections.abc.Mapping):
+    """
+    a read only mapping of a stored value, decoded on first access.
+    """
+
+    __slots__ = ()
+    EMPTY = dict
+
+
+class LazySequence(_Lazy, collections.abc.Sequence):
+    """
+    a read only sequence of a stored value, decoded on first access.
+    """
+
+    __slots__ = ()
+    EMPTY = list
+
+
+def encode(value) -> QtCore.QByteArray:
+    """
+    encode a value for storage, returned as a QByteArray so it is bound as a blob.
+    """
+    # values read back and written unchanged are not decoded.
+    if isinstance(value, _Lazy):
+        if isinstance(value._data, bytes):
+            return QtCore.QByteArray(value._data)
+        value = value.value
+
+    body = json.dumps(
+        value, default=to_json, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+    header = FORMAT_VERSION
+    if len(body) >= COMPRESS_THRESHOLD:
+        compressed = _compress(body)
+        if len(compressed) < len(body):
+            header |= FLAG_COMPRESSED
+            body = compressed
+
+    return QtCore.QByteArray(bytes([header]) + body)
+
+
+def to_json(value):
+    """
+    json.dump default for lazily decoded values.
+    """
+    if isinstance(value, LazyMapping):
+        return dict(value.value)
+    if isinstance(value, LazySequence):
+        return list(value.value)
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,181 @@
+"""
+Compressed side tables for large, rarely read columns.
+
+Descriptions are html blobs that are only shown for the selected model, keeping
+them inline made every row the gallery and search read several times wider. They
+are stored zlib compressed in a table keyed by the row id instead, and read one at
+a time when they are displayed.
+"""
+__all__ = [
+    "COLD_TABLES",
+    "cold_columns",
+    "compress",
+    "decompress",
+    "create_cold_tables",
+    "write_cold_values",
+    "delete_cold_values",
+    "get_cold_value",
+    "move_cold_columns",
+]
+
+import logging
+import time
+import typing
+import zlib
+
+from PySide6 import QtCore, QtSql
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 9
+
+
+class ColdTable(typing.NamedTuple):
+    name: str
+    key: str
+    column: str
+
+
+# the cold column of each table and the side table it is stored in.
+COLD_TABLES = {
+    "model": ColdTable("model_description", "model_id", "description"),
+    "model_version": ColdTable(
+        "model_version_description", "model_version_id", "description"
+    ),
+}
+
+
+def cold_columns(table_name: str) -> typing.List[str]:
+    if table_name in COLD_TABLES:
+        return [COLD_TABLES[table_name].column]
+
+    return []
+
+
+def compress(text: str) -> QtCore.QByteArray:
+    # the sqlite driver binds bytes as text, blobs need a QByteArray.
+    return QtCore.QByteArray(zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL))
+
+
+def decompress(data) -> str:
+    if not data:
+        return ""
+
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+
+def _exec(db, statement, bind=()):
+    query = QtSql.QSqlQuery(db)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    for index, value in enumerate(bind):
+        query.bindValue(index, value)
+
+    if not query.exec():
+        raise RuntimeError(
+            f"Failed to execute statement: {statement}, {query.lastError().text()}"
+        )
+
+    return query
+
+
+def create_cold_tables(db):
+    for cold in COLD_TABLES.values():
+        _exec(
+            db,
+            f"CREATE TABLE IF NOT EXISTS {cold.name} ("
+            f"{cold.key} INTEGER PRIMARY KEY, {cold.column} BLOB NOT NULL)",
+        )
+
+
+def write_cold_values(db, table_name: str, values: typing.Iterable[tuple]):
+    """
+    replace the cold values of (id, text) pairs, empty text is not stored.
+    """
+    cold = COLD_TABLES[table_name]
+    insert = QtSql.QSqlQuery(db)
+    insert.prepare(
+        f"INSERT OR REPLACE INTO {cold.name} ({cold.key}, {cold.column}) VALUES(?, ?)"
+    )
+    delete = QtSql.QSqlQuery(db)
+    delete.prepare(f"DELETE FROM {cold.name} WHERE {cold.key} = ?")
+
+    for row_id, text in values:
+        if text:
+            query = insert
+            query.bindValue(0, row_id)
+            query.bindValue(1, compress(text))
+        else:
+            query = delete
+            query.bindValue(0, row_id)
+
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to write {cold.name}: {query.lastError().text()}"
+            )
+
+
+def delete_cold_values(db, table_name: str, where: str, values: typing.Iterable):
+    """
+    delete the cold values of the rows selected by `where`, bound once per value.
+    """
+    cold = COLD_TABLES[table_name]
+    query = QtSql.QSqlQuery(db)
+    query.prepare(
+        f"DELETE FROM {cold.name} WHERE {cold.key} IN "
+        f"(SELECT id FROM {table_name} WHERE {where})"
+    )
+    for value in values:
+        query.bindValue(0, value)
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to delete from {cold.name}: {query.lastError().text()}"
+            )
+
+
+def get_cold_value(db, table_name: str, row_id: int) -> str:
+    cold = COLD_TABLES[table_name]
+    query = _exec(
+        db, f"SELECT {cold.column} FROM {cold.name} WHERE {cold.key} = ?", [row_id]
+    )
+    if not query.next():
+        return ""
+
+    return decompress(query.value(0))
+
+
+def move_cold_columns(db):
+    """
+    move inline cold columns into their compressed side tables and drop them, the
+    caller owns the transaction.
+    """
+    start = time.time()
+    create_cold_tables(db)
+
+    for table_name, cold in COLD_TABLES.items():
+        if not db.record(table_name).contains(cold.column):
+            continue
+
+        statement = (
+            f"SELECT id, {cold.column} FROM {table_name} WHERE {cold.column} != ''"
+        )
+        query = QtSql.QSqlQuery(db)
+        query.setForwardOnly(True)
+        if not query.exec(statement):
+            raise RuntimeError(
+                f"Failed to execute statement: {statement}, {query.lastError().text()}"
+            )
+
+        def rows():
+            while query.next():
+                yield query.value(0), query.value(1)
+
+        # streamed, the side table can be written while the table is read.
+        write_cold_values(db, table_name, rows())
+        query.finish()
+        _exec(db, f"ALTER TABLE {table_name} DROP COLUMN {cold.column}")
+
+    logger.info(f"moved cold columns in {time.time() - start:.2f}s")
@@ -0,0 +1,210 @@
+"""
+Database connections by role.
+
+A QSqlDatabase can only be used from the thread that opened it, and every
+controller used to share the single "cocktail" connection of the ui thread, where
+reads queued up behind sync writes. A ConnectionRegistry hands out
+
+    a reader per thread, tuned for reads with READ_PRAGMAS and refusing writes
+    a single writer, owned by the thread that ingests
+
+The writer switches the database to WAL journaling, see WRITE_PRAGMAS, so readers
+keep reading the last committed state while a write transaction runs.
+"""
+__all__ = [
+    "READ_PRAGMAS",
+    "WRITE_PRAGMAS",
+    "ConnectionRegistry",
+    "apply_pragmas",
+    "get_registry",
+    "remove_database",
+]
+
+import logging
+import os
+import threading
+import typing
+
+from PySide6 import QtCore, QtSql
+
+logger = logging.getLogger(__name__)
+
+# per connection, the mapped size and page cache are upper bounds.
+READ_PRAGMAS = {
+    "query_only": 1,
+    "mmap_size": 256 * 1024 * 1024,
+    # negative sizes are in KiB.
+    "cache_size": -32 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# journal_mode is stored in the database, synchronous is safe to relax under WAL.
+WRITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+}
+
+# a WAL database is the database file and its write ahead log and index.
+DATABASE_SUFFIXES = ("", "-wal", "-shm")
+
+
+def apply_pragmas(db, pragmas: typing.Dict[str, typing.Any]):
+    # pragmas do not accept bound values.
+    query = QtSql.QSqlQuery(db)
+    for name, value in pragmas.items():
+        if not query.exec(f"PRAGMA {name} = {value}"):
+            raise RuntimeError(
+                f"Failed to set pragma {name}: {query.lastError().text()}"
+            )
+    query.finish()
+
+
+def remove_database(filepath: str):
+    """
+    delete a closed database with its log, a stale log left next to a replaced
+    database file would be applied to it.
+    """
+    for suffix in DATABASE_SUFFIXES:
+        try:
+            os.remove(f"{filepath}{suffix}")
+        except FileNotFoundError:
+            pass
+
+
+class ConnectionRegistry:
+    """
+    Read connections per thread and the writer connection of a database.
+
+    Readers are opened on first use in each thread and closed when a QThread
+    finishes, threads that are not QThreads should call release_reader. The writer
+    may only be used from the thread that opened it until release_writer.
+    """
+
+    def __init__(self, filepath: str, name: str = "cocktail"):
+        self.filepath = filepath
+        self.name = name
+        self._lock = threading.Lock()
+        self._readers: typing.Dict[int, str] = {}
+        self._writer_thread: typing.Optional[int] = None
+
+    @property
+    def writer_name(self) -> str:
+        return f"{self.name}-writer"
+
+    def reader_name(self, thread_id: int = None) -> str:
+        return f"{self.name}-read-{thread_id or threading.get_ident()}"
+
+    def reader(self) -> QtSql.QSqlDatabase:
+        """
+        returns the read connection of the calling thread.
+        """
+        thread_id = threading.get_ident()
+        with self._lock:
+            name = self._readers.get(thread_id)
+        if name is not None:
+            return QtSql.QSqlDatabase.database(name, open=False)
+
+        if not os.path.exists(self.filepath):
+            raise RuntimeError(f"Database does not exist: {self.filepath}")
+
+        name = self.reader_name(thread_id)
+        db = QtSql.QSqlDatabase.addDatabase("QSQLITE", name)
+        db.setDatabaseName(self.filepath)
+        if not db.open():
+            raise RuntimeError(f"Failed to open database: {db.lastError().text()}")
+        apply_pragmas(db, READ_PRAGMAS)
+
+        with self._lock:
+            self._readers[thread_id] = name
+
+        app = QtCore.QCoreApplication.instance()
+        thread = QtCore.QThread.currentThread()
+        if app is not None and thread != app.thread():
+            thread.finished.connect(
+                self.release_reader, QtCore.Qt.ConnectionType.DirectConnection
+            )
+
+        logger.debug(f"opened read connection {name}")
+        return db
+
+    def release_reader(self):
+        """
+        close the read connection of the calling thread, if it has one.
+        """
+        with self._lock:
+            name = self._readers.pop(threading.get_ident(), None)
+        if name is None:
+            return
+
+        QtSql.QSqlDatabase.database(name, open=False).close()
+        QtSql.QSqlDatabase.removeDatabase(name)
+        logger.debug(f"closed read connection {name}")
+
+    def writer(self) -> QtSql.QSqlDatabase:
+        """
+        returns the writer connection, creating the database if needed.
+        """
+        # the database api migrates through the modules it imports.
+        from cocktail.core.database import api as db_api
+
+        thread_id = threading.get_ident()
+        with self._lock:
+            owner = self._writer_thread
+            if owner is None:
+                self._writer_thread = thread_id
+
+        if owner is None:
+            try:
+                return db_api.get_connection(
+                    self.filepath, connection_name=self.writer_name
+                )
+            except Exception:
+                self._writer_thread = None
+                raise
+
+        if owner != thread_id:
+            raise RuntimeError("The writer connection belongs to another thread")
+
+        return QtSql.QSqlDatabase.database(self.writer_name, open=False)
+
+    def release_writer(self):
+        """
+        close the writer connection, from the thread that opened it.
+        """
+        with self._lock:
+            owner = self._writer_thread
+        if owner is None:
+            return
+
+        if owner != threading.get_ident():
+            raise RuntimeError("The writer connection belongs to another thread")
+
+        QtSql.QSqlDatabase.database(self.writer_name, open=False).close()
+        QtSql.QSqlDatabase.removeDatabase(self.writer_name)
+        with self._lock:
+            self._writer_thread = None
+
+
+_registries: typing.Dict[str, ConnectionRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(filepath: str = None) -> ConnectionRegistry:
+    """
+    returns the connection registry of a database, the default database when no
+    path is given.
+    """
+    if filepath is None:
+        from cocktail.core.database import api as db_api
+
+        filepath = db_api.get_database_path()
+
+    filepath = os.path.abspath(filepath)
+    with _registries_lock:
+        registry = _registries.get(filepath)
+        if registry is None:
+            # connection names are global, so each database gets its own prefix.
+            name = "cocktail" if not _registries else f"cocktail-{len(_registries)}"
+            registry = _registries[filepath] = ConnectionRegistry(filepath, name)
+
+    return registry
@@ -0,0 +1,169 @@
+"""
+Creators stored once and referenced by id.
+
+Every model used to repeat its creator's name and avatar url. They are stored in
+the creator table instead, keyed by the unique name, and models reference it by
+model.creator_id. Model rows still carry creator_name and creator_image, they are
+resolved to an id when written and joined back in when read, see MODEL_SOURCE.
+
+model (creator_id, updated_at) is indexed so that browsing a creator's models in
+update order is a single range of the index.
+"""
+__all__ = [
+    "CREATOR_COLUMNS",
+    "MODEL_COLUMNS",
+    "MODEL_SOURCE",
+    "creator_columns",
+    "creator_name_column",
+    "create_creator_table",
+    "move_creator_columns",
+    "resolve_creators",
+    "get_creator",
+]
+
+import logging
+import time
+import typing
+
+from PySide6 import QtSql
+
+logger = logging.getLogger(__name__)
+
+# model row fields that are stored in the creator table, and their columns there.
+CREATOR_COLUMNS = {"creator_name": "name", "creator_image": "image"}
+
+# select models with their creator joined back in.
+MODEL_COLUMNS = "m.*, c.name AS creator_name, c.image AS creator_image"
+MODEL_SOURCE = "model m LEFT JOIN creator c ON c.id = m.creator_id"
+
+
+def _exec(db, statement, bind=()):
+    query = QtSql.QSqlQuery(db)
+    query.setForwardOnly(True)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    for index, value in enumerate(bind):
+        query.bindValue(index, value)
+
+    if not query.exec():
+        raise RuntimeError(
+            f"Failed to execute statement: {statement}, {query.lastError().text()}"
+        )
+
+    return query
+
+
+def creator_columns(table_name: str) -> typing.List[str]:
+    if table_name == "model":
+        return list(CREATOR_COLUMNS)
+
+    return []
+
+
+def creator_name_column(db, alias: str = "m") -> str:
+    """
+    the creator name of a model row, for statements that also run on databases
+    that predate the creator table.
+    """
+    if db.record("model").contains("creator_name"):
+        return f"{alias}.creator_name"
+
+    return f"(SELECT name FROM creator WHERE id = {alias}.creator_id)"
+
+
+def create_creator_table(db):
+    _exec(
+        db,
+        "CREATE TABLE IF NOT EXISTS creator (id INTEGER PRIMARY KEY, "
+        "name TEXT NOT NULL UNIQUE, image TEXT NOT NULL DEFAULT '')",
+    )
+
+
+def move_creator_columns(db):
+    """
+    move the inline creator columns into the creator table and drop them, the
+    caller owns the transaction.
+    """
+    start = time.time()
+    create_creator_table(db)
+
+    if db.record("model").contains("creator_name"):
+        # the avatar of the most recently updated model is the current one.
+        _exec(
+            db,
+            "INSERT OR IGNORE INTO creator (name, image) "
+            "SELECT creator_name, creator_image FROM model "
+            "ORDER BY creator_image = '', updated_at DESC",
+        )
+        if not db.record("model").contains("creator_id"):
+            _exec(
+                db,
+                "ALTER TABLE model ADD COLUMN creator_id INTEGER NOT NULL DEFAULT 0",
+            )
+        _exec(
+            db,
+            "UPDATE model SET creator_id = "
+            "(SELECT id FROM creator WHERE name = model.creator_name)",
+        )
+        _exec(db, "ALTER TABLE model DROP COLUMN creator_name")
+        _exec(db, "ALTER TABLE model DROP COLUMN creator_image")
+
+    _exec(
+        db,
+        "CREATE INDEX IF NOT EXISTS model_creator_id_updated_at "
+        "ON model (creator_id, updated_at)",
+    )
+    logger.info(f"moved creators in {time.time() - start:.2f}s")
+
+
+def resolve_creators(db, models: typing.Sequence) -> typing.List:
+    """
+    write the creators of a page of models, returning the models with their
+    creator_id set. the caller owns the transaction.
+    """
+    creators = {}
+    for model in models:
+        if model.creator_name and (
+            model.creator_name not in creators or model.creator_image
+        ):
+            creators[model.creator_name] = model.creator_image or ""
+
+    upsert = QtSql.QSqlQuery(db)
+    upsert.prepare(
+        "INSERT INTO creator (name, image) VALUES(?, ?) ON CONFLICT (name) "
+        "DO UPDATE SET image = excluded.image WHERE excluded.image != ''"
+    )
+    select = QtSql.QSqlQuery(db)
+    select.prepare("SELECT id FROM creator WHERE name = ?")
+
+    creator_ids = {}
+    for name, image in creators.items():
+        upsert.bindValue(0, name)
+        upsert.bindValue(1, image)
+        if not upsert.exec():
+            raise RuntimeError(f"Failed to write creator: {upsert.lastError().text()}")
+
+        select.bindValue(0, name)
+        if not select.exec() or not select.next():
+            raise RuntimeError(f"Failed to read creator: {select.lastError().text()}")
+        creator_ids[name] = select.value(0)
+        select.finish()
+
+    return [
+        model._replace(creator_id=creator_ids.get(model.creator_name, 0))
+        for model in models
+    ]
+
+
+def get_creator(db, creator_id: int) -> typing.Optional[typing.Tuple[str, str]]:
+    """
+    returns the (name, image url) of a creator.
+    """
+    query = _exec(db, "SELECT name, image FROM creator WHERE id = ?", [creator_id])
+    if not query.next():
+        return None
+
+    return query.value(0), query.value(1)
@@ -11,7 +11,7 @@ import enum
 import time
 import typing
 from PySide6 import QtSql
-from cocktail.core.database import util
+from cocktail.core.database import codec, util
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +64,7 @@ def deserialise_items(page: typing.List[dict]):
     versions = []
     files = []
     images = []
+    tags = []
     for model_data in page:
         model, model_versions, model_files, model_images = items_from_model_json(
             model_data
@@ -76,8 +77,17 @@ def deserialise_items(page: typing.List[dict]):
         versions.extend(model_versions)
         files.extend(model_files)
         images.extend(model_images)
+        tags.extend(ModelTag(model.id, tag) for tag in model_data.get("tags", []))
 
-    return Page(models, versions, images, files)
+    return Page(models, versions, images, files, tags)
+
+
+def deserialise_page(raw: bytes):
+    """
+    deserialise a raw models response, this is what runs in a worker process when
+    parsing is pooled so it must stay a picklable module level function.
+    """
+    return deserialise_items(json.loads(raw)["items"])
 
 
 class Model(typing.NamedTuple):
@@ -92,6 +102,10 @@ class Model(typing.NamedTuple):
     image_blur_hash: str
     description: str
     updated_at: int
+    # civitai's level, nsfw is this combined with the word and creator lists.
+    nsfw_level: int = 0
+    # resolved from creator_name when written, see creators.
+    creator_id: int = 0
 
     @classmethod
     def from_json(cls, data: dict):
@@ -122,6 +136,7 @@ class Model(typing.NamedTuple):
             image_blur_hash=image_data.get("hash", "") or "",
             description=data["description"] or "",
             updated_at=timestamp,
+            nsfw_level=data.get("nsfwLevel", 0) or 0,
         )
 
     @classmethod
@@ -132,12 +147,14 @@ class Model(typing.NamedTuple):
             type=record.value("type"),
             category=record.value("category"),
             nsfw=record.value("nsfw"),
-            creator_name=record.value("creator_name"),
-            creator_image=record.value("creator_image"),
+            creator_name=record.value("creator_name") or "",
+            creator_image=record.value("creator_image") or "",
             image=record.value("image"),
             image_blur_hash=record.value("image_blur_hash"),
-            description=record.value("description"),
+            description=record.value("description") or "",
             updated_at=record.value("updated_at"),
+            nsfw_level=record.value("nsfw_level") or 0,
+            creator_id=record.value("creator_id") or 0,
         )
 
 
@@ -235,7 +252,7 @@ class ModelImage(typing.NamedTuple):
             model_id=record.value("model_id"),
             model_version_id=record.value("model_version_id"),
             url=record.value("url"),
-            generation_data=json.loads(record.value("generation_data")),
+            generation_data=codec.LazyMapping(record.value("generation_data")),
             blur_hash=record.value("blur_hash"),
             width=record.value("width"),
             height=record.value("height"),
@@ -267,17 +284,23 @@ class ModelVersion(typing.NamedTuple):
             id=record.value("id"),
             model_id=record.value("model_id"),
             name=record.value("name"),
-            description=record.value("description"),
-            trained_words=json.loads(record.value("trained_words")),
+            description=record.value("description") or "",
+            trained_words=codec.LazySequence(record.value("trained_words")),
             base_model=record.value("base_model"),
         )
 
 
+class ModelTag(typing.NamedTuple):
+    model_id: int
+    name: str
+
+
 class Page(typing.NamedTuple):
     models: typing.List[Model]
     versions: typing.List[ModelVersion]
     images: typing.List[ModelImage]
     files: typing.List[ModelFile]
+    tags: typing.Sequence[ModelTag] = ()
 
 
 def parse_timestamp(date_str: str):
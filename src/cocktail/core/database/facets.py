@@ -0,0 +1,257 @@
+"""
+Incrementally maintained model counts for the search filters.
+
+facet_count holds the number of models for every combination of base model, type,
+category and nsfw level. Each model is counted once with an empty base model, and
+once more for each of its base models. The table is a few thousand rows at most, so
+the counts of any filter combination are a small aggregate over it instead of a
+scan of the model table.
+
+The database api keeps it in sync whenever models are written or deleted. Search
+text, tags and creators are not part of it, counts under a text, tag or creator
+filter are aggregated over the models the search finds, see
+search.build_search_query.
+"""
+__all__ = [
+    "FACETS",
+    "create_facet_table",
+    "build_facet_counts",
+    "add_models",
+    "remove_models",
+    "facet_counts",
+    "nsfw_range",
+]
+
+import logging
+import time
+import typing
+
+from PySide6 import QtSql
+from cocktail.core.database import search
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = "facet_count"
+
+# search filter name, column
+FACETS = {
+    "model_type": "type",
+    "category": "category",
+    "base_model": "base_model",
+}
+
+# the facet rows contributed by a single model.
+MODEL_FACETS = """
+SELECT '' AS base_model, type, category, nsfw FROM model WHERE id = ?
+UNION ALL
+SELECT b.base_model, m.type, m.category, m.nsfw
+FROM model m JOIN model_base_model b ON b.model_id = m.id
+WHERE m.id = ?
+"""
+
+
+def _exec(db, statement, bind=()):
+    query = QtSql.QSqlQuery(db)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    if isinstance(bind, dict):
+        for key, value in bind.items():
+            query.bindValue(f":{key}", value)
+    else:
+        for index, value in enumerate(bind):
+            query.bindValue(index, value)
+
+    if not query.exec():
+        raise RuntimeError(
+            f"Failed to execute statement: {statement}, {query.lastError().text()}"
+        )
+
+    return query
+
+
+def _exec_for_each_model(db, statement, model_ids):
+    query = QtSql.QSqlQuery(db)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    for model_id in model_ids:
+        query.bindValue(0, model_id)
+        query.bindValue(1, model_id)
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to execute statement: {statement}, {query.lastError().text()}"
+            )
+
+
+def create_facet_table(db):
+    _exec(
+        db,
+        f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} ("
+        "base_model TEXT NOT NULL, type TEXT NOT NULL, category TEXT NOT NULL, "
+        "nsfw INTEGER NOT NULL, count INTEGER NOT NULL, "
+        "PRIMARY KEY (base_model, type, category, nsfw)) WITHOUT ROWID",
+    )
+
+
+def build_facet_counts(db):
+    """
+    (re)count every model, the caller owns the transaction.
+    """
+    start = time.time()
+
+    _exec(db, f"DROP TABLE IF EXISTS {TABLE_NAME}")
+    create_facet_table(db)
+    _exec(
+        db,
+        f"INSERT INTO {TABLE_NAME} (base_model, type, category, nsfw, count) "
+        "SELECT '', type, category, nsfw, COUNT(*) FROM model "
+        "GROUP BY type, category, nsfw",
+    )
+    _exec(
+        db,
+        f"INSERT INTO {TABLE_NAME} (base_model, type, category, nsfw, count) "
+        "SELECT b.base_model, m.type, m.category, m.nsfw, COUNT(*) "
+        "FROM model_base_model b JOIN model m ON m.id = b.model_id "
+        "GROUP BY b.base_model, m.type, m.category, m.nsfw",
+    )
+
+    logger.info(f"counted facets in {time.time() - start:.2f}s")
+
+
+def remove_models(db, model_ids: typing.Iterable[int]):
+    """
+    uncount models as they are currently stored, call before they are replaced or
+    deleted. the caller owns the transaction.
+    """
+    _exec_for_each_model(
+        db,
+        f"UPDATE {TABLE_NAME} SET count = count - 1 "
+        f"WHERE (base_model, type, category, nsfw) IN ({MODEL_FACETS})",
+        model_ids,
+    )
+    _exec(db, f"DELETE FROM {TABLE_NAME} WHERE count <= 0")
+
+
+def add_models(db, model_ids: typing.Iterable[int]):
+    """
+    count models as they are currently stored, call once they and their base
+    models are written. the caller owns the transaction.
+    """
+    _exec_for_each_model(
+        db,
+        f"INSERT INTO {TABLE_NAME} (base_model, type, category, nsfw, count) "
+        f"SELECT *, 1 FROM ({MODEL_FACETS}) WHERE true "
+        "ON CONFLICT (base_model, type, category, nsfw) "
+        "DO UPDATE SET count = count + 1",
+        model_ids,
+    )
+
+
+def facet_counts(
+    db,
+    facet: str,
+    text: str = "",
+    model_type: str = "All",
+    category: str = "All",
+    base_model: str = "All",
+    nsfw: int = None,
+    tags: typing.Sequence[str] = (),
+    tag_mode: str = "All",
+    creator_id: int = None,
+) -> typing.List[typing.Tuple[str, int]]:
+    """
+    returns (value, count) for every value of a facet under the other filters.
+
+    the facet's own filter is ignored so that the counts show what selecting
+    another value would find, the filters match search.build_search_query.
+    """
+    column = FACETS[facet]
+    filters = {"model_type": model_type, "category": category}
+
+    if search.match_expression(text) or tags or creator_id:
+        return _search_facet_counts(
+            db,
+            facet,
+            text=text,
+            model_type=model_type,
+            category=category,
+            base_model=base_model,
+            nsfw=nsfw,
+            tags=tags,
+            tag_mode=tag_mode,
+            creator_id=creator_id,
+        )
+
+    where = []
+    bind = []
+    if facet == "base_model":
+        where.append("base_model > ''")
+    else:
+        where.append("base_model = ?")
+        bind.append("" if base_model == "All" else base_model)
+
+    for name, value in filters.items():
+        if name != facet and value != "All":
+            where.append(f"{FACETS[name]} = ?")
+            bind.append(value)
+
+    if nsfw:
+        where.append("nsfw <= ?")
+        bind.append(nsfw)
+
+    query = _exec(
+        db,
+        f"SELECT {column}, SUM(count) FROM {TABLE_NAME} "
+        f"WHERE {' AND '.join(where)} GROUP BY {column} ORDER BY {column}",
+        bind,
+    )
+
+    counts = []
+    while query.next():
+        counts.append((query.value(0), query.value(1)))
+
+    return counts
+
+
+def _search_facet_counts(db, facet: str, **filters):
+    # the search orders by id, which costs the least to sort.
+    filters[facet] = "All"
+    if facet == "base_model":
+        statement, bind = search.build_search_query(
+            columns="m.id", sort_order="Id", **filters
+        )
+        statement = (
+            f"SELECT b.base_model, COUNT(*) FROM ({statement}) r "
+            "JOIN model_base_model b ON b.model_id = r.id "
+            "GROUP BY b.base_model ORDER BY b.base_model"
+        )
+    else:
+        statement, bind = search.build_search_query(
+            columns=f"m.id, m.{FACETS[facet]} AS value", sort_order="Id", **filters
+        )
+        statement = (
+            f"SELECT value, COUNT(*) FROM ({statement}) GROUP BY value ORDER BY value"
+        )
+
+    query = _exec(db, statement, bind)
+
+    counts = []
+    while query.next():
+        counts.append((query.value(0), query.value(1)))
+
+    return counts
+
+
+def nsfw_range(db) -> typing.Optional[typing.Tuple[int, int]]:
+    query = _exec(
+        db, f"SELECT MIN(nsfw), MAX(nsfw) FROM {TABLE_NAME} WHERE base_model = ''"
+    )
+    if not query.next() or query.value(0) == "":
+        return None
+
+    return query.value(0), query.value(1)
@@ -0,0 +1,207 @@
+"""
+Image retention.
+
+model_image holds every image of every version and is by far the largest table.
+A retention limit keeps only the first `limit` images of each version, newest
+first as the gallery lists them, and 0 keeps every image. The limit is stored in
+the metadata table, so every writer of the database applies the same policy.
+
+Versions whose images were cut short are recorded in pruned_image_version, their
+full gallery is requested from the api when it is opened, see
+cocktail.core.providers.VersionImageProvider.
+"""
+__all__ = [
+    "RETENTION_KEY",
+    "create_pruned_table",
+    "get_retention",
+    "set_retention",
+    "retain_images",
+    "prune_images",
+    "remove_versions",
+    "is_pruned",
+]
+
+import logging
+import time
+import typing
+
+from PySide6 import QtSql
+
+logger = logging.getLogger(__name__)
+
+RETENTION_KEY = "images_per_version"
+
+
+def _exec(db, statement, bind=()):
+    query = QtSql.QSqlQuery(db)
+    query.setForwardOnly(True)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    for index, value in enumerate(bind):
+        query.bindValue(index, value)
+
+    if not query.exec():
+        raise RuntimeError(
+            f"Failed to execute statement: {statement}, {query.lastError().text()}"
+        )
+
+    return query
+
+
+def _exec_for_each(db, statement, values):
+    query = QtSql.QSqlQuery(db)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    for value in values:
+        query.bindValue(0, value)
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to execute statement: {statement}, {query.lastError().text()}"
+            )
+
+
+def create_pruned_table(db):
+    _exec(
+        db,
+        "CREATE TABLE IF NOT EXISTS pruned_image_version "
+        "(model_version_id INTEGER PRIMARY KEY)",
+    )
+
+
+def get_retention(db) -> int:
+    """
+    returns the number of images kept per version, 0 keeps every image.
+    """
+    query = _exec(db, "SELECT value FROM metadata WHERE key = ?", [RETENTION_KEY])
+    value = query.value(0) if query.next() else 0
+    query.finish()
+
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def set_retention(db, limit: int):
+    """
+    store the retention limit and prune the images already stored to it.
+    """
+    limit = max(int(limit), 0)
+    if limit == get_retention(db):
+        return
+
+    db.transaction()
+    try:
+        _exec(
+            db,
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES(?, ?)",
+            [RETENTION_KEY, limit],
+        )
+        prune_images(db, limit)
+    except Exception:
+        db.rollback()
+        raise
+
+    db.commit()
+
+
+def retain_images(db, images: typing.Sequence) -> typing.List:
+    """
+    returns the images of a page that are kept, and records which of its versions
+    were cut short. the caller owns the transaction.
+    """
+    version_ids = {image.model_version_id for image in images}
+    _exec_for_each(
+        db, "DELETE FROM pruned_image_version WHERE model_version_id = ?", version_ids
+    )
+
+    limit = get_retention(db)
+    if not limit:
+        return list(images)
+
+    # images replaced upstream would otherwise add up past the limit.
+    _exec_for_each(
+        db, "DELETE FROM model_image WHERE model_version_id = ?", version_ids
+    )
+
+    by_version = {}
+    for image in images:
+        by_version.setdefault(image.model_version_id, []).append(image)
+
+    kept = []
+    pruned = []
+    for version_id, version_images in by_version.items():
+        version_images.sort(key=lambda image: image.id, reverse=True)
+        kept.extend(version_images[:limit])
+        if len(version_images) > limit:
+            pruned.append(version_id)
+
+    _exec_for_each(
+        db, "INSERT INTO pruned_image_version (model_version_id) VALUES(?)", pruned
+    )
+    return kept
+
+
+def prune_images(db, limit: int):
+    """
+    delete the images past the first `limit` of every version. the caller owns the
+    transaction.
+    """
+    if not limit:
+        return
+
+    start = time.time()
+    ranked = (
+        "SELECT id, model_version_id, ROW_NUMBER() OVER "
+        "(PARTITION BY model_version_id ORDER BY id DESC) AS position "
+        "FROM model_image"
+    )
+    _exec(
+        db,
+        "INSERT OR IGNORE INTO pruned_image_version (model_version_id) "
+        f"SELECT DISTINCT model_version_id FROM ({ranked}) WHERE position > ?",
+        [limit],
+    )
+    query = _exec(
+        db,
+        f"DELETE FROM model_image WHERE id IN "
+        f"(SELECT id FROM ({ranked}) WHERE position > ?)",
+        [limit],
+    )
+    logger.info(
+        f"pruned {query.numRowsAffected()} images to {limit} per version in "
+        f"{time.time() - start:.2f}s"
+    )
+
+
+def remove_versions(db, model_ids: typing.Iterable[int]):
+    """
+    forget the pruned versions of models, call before they are deleted. the caller
+    owns the transaction.
+    """
+    _exec_for_each(
+        db,
+        "DELETE FROM pruned_image_version WHERE model_version_id IN "
+        "(SELECT id FROM model_version WHERE model_id = ?)",
+        model_ids,
+    )
+
+
+def is_pruned(db, model_version_id: int) -> bool:
+    """
+    whether some images of a version are only available from the api.
+    """
+    query = _exec(
+        db,
+        "SELECT 1 FROM pruned_image_version WHERE model_version_id = ?",
+        [model_version_id],
+    )
+    pruned = query.next()
+    query.finish()
+    return pruned
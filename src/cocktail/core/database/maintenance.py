@@ -0,0 +1,338 @@
+"""
+Routine upkeep of the database file.
+
+Syncs replace models in place, which leaves free pages behind, grows the write
+ahead log and lets the planner statistics drift from the data. run_maintenance
+runs the steps in STEPS on the writer connection:
+
+    optimize      ANALYZE once, then PRAGMA optimize to refresh stale statistics
+    vacuum        return free pages to the file system, see _vacuum
+    checkpoint    copy the log into the database and truncate it
+
+DatabaseMaintenance also applies the image retention limit first when one is
+configured, see cocktail.core.database.images, so the vacuum releases the pruned
+images. Each run records the file sizes before and after and the duration of each step in
+the metadata table, see get_maintenance_report. DatabaseMaintenance schedules runs
+after a sync and when the database has been idle.
+
+Run it by hand with:
+
+    python -m cocktail.core.database.maintenance [database] [--images-per-version N]
+"""
+__all__ = [
+    "STEPS",
+    "DatabaseMaintenance",
+    "run_maintenance",
+    "get_maintenance_report",
+    "retention_steps",
+    "database_sizes",
+]
+
+import argparse
+import datetime
+import functools
+import json
+import logging
+import os
+import time
+import typing
+
+from PySide6 import QtCore, QtSql
+from cocktail.core.database import api as db_api, connections, images
+
+logger = logging.getLogger(__name__)
+
+METADATA_KEY = "maintenance"
+
+# rows sampled per index by ANALYZE, enough for the planner at a fraction of the
+# cost of reading every row.
+ANALYSIS_LIMIT = 1000
+
+# databases created before incremental vacuum was enabled are rebuilt once their
+# free pages pass this fraction of the file.
+REBUILD_FREE_FRACTION = 0.1
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _pragma(db, statement: str) -> list:
+    query = QtSql.QSqlQuery(db)
+    if not query.exec(f"PRAGMA {statement}"):
+        raise RuntimeError(
+            f"Failed to execute pragma {statement}: {query.lastError().text()}"
+        )
+
+    row = []
+    if query.next():
+        row = [query.value(index) for index in range(query.record().count())]
+
+    query.finish()
+    return row
+
+
+def _exec(db, statement: str):
+    query = QtSql.QSqlQuery(db)
+    if not query.exec(statement):
+        raise RuntimeError(
+            f"Failed to execute statement: {statement}, {query.lastError().text()}"
+        )
+    query.finish()
+
+
+def database_sizes(db) -> typing.Dict[str, int]:
+    """
+    returns the size in bytes of the database file, its log and its free pages.
+    """
+    filepath = db.databaseName()
+    page_size = _pragma(db, "page_size")[0]
+
+    def file_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    return {
+        "database": file_size(filepath),
+        "wal": file_size(f"{filepath}-wal"),
+        "free": _pragma(db, "freelist_count")[0] * page_size,
+    }
+
+
+def _has_statistics(db) -> bool:
+    # QSqlDatabase.tables only lists sqlite_master as a system table.
+    query = QtSql.QSqlQuery(db)
+    if not query.exec("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"):
+        raise RuntimeError(f"Failed to read the schema: {query.lastError().text()}")
+
+    exists = query.next()
+    query.finish()
+    return exists
+
+
+def _optimize(db):
+    _pragma(db, f"analysis_limit = {ANALYSIS_LIMIT}")
+
+    # optimize only refreshes statistics that exist, the first run gathers them.
+    if not _has_statistics(db):
+        _exec(db, "ANALYZE")
+    else:
+        _pragma(db, "optimize")
+
+
+def _incremental_vacuum(db, page_count: int):
+    # every step of incremental_vacuum frees a single page, and the driver steps
+    # a statement without result columns only once per exec.
+    query = QtSql.QSqlQuery(db)
+    query.prepare("PRAGMA incremental_vacuum")
+
+    db.transaction()
+    try:
+        for _ in range(page_count):
+            if not query.exec():
+                raise RuntimeError(
+                    f"Failed to vacuum incrementally: {query.lastError().text()}"
+                )
+    except Exception:
+        query.finish()
+        db.rollback()
+        raise
+
+    query.finish()
+    db.commit()
+
+
+def _vacuum(db):
+    """
+    release free pages incrementally, a full VACUUM rewrites the whole file and is
+    only run once to enable incremental vacuum on older databases.
+    """
+    free_count = _pragma(db, "freelist_count")[0]
+    if _pragma(db, "auto_vacuum")[0] == AUTO_VACUUM_INCREMENTAL:
+        if free_count:
+            _incremental_vacuum(db, free_count)
+        return
+
+    page_count = _pragma(db, "page_count")[0]
+    if page_count and free_count / page_count >= REBUILD_FREE_FRACTION:
+        logger.info("rebuilding database to enable incremental vacuum")
+        _pragma(db, f"auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+        _exec(db, "VACUUM")
+
+
+def _checkpoint(db):
+    busy, log_pages, checkpointed = _pragma(db, "wal_checkpoint(TRUNCATE)")
+    if busy:
+        logger.info(f"checkpoint blocked by readers, {checkpointed}/{log_pages} pages")
+
+
+# name, step
+STEPS = [
+    ("optimize", _optimize),
+    ("vacuum", _vacuum),
+    ("checkpoint", _checkpoint),
+]
+
+
+def run_maintenance(db, steps=STEPS) -> dict:
+    """
+    run the maintenance steps and record the report in the metadata table.
+
+    the steps manage their own transactions, so no transaction may be open.
+    """
+    start = time.time()
+    report = {
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "before": database_sizes(db),
+        "steps": {},
+    }
+
+    for name, step in steps:
+        step_start = time.time()
+        step(db)
+        report["steps"][name] = round(time.time() - step_start, 3)
+
+    report["after"] = database_sizes(db)
+    report["duration"] = round(time.time() - start, 3)
+
+    # written after the checkpoint, which leaves it in the log until the next.
+    db_api.set_metadata(db, METADATA_KEY, json.dumps(report))
+
+    logger.info(
+        f"maintenance finished in {report['duration']:.2f}s, database "
+        f"{report['before']['database']} -> {report['after']['database']} bytes"
+    )
+    return report
+
+
+def retention_steps(images_per_version: typing.Optional[int]) -> list:
+    """
+    the steps to run before STEPS to apply an image retention limit, none when the
+    limit is not configured.
+    """
+    if images_per_version is None:
+        return []
+
+    return [
+        (
+            "prune_images",
+            functools.partial(images.set_retention, limit=images_per_version),
+        )
+    ]
+
+
+def get_maintenance_report(db) -> typing.Optional[dict]:
+    """
+    returns the report of the last maintenance run, if any.
+    """
+    value = db_api.get_metadata(db, METADATA_KEY)
+    if value is None:
+        return None
+
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+class DatabaseMaintenance(QtCore.QObject):
+    """
+    Runs maintenance on the writer connection of a database.
+
+    Intended to live on the same thread as the DatabaseWriter, whose connection it
+    shares. requestMaintenance runs once the database has been idle for
+    `idle_interval` milliseconds, and at most once every `min_interval` seconds.
+
+    `images_per_version` is the image retention limit to apply, None leaves the
+    limit stored in the database as it is.
+    """
+
+    maintenanceFinished = QtCore.Signal(object)
+
+    def __init__(
+        self,
+        filepath=None,
+        idle_interval=60000,
+        min_interval=3600,
+        images_per_version=None,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.filepath = filepath
+        self.images_per_version = images_per_version
+        self.idle_interval = idle_interval
+        self.min_interval = min_interval
+        self._last_run = 0.0
+        self._idle_timer: QtCore.QTimer = None
+
+    def _timer(self) -> QtCore.QTimer:
+        # created lazily so it belongs to the thread the object was moved to.
+        if self._idle_timer is None:
+            self._idle_timer = QtCore.QTimer(self)
+            self._idle_timer.setSingleShot(True)
+            self._idle_timer.setInterval(self.idle_interval)
+            self._idle_timer.timeout.connect(self.run)
+        return self._idle_timer
+
+    def requestMaintenance(self):
+        """
+        run once the database stays idle, a later request postpones the run.
+        """
+        if time.time() - self._last_run < self.min_interval:
+            return
+
+        self._timer().start()
+
+    def postpone(self):
+        """
+        called while the database is busy, a pending run waits for the next request.
+        """
+        if self._idle_timer is not None:
+            self._idle_timer.stop()
+
+    def close(self):
+        """
+        stop the idle timer from the thread it belongs to, before that thread ends.
+        """
+        if self._idle_timer is not None:
+            self._idle_timer.stop()
+            self._idle_timer.setParent(None)
+            self._idle_timer = None
+
+    def run(self):
+        connection = connections.get_registry(self.filepath).writer()
+        self._last_run = time.time()
+        try:
+            report = run_maintenance(
+                connection, retention_steps(self.images_per_version) + STEPS
+            )
+        except Exception:
+            logger.exception("database maintenance failed")
+            return
+
+        self.maintenanceFinished.emit(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("database", nargs="?")
+    parser.add_argument(
+        "--images-per-version",
+        type=int,
+        help="images kept per model version, 0 keeps every image",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = QtCore.QCoreApplication([])
+    db = db_api.get_connection(args.database)
+
+    report = run_maintenance(db, retention_steps(args.images_per_version) + STEPS)
+    print(json.dumps(report, indent=2))
+
+    db.close()
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
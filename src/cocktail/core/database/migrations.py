@@ -0,0 +1,227 @@
+"""
+In place schema migrations.
+
+schema.sql describes the database at BASE_SCHEMA_VERSION, every later change is a
+migration step that upgrades `PRAGMA user_version` by one. New databases are
+created from schema.sql and then migrated like any other, so there is a single
+definition of each schema change.
+
+To change the schema, append a step to MIGRATIONS, CURRENT_SCHEMA_VERSION follows.
+"""
+__all__ = [
+    "Migration",
+    "MIGRATIONS",
+    "BASE_SCHEMA_VERSION",
+    "CURRENT_SCHEMA_VERSION",
+    "can_migrate",
+    "migrate",
+]
+
+import logging
+import time
+import typing
+
+from PySide6 import QtSql
+from cocktail.core.database import (
+    codec,
+    cold_storage,
+    creators,
+    facets,
+    images,
+    nsfw,
+    search,
+    tags,
+)
+
+logger = logging.getLogger(__name__)
+
+BASE_SCHEMA_VERSION = 2
+
+
+class Migration(typing.NamedTuple):
+    version: int
+    description: str
+    apply: typing.Callable[[QtSql.QSqlDatabase], None]
+    # reclaim the space freed by the step, which cannot happen in its transaction.
+    vacuum: bool = False
+
+
+def _exec_all(db, statements: typing.Sequence[str]):
+    for statement in statements:
+        query = QtSql.QSqlQuery(db)
+        if not query.exec(statement):
+            raise RuntimeError(
+                f"Failed to execute statement: {statement}, {query.lastError().text()}"
+            )
+
+
+# derived from the queries in query_plans.QUERY_PLANS, which checks they are used.
+QUERY_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS model_updated_at ON model (updated_at)",
+    "CREATE INDEX IF NOT EXISTS model_type_updated_at ON model (type, updated_at)",
+    "CREATE INDEX IF NOT EXISTS model_category_updated_at ON model (category, updated_at)",
+    "CREATE INDEX IF NOT EXISTS model_name ON model (name)",
+    "CREATE INDEX IF NOT EXISTS model_nsfw ON model (nsfw)",
+    "CREATE INDEX IF NOT EXISTS model_version_model_id ON model_version (model_id, id)",
+    "CREATE INDEX IF NOT EXISTS model_version_base_model ON model_version (base_model, model_id)",
+    "CREATE INDEX IF NOT EXISTS model_file_model_version_id ON model_file (model_version_id, safe, is_primary)",
+    "CREATE INDEX IF NOT EXISTS model_image_model_version_id ON model_image (model_version_id, id)",
+]
+
+
+def _create_query_indexes(db):
+    _exec_all(db, QUERY_INDEXES)
+    _exec_all(db, ["ANALYZE"])
+
+
+def _create_base_model_membership(db):
+    _exec_all(
+        db,
+        [
+            "CREATE TABLE IF NOT EXISTS model_base_model ("
+            "model_id INTEGER NOT NULL, base_model TEXT NOT NULL, "
+            "PRIMARY KEY (model_id, base_model)) WITHOUT ROWID",
+            "CREATE INDEX IF NOT EXISTS model_base_model_base_model "
+            "ON model_base_model (base_model)",
+            "INSERT OR IGNORE INTO model_base_model (model_id, base_model) "
+            "SELECT DISTINCT model_id, base_model FROM model_version",
+            # only the search filter used this, the membership table replaces it.
+            "DROP INDEX IF EXISTS model_version_base_model",
+            "ANALYZE model_base_model",
+        ],
+    )
+
+
+# columns holding json before the codec.
+ENCODED_COLUMNS = {
+    "model_image": "generation_data",
+    "model_version": "trained_words",
+}
+
+
+def _encode_structured_columns(db):
+    for table_name, column in ENCODED_COLUMNS.items():
+        update = QtSql.QSqlQuery(db)
+        update.prepare(f"UPDATE {table_name} SET {column} = ? WHERE id = ?")
+
+        # rows are rewritten as they are read, updated rows no longer match.
+        statement = (
+            f"SELECT id, {column} FROM {table_name} WHERE typeof({column}) = 'text'"
+        )
+        query = QtSql.QSqlQuery(db)
+        query.setForwardOnly(True)
+        if not query.exec(statement):
+            raise RuntimeError(
+                f"Failed to execute statement: {statement}, {query.lastError().text()}"
+            )
+
+        while query.next():
+            update.bindValue(0, codec.encode(codec.loads(query.value(1) or "null")))
+            update.bindValue(1, query.value(0))
+            if not update.exec():
+                raise RuntimeError(
+                    f"Failed to encode {table_name}.{column}: "
+                    f"{update.lastError().text()}"
+                )
+
+
+MIGRATIONS: typing.List[Migration] = [
+    Migration(3, "full text search index", search.build_search_index),
+    Migration(
+        4, "secondary indexes for search and detail queries", _create_query_indexes
+    ),
+    Migration(5, "base model membership table", _create_base_model_membership),
+    Migration(6, "facet counts", facets.build_facet_counts),
+    Migration(
+        7,
+        "compressed descriptions",
+        cold_storage.move_cold_columns,
+        vacuum=True,
+    ),
+    Migration(
+        8,
+        "binary encoded generation data and trained words",
+        _encode_structured_columns,
+        vacuum=True,
+    ),
+    Migration(9, "civitai nsfw level and rescored nsfw", nsfw.add_nsfw_level_column),
+    Migration(10, "model tags", tags.backfill_category_tags),
+    Migration(11, "creator table", creators.move_creator_columns, vacuum=True),
+    Migration(12, "pruned image versions", images.create_pruned_table),
+]
+
+CURRENT_SCHEMA_VERSION = BASE_SCHEMA_VERSION + len(MIGRATIONS)
+
+
+def _user_version(db) -> int:
+    query = QtSql.QSqlQuery(db)
+    if not query.exec("PRAGMA user_version") or not query.next():
+        raise RuntimeError(f"Failed to get schema version: {query.lastError().text()}")
+
+    return query.value(0)
+
+
+def _set_user_version(db, version: int):
+    # pragmas do not accept bound values.
+    query = QtSql.QSqlQuery(db)
+    if not query.exec(f"PRAGMA user_version = {int(version)}"):
+        raise RuntimeError(f"Failed to set schema version: {query.lastError().text()}")
+
+
+def can_migrate(version: int) -> bool:
+    return BASE_SCHEMA_VERSION <= version <= CURRENT_SCHEMA_VERSION
+
+
+def migrate(
+    db,
+    target: int = CURRENT_SCHEMA_VERSION,
+    progress: typing.Callable[[int, int], None] = None,
+):
+    """
+    upgrade the database to the target version, returning (version, elapsed) for
+    every step that ran.
+
+    each step runs in its own transaction together with its user_version bump, so
+    a failed step leaves the database at the previous version.
+    """
+    version = _user_version(db)
+    if not can_migrate(version):
+        raise ValueError(f"cannot migrate schema version {version}")
+
+    steps = [
+        migration for migration in MIGRATIONS if version < migration.version <= target
+    ]
+
+    timings = []
+    for index, migration in enumerate(steps):
+        if progress is not None:
+            progress(index, len(steps))
+
+        logger.info(f"migrating to {migration.version}: {migration.description}")
+        start = time.time()
+
+        db.transaction()
+        try:
+            migration.apply(db)
+            _set_user_version(db, migration.version)
+        except Exception:
+            db.rollback()
+            raise
+
+        db.commit()
+
+        elapsed = time.time() - start
+        timings.append((migration.version, elapsed))
+        logger.info(f"migrated to {migration.version} in {elapsed:.2f}s")
+
+    if any(migration.vacuum for migration in steps):
+        start = time.time()
+        query = QtSql.QSqlQuery(db)
+        if not query.exec("VACUUM"):
+            raise RuntimeError(f"Failed to vacuum: {query.lastError().text()}")
+        logger.info(f"vacuumed in {time.time() - start:.2f}s")
+
+    if progress is not None:
+        progress(len(steps), len(steps))
+
+    return timings
@@ -0,0 +1,193 @@
+"""
+Re-scores the nsfw column of every model in an existing database.
+
+The stored score combines civitai's level, kept in model.nsfw_level, with the word
+and creator lists in util. When those lists change, run
+
+    python -m cocktail.core.database.nsfw [database]
+
+to apply them to the whole catalog without a re-sync. Models are read in id order
+a chunk at a time and only rows whose score changed are written.
+"""
+__all__ = ["add_nsfw_level_column", "reclassify_nsfw"]
+
+import argparse
+import logging
+import time
+import typing
+
+from PySide6 import QtCore, QtSql
+from cocktail.core.database import codec, creators, facets, tags, util
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+# the prompt of the cover image, which is found through the model's versions. the
+# creator name is inline before the creator table migration, see creators, and
+# there are no tags before the tag tables, see tags.
+CHUNK_STATEMENT = """
+SELECT m.id, m.nsfw, m.nsfw_level, {creator_name}, m.name, (
+    SELECT i.generation_data FROM model_version v
+    JOIN model_image i ON i.model_version_id = v.id
+    WHERE v.model_id = m.id AND i.url = m.image
+    LIMIT 1
+), {tag_names}
+FROM model m WHERE m.id > ? ORDER BY m.id LIMIT ?
+"""
+
+
+def _exec(db, statement, bind=()):
+    query = QtSql.QSqlQuery(db)
+    query.setForwardOnly(True)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    for index, value in enumerate(bind):
+        query.bindValue(index, value)
+
+    if not query.exec():
+        raise RuntimeError(
+            f"Failed to execute statement: {statement}, {query.lastError().text()}"
+        )
+
+    return query
+
+
+def _prompt(data) -> str:
+    if not data:
+        return ""
+
+    try:
+        return codec.LazyMapping(data).get("prompt", "") or ""
+    except ValueError:
+        return ""
+
+
+def _classify_chunk(db, after: int, chunk_size: int):
+    """
+    returns the number of models read, the last id and the (id, nsfw) of the
+    models whose score changed.
+    """
+    statement = CHUNK_STATEMENT.format(
+        creator_name=creators.creator_name_column(db),
+        tag_names=tags.tag_names_column(db),
+    )
+    query = _exec(db, statement, [after, chunk_size])
+
+    count = 0
+    last_id = None
+    changed = []
+    while query.next():
+        count += 1
+        model_id = last_id = query.value(0)
+        nsfw = util.classify_nsfw(
+            query.value(2),
+            query.value(3) or "",
+            query.value(4) or "",
+            tags=(query.value(6) or "").split(tags.TAG_SEPARATOR),
+            prompt=_prompt(query.value(5)),
+        )
+        if nsfw != query.value(1):
+            changed.append((model_id, nsfw))
+
+    query.finish()
+    return count, last_id, changed
+
+
+def _write_chunk(db, changed: typing.List[typing.Tuple[int, int]]):
+    model_ids = [model_id for model_id, _ in changed]
+    facets.remove_models(db, model_ids)
+
+    update = QtSql.QSqlQuery(db)
+    update.prepare("UPDATE model SET nsfw = ? WHERE id = ?")
+    for model_id, nsfw in changed:
+        update.bindValue(0, nsfw)
+        update.bindValue(1, model_id)
+        if not update.exec():
+            raise RuntimeError(f"Failed to update nsfw: {update.lastError().text()}")
+
+    facets.add_models(db, model_ids)
+
+
+def reclassify_nsfw(
+    db,
+    chunk_size: int = CHUNK_SIZE,
+    commit: bool = True,
+    progress: typing.Callable[[int, int], None] = None,
+) -> typing.Tuple[int, int]:
+    """
+    re-score every model, returning (models read, models changed).
+
+    each chunk is written in its own transaction, pass commit=False when the caller
+    owns the transaction. the facet counts are kept in sync.
+    """
+    start = time.time()
+    after = -1
+    read = 0
+    updated = 0
+
+    while True:
+        count, last_id, changed = _classify_chunk(db, after, chunk_size)
+        if not count:
+            break
+
+        if changed:
+            if commit:
+                db.transaction()
+            try:
+                _write_chunk(db, changed)
+            except Exception:
+                if commit:
+                    db.rollback()
+                raise
+
+            if commit:
+                db.commit()
+
+        after = last_id
+        read += count
+        updated += len(changed)
+        if progress is not None:
+            progress(read, updated)
+
+    logger.info(f"reclassified models in {time.time() - start:.2f}s, {updated} changed")
+    return read, updated
+
+
+def add_nsfw_level_column(db):
+    """
+    keep civitai's level separately from the score so it can be recomputed, levels
+    are 1 to 32, scores from the legacy word check were stored as 50.
+    """
+    if not db.record("model").contains("nsfw_level"):
+        _exec(db, "ALTER TABLE model ADD COLUMN nsfw_level INTEGER NOT NULL DEFAULT 0")
+        _exec(db, "UPDATE model SET nsfw_level = nsfw WHERE nsfw BETWEEN 1 AND 32")
+
+    reclassify_nsfw(db, commit=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("database", nargs="?")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    # the database api migrates through this module.
+    from cocktail.core.database import api as db_api
+
+    logging.basicConfig(level=logging.INFO)
+    app = QtCore.QCoreApplication([])
+    db = db_api.get_connection(args.database)
+
+    read, updated = reclassify_nsfw(db, args.chunk_size)
+    print(f"{updated} of {read} models changed")
+
+    db.close()
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
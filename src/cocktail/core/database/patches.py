@@ -0,0 +1,314 @@
+"""
+Incremental patches on top of the released database snapshot.
+
+A release may carry `database-patch-<from>-<to>.json.gz` assets next to the full
+`database.zip`. Each patch is a gzip compressed changeset of model rows that moves
+a database from one snapshot version to the next, the snapshot version of a
+database is recorded in its metadata table.
+
+Patches are created from a synced database with:
+
+    python -m cocktail.core.database.patches create cocktail.sqlite3 -o dist/ \
+        --base released.sqlite3
+
+where the base is the database of the previous snapshot, models it holds that are
+gone from the synced database are deleted by the patch.
+"""
+__all__ = [
+    "get_snapshot_version",
+    "set_snapshot_version",
+    "parse_patch_name",
+    "select_patches",
+    "apply_patch",
+    "create_patch",
+    "deleted_model_ids",
+]
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import typing
+
+from PySide6 import QtSql
+from cocktail.core.database import (
+    api as db_api,
+    codec,
+    cold_storage,
+    creators,
+    data_classes,
+    tags,
+)
+
+logger = logging.getLogger(__name__)
+
+PATCH_NAME_PATTERN = re.compile(r"^database-patch-(\d+)-(\d+)\.json\.gz$")
+
+TABLES = {
+    "models": ("model", data_classes.Model),
+    "versions": ("model_version", data_classes.ModelVersion),
+    "files": ("model_file", data_classes.ModelFile),
+    "images": ("model_image", data_classes.ModelImage),
+}
+
+
+def get_snapshot_version(db) -> int:
+    return int(db_api.get_metadata(db, "snapshot_version", 0))
+
+
+def set_snapshot_version(db, version: int):
+    db_api.set_metadata(db, "snapshot_version", int(version))
+
+
+def patch_name(from_version: int, to_version: int):
+    return f"database-patch-{from_version}-{to_version}.json.gz"
+
+
+def parse_patch_name(name: str) -> typing.Optional[typing.Tuple[int, int]]:
+    match = PATCH_NAME_PATTERN.match(name)
+    if match is None:
+        return None
+
+    return int(match.group(1)), int(match.group(2))
+
+
+def select_patches(assets: typing.Dict[str, str], current_version: int):
+    """
+    Returns the chain of (from, to, url) patches that upgrades current_version as
+    far as the available assets allow, taking the largest step at each hop.
+    """
+    patches = {}
+    for name, url in assets.items():
+        versions = parse_patch_name(name)
+        if versions is None:
+            continue
+
+        from_version, to_version = versions
+        if to_version <= from_version:
+            continue
+
+        best = patches.get(from_version)
+        if best is None or to_version > best[0]:
+            patches[from_version] = (to_version, url)
+
+    chain = []
+    version = current_version
+    while version in patches:
+        to_version, url = patches[version]
+        chain.append((version, to_version, url))
+        version = to_version
+
+    return chain
+
+
+def _local_updated_at(db, model_ids):
+    updated_at = {}
+    query = QtSql.QSqlQuery(db)
+    query.prepare("SELECT updated_at FROM model WHERE id = ?")
+
+    for model_id in model_ids:
+        query.bindValue(0, model_id)
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to execute statement: {query.lastError().text()}"
+            )
+        if query.next():
+            updated_at[model_id] = query.value(0)
+
+    return updated_at
+
+
+def apply_patch(db, data: bytes):
+    """
+    apply a compressed patch in a single transaction.
+
+    models that were synced locally after the patch was made are left untouched.
+    """
+    patch = json.loads(gzip.decompress(data))
+    from_version, to_version = patch["from"], patch["to"]
+
+    current_version = get_snapshot_version(db)
+    if current_version != from_version:
+        raise ValueError(
+            f"patch {from_version}-{to_version} does not apply to snapshot {current_version}"
+        )
+
+    models = [data_classes.Model(**row) for row in patch["models"]]
+    local_updated_at = _local_updated_at(db, [model.id for model in models])
+    skipped = {
+        model.id
+        for model in models
+        if local_updated_at.get(model.id, 0) > model.updated_at
+    }
+
+    rows = {}
+    for key, (_, row_type) in TABLES.items():
+        rows[key] = [
+            row
+            for row in (row_type(**values) for values in patch[key])
+            if (row.id if key == "models" else row.model_id) not in skipped
+        ]
+
+    rows["tags"] = [
+        data_classes.ModelTag(model_id, name)
+        for model_id, name in patch.get("tags", [])
+        if model_id not in skipped
+    ]
+
+    page = data_classes.Page(**rows)
+
+    db.transaction()
+    try:
+        db_api.delete_models(db, patch.get("deleted_models", []))
+        db_api.write_page(db, page)
+        set_snapshot_version(db, to_version)
+    except Exception:
+        db.rollback()
+        raise
+
+    db.commit()
+
+    logger.info(
+        f"applied patch {from_version}-{to_version}: {len(page.models)} models, "
+        f"{len(skipped)} skipped as newer locally"
+    )
+
+
+def _select_rows(db, table_name, row_type, where, bind):
+    # models carry their creator so the patch applies to any database.
+    if table_name == "model":
+        statement = (
+            f"SELECT {creators.MODEL_COLUMNS} FROM {creators.MODEL_SOURCE} "
+            f"WHERE m.{where}"
+        )
+    else:
+        statement = f"SELECT * FROM {table_name} WHERE {where}"
+
+    query = QtSql.QSqlQuery(db)
+    query.prepare(statement)
+    for key, value in bind.items():
+        query.bindValue(key, value)
+
+    if not query.exec():
+        raise RuntimeError(f"Failed to execute statement: {query.lastError().text()}")
+
+    cold_columns = cold_storage.cold_columns(table_name)
+    while query.next():
+        row = row_type.from_record(query.record())
+        for column in cold_columns:
+            value = cold_storage.get_cold_value(db, table_name, row.id)
+            row = row._replace(**{column: value})
+
+        yield row._asdict()
+
+
+def _model_ids(db) -> typing.Set[int]:
+    query = QtSql.QSqlQuery(db)
+    query.setForwardOnly(True)
+    if not query.exec("SELECT id FROM model"):
+        raise RuntimeError(f"Failed to execute statement: {query.lastError().text()}")
+
+    model_ids = set()
+    while query.next():
+        model_ids.add(query.value(0))
+    query.finish()
+
+    return model_ids
+
+
+def deleted_model_ids(base, db) -> typing.List[int]:
+    """
+    ids of the models in the base database that are gone from db.
+    """
+    return sorted(_model_ids(base) - _model_ids(db))
+
+
+def create_patch(db, since: int, base=None):
+    """
+    Returns a compressed patch containing every model updated after `since`, moving
+    the database from its current snapshot version to the next one.
+
+    models in the `base` database of the previous snapshot that are gone from db are
+    recorded as deleted, without a base no deletions are recorded.
+    """
+    from_version = get_snapshot_version(db)
+    to_version = from_version + 1
+    where = "model_id IN (SELECT id FROM model WHERE updated_at > :since)"
+
+    patch = {
+        "from": from_version,
+        "to": to_version,
+        "deleted_models": [] if base is None else deleted_model_ids(base, db),
+    }
+
+    for key, (table_name, row_type) in TABLES.items():
+        condition = "updated_at > :since" if key == "models" else where
+        patch[key] = list(
+            _select_rows(db, table_name, row_type, condition, {":since": since})
+        )
+
+    patch["tags"] = tags.select_model_tags(db, since)
+
+    return (
+        from_version,
+        to_version,
+        gzip.compress(json.dumps(patch, default=codec.to_json).encode("utf-8")),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser(
+        "create", help="write the next patch and advance the snapshot version"
+    )
+    create_parser.add_argument("database")
+    create_parser.add_argument("-o", "--output", default=".")
+    create_parser.add_argument(
+        "--base",
+        help="database of the previous snapshot, to record the models deleted since",
+    )
+
+    args = parser.parse_args()
+
+    from PySide6 import QtCore
+
+    app = QtCore.QCoreApplication([])
+    db = db_api.get_connection(args.database)
+
+    base = None
+    if args.base:
+        base = db_api.get_connection(args.base, connection_name="cocktail-base")
+        if get_snapshot_version(base) != get_snapshot_version(db):
+            raise SystemExit(
+                f"base snapshot {get_snapshot_version(base)} does not match "
+                f"snapshot {get_snapshot_version(db)}"
+            )
+    else:
+        logger.warning("no base database given, deleted models are not recorded.")
+
+    since = int(db_api.get_metadata(db, "snapshot_high_water_mark", 0))
+    from_version, to_version, data = create_patch(db, since, base)
+    if base is not None:
+        base.close()
+
+    os.makedirs(args.output, exist_ok=True)
+    filepath = os.path.join(args.output, patch_name(from_version, to_version))
+    with open(filepath, "wb") as file:
+        file.write(data)
+
+    set_snapshot_version(db, to_version)
+    db_api.set_metadata(
+        db, "snapshot_high_water_mark", db_api.get_high_water_mark(db) or since
+    )
+    db.close()
+
+    print(filepath)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
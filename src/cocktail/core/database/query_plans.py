@@ -0,0 +1,273 @@
+"""
+EXPLAIN QUERY PLAN checks for the queries the ui runs.
+
+Every query shape is paired with the index its plan is expected to use, a plan that
+falls back to scanning a table is reported as a regression. Run against a fresh
+database with:
+
+    python -m cocktail.core.database.query_plans
+
+or pass a database path to check an existing one, the exit code is non zero when
+any plan regressed.
+"""
+__all__ = ["QueryPlan", "QUERY_PLANS", "explain", "check_query_plans"]
+
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+import typing
+
+from PySide6 import QtCore, QtSql
+from cocktail.core.database import api as db_api, creators, nsfw, search
+
+logger = logging.getLogger(__name__)
+
+TABLE_SCAN_PATTERN = re.compile(r"^SCAN (\w+)$")
+
+
+class QueryPlan(typing.NamedTuple):
+    name: str
+    sql: str
+    bind: dict
+    expected: typing.List[str]
+
+
+def _search_plan(name, expected, **filters):
+    sql, bind = search.build_search_query(**filters)
+    return QueryPlan(name, sql, bind, expected)
+
+
+QUERY_PLANS = [
+    # SearchController
+    _search_plan(
+        "search by update time",
+        ["SCAN m USING INDEX model_updated_at"],
+        sort_order="Updated",
+    ),
+    _search_plan(
+        "search page after update time",
+        ["USING INDEX model_updated_at (updated_at<?)"],
+        sort_order="Updated",
+        after=(0, 0),
+        limit=256,
+    ),
+    _search_plan(
+        "search page after type and update time",
+        ["USING INDEX model_type_updated_at (type=? AND updated_at<?)"],
+        model_type="LORA",
+        sort_order="Updated",
+        after=(0, 0),
+        limit=256,
+    ),
+    _search_plan(
+        "search page after name",
+        ["USING INDEX model_name (name>?)"],
+        sort_order="Name",
+        after=("", 0),
+        limit=256,
+    ),
+    _search_plan(
+        "search by name",
+        ["SCAN m USING INDEX model_name"],
+        sort_order="Name",
+    ),
+    _search_plan(
+        "search by type",
+        ["SEARCH m USING INDEX model_type_updated_at (type=?)"],
+        model_type="LORA",
+    ),
+    _search_plan(
+        "search by category",
+        ["SEARCH m USING INDEX model_category_updated_at (category=?)"],
+        category="character",
+    ),
+    _search_plan(
+        "search by base model",
+        ["USING COVERING INDEX model_base_model_base_model (base_model=?)"],
+        base_model="SDXL 1.0",
+    ),
+    _search_plan(
+        "search by every tag",
+        [
+            "SEARCH r USING PRIMARY KEY (tag_id=?)",
+            "SEARCH x USING COVERING INDEX model_tag_model_id (model_id=? AND tag_id=?)",
+        ],
+        tags=["style", "anime"],
+    ),
+    _search_plan(
+        "search by any tag",
+        ["SEARCH model_tag USING PRIMARY KEY (tag_id=?)"],
+        tags=["style", "anime"],
+        tag_mode="Any",
+    ),
+    _search_plan(
+        "search by creator",
+        ["SEARCH m USING INDEX model_creator_id_updated_at (creator_id=?)"],
+        creator_id=1,
+        sort_order="Updated",
+    ),
+    _search_plan(
+        "search text",
+        ["VIRTUAL TABLE", "SEARCH m USING INTEGER PRIMARY KEY"],
+        text="portrait",
+    ),
+    QueryPlan(
+        "nsfw range",
+        "SELECT MIN(nsfw), MAX(nsfw) FROM facet_count WHERE base_model = ''",
+        {},
+        ["SEARCH facet_count USING PRIMARY KEY (base_model=?)"],
+    ),
+    QueryPlan(
+        "category counts",
+        "SELECT category, SUM(count) FROM facet_count "
+        "WHERE base_model = :base_model AND type = :type GROUP BY category",
+        {"base_model": "", "type": "LORA"},
+        ["SEARCH facet_count USING PRIMARY KEY (base_model=? AND type=?)"],
+    ),
+    QueryPlan(
+        "base model counts",
+        "SELECT base_model, SUM(count) FROM facet_count "
+        "WHERE base_model > '' GROUP BY base_model",
+        {},
+        ["SEARCH facet_count USING PRIMARY KEY (base_model>?)"],
+    ),
+    # ModelGalleryModel, ModelGalleryController
+    QueryPlan(
+        "gallery window by id",
+        f"SELECT m.id, m.name, m.type, m.image, c.image "
+        f"FROM {creators.MODEL_SOURCE} WHERE m.id IN (:a, :b)",
+        {"a": 1, "b": 2},
+        [
+            "SEARCH m USING INTEGER PRIMARY KEY (rowid=?)",
+            "SEARCH c USING INTEGER PRIMARY KEY (rowid=?)",
+        ],
+    ),
+    # ModelInfoController
+    QueryPlan(
+        "model with creator",
+        f"SELECT {creators.MODEL_COLUMNS} FROM {creators.MODEL_SOURCE} "
+        "WHERE m.id = :id",
+        {"id": 1},
+        [
+            "SEARCH m USING INTEGER PRIMARY KEY (rowid=?)",
+            "SEARCH c USING INTEGER PRIMARY KEY (rowid=?)",
+        ],
+    ),
+    # VersionInfoController, ModelDownloadController
+    QueryPlan(
+        "model versions",
+        "SELECT * FROM model_version WHERE model_id = :model_id ORDER BY id DESC",
+        {"model_id": 1},
+        ["SEARCH model_version USING INDEX model_version_model_id (model_id=?)"],
+    ),
+    QueryPlan(
+        "version files",
+        "SELECT * FROM model_file WHERE model_version_id = :id AND safe = 1 "
+        "ORDER BY is_primary DESC",
+        {"id": 1},
+        [
+            "SEARCH model_file USING INDEX model_file_model_version_id "
+            "(model_version_id=? AND safe=?)"
+        ],
+    ),
+    # ImageGalleryController, ModelDownloadController
+    QueryPlan(
+        "version images",
+        "SELECT * FROM model_image WHERE model_version_id = :model_version_id "
+        "ORDER BY id DESC",
+        {"model_version_id": 1},
+        [
+            "SEARCH model_image USING INDEX model_image_model_version_id "
+            "(model_version_id=?)"
+        ],
+    ),
+    # nsfw.reclassify_nsfw
+    QueryPlan(
+        "nsfw reclassification chunk",
+        nsfw.CHUNK_STATEMENT.format(
+            creator_name="(SELECT name FROM creator WHERE id = m.creator_id)",
+            tag_names=(
+                "(SELECT group_concat(t.name, char(31)) FROM model_tag mt "
+                "JOIN tag t ON t.id = mt.tag_id WHERE mt.model_id = m.id)"
+            ),
+        ),
+        {0: 0, 1: nsfw.CHUNK_SIZE},
+        [
+            "SEARCH m USING INTEGER PRIMARY KEY (rowid>?)",
+            "SEARCH creator USING INTEGER PRIMARY KEY (rowid=?)",
+            "SEARCH v USING COVERING INDEX model_version_model_id (model_id=?)",
+            "SEARCH i USING INDEX model_image_model_version_id (model_version_id=?)",
+            "SEARCH mt USING COVERING INDEX model_tag_model_id (model_id=?)",
+            "SEARCH t USING INTEGER PRIMARY KEY (rowid=?)",
+        ],
+    ),
+]
+
+
+def explain(db, sql: str, bind: dict) -> typing.List[str]:
+    query = QtSql.QSqlQuery(db)
+    if not query.prepare(f"EXPLAIN QUERY PLAN {sql}"):
+        raise RuntimeError(f"Failed to prepare statement: {query.lastError().text()}")
+
+    # names for named placeholders, positions for ?
+    for key, value in bind.items():
+        query.bindValue(key if isinstance(key, int) else f":{key}", value)
+
+    if not query.exec():
+        raise RuntimeError(f"Failed to execute statement: {query.lastError().text()}")
+
+    details = []
+    while query.next():
+        details.append(query.value(3))
+
+    return details
+
+
+def check_query_plans(db, plans: typing.Sequence[QueryPlan] = QUERY_PLANS):
+    """
+    returns (name, plan, problem) for every query whose plan regressed.
+    """
+    failures = []
+    for plan in plans:
+        details = explain(db, plan.sql, plan.bind)
+
+        for detail in details:
+            match = TABLE_SCAN_PATTERN.match(detail)
+            if match:
+                failures.append((plan.name, details, f"scans {match.group(1)}"))
+
+        for expected in plan.expected:
+            if not any(expected in detail for detail in details):
+                failures.append((plan.name, details, f"does not use: {expected}"))
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("database", nargs="?")
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication([])
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = args.database or os.path.join(directory, "cocktail.sqlite3")
+        db = db_api.get_connection(filepath, connection_name="query-plans")
+        failures = check_query_plans(db)
+        db.close()
+
+    for name, details, problem in failures:
+        print(f"{name}: {problem}")
+        for detail in details:
+            print(f"    {detail}")
+
+    print(f"{len(QUERY_PLANS)} query plans checked, {len(failures)} regressions")
+    app.quit()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
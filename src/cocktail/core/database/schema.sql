@@ -1,6 +1,6 @@
+pragma auto_vacuum = incremental;
 pragma journal_mode = WAL;
 pragma synchronous = normal;
-pragma user_version = 2;
 
 CREATE TABLE IF NOT EXISTS model (
     id INTEGER PRIMARY KEY,
@@ -0,0 +1,367 @@
+"""
+Full text search over models using an FTS5 index.
+
+The index is a virtual table keyed by model id, holding the model name, creator,
+description text, version names and trained words. It is kept in sync by the
+database api whenever models are written or deleted.
+"""
+__all__ = [
+    "match_expression",
+    "build_search_query",
+    "search_models",
+    "SORT_ORDERS",
+    "strip_html",
+    "create_search_index",
+    "build_search_index",
+    "rebuild_search_index",
+    "index_models",
+    "unindex_models",
+]
+
+import html
+import logging
+import re
+import time
+import typing
+
+from PySide6 import QtSql
+from cocktail.core.database import codec, cold_storage, creators, data_classes
+from cocktail.core.database import tags as tag_index
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME = "model_search"
+
+COLUMNS = ["name", "creator_name", "description", "version_names", "trained_words"]
+
+# bm25 weights for each column, a hit in the name matters more than one buried in
+# the description.
+RANK = "bm25(10.0, 4.0, 1.0, 2.0, 4.0)"
+
+SORT_ORDERS = ["Relevance", "Updated", "Name", "Id"]
+
+HTML_TAG_PATTERN = re.compile(r"<[^>]*>")
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def _exec(db, statement, bind=()):
+    query = QtSql.QSqlQuery(db)
+    query.setForwardOnly(True)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    if isinstance(bind, dict):
+        for key, value in bind.items():
+            query.bindValue(f":{key}", value)
+    else:
+        for index, value in enumerate(bind):
+            query.bindValue(index, value)
+
+    if not query.exec():
+        raise RuntimeError(
+            f"Failed to execute statement: {statement}, {query.lastError().text()}"
+        )
+
+    return query
+
+
+def strip_html(text: str) -> str:
+    return html.unescape(HTML_TAG_PATTERN.sub(" ", text or ""))
+
+
+def match_expression(text: str) -> typing.Optional[str]:
+    """
+    convert search box text into an fts5 query where every term must match.
+
+    only the last term, the one still being typed, is matched as a prefix, as
+    expanding finished words as well makes common queries much slower. terms are
+    quoted so that fts5 syntax typed by the user is treated as text.
+    """
+    terms = TERM_PATTERN.findall(text)
+    if not terms:
+        return None
+
+    *words, last = terms
+    return " ".join([*(f'"{word}"' for word in words), f'"{last}"*'])
+
+
+def build_search_query(
+    text: str = "",
+    model_type: str = "All",
+    category: str = "All",
+    base_model: str = "All",
+    nsfw: int = None,
+    tags: typing.Sequence[str] = (),
+    tag_mode: str = "All",
+    creator_id: int = None,
+    sort_order: str = "Relevance",
+    columns: str = "m.*",
+    after: typing.Optional[typing.Tuple[typing.Any, int]] = None,
+    limit: int = None,
+) -> typing.Tuple[str, dict]:
+    """
+    build the model search statement and its bound values from the search filters.
+
+    results are ordered by the sort key with the model id as a tie break, and the
+    sort key is selected as `sort_key`. passing the (sort_key, id) of the last row
+    as `after` continues from that row, which unlike OFFSET costs the same for
+    every page.
+
+    `tags` match models with every tag, or any of them when `tag_mode` is "Any".
+    `creator_id` limits the results to the models of a single creator.
+    """
+    where = []
+    bind = {}
+    source = "model m"
+
+    match = match_expression(text)
+    if match:
+        source = f"{TABLE_NAME} s JOIN model m ON m.id = s.rowid"
+        where.append(f"{TABLE_NAME} MATCH :match")
+        bind["match"] = match
+
+    if model_type != "All":
+        where.append("m.type = :type")
+        bind["type"] = model_type
+
+    if category != "All":
+        where.append("m.category = :category")
+        bind["category"] = category
+
+    if base_model != "All":
+        where.append(
+            "m.id IN (SELECT model_id FROM model_base_model WHERE base_model = :base_model)"
+        )
+        bind["base_model"] = base_model
+
+    if nsfw:
+        where.append("m.nsfw <= :nsfw")
+        bind["nsfw"] = nsfw
+
+    if tags:
+        condition, tag_bind = tag_index.tag_condition(tags, tag_mode)
+        where.append(condition)
+        bind.update(tag_bind)
+
+    if creator_id:
+        where.append("m.creator_id = :creator_id")
+        bind["creator_id"] = creator_id
+
+    if sort_order == "Relevance" and match:
+        sort_key, direction = "s.rank", "ASC"
+    elif sort_order == "Id":
+        sort_key, direction = "m.id", "DESC"
+    elif sort_order == "Name":
+        sort_key, direction = "m.name", "ASC"
+    else:
+        sort_key, direction = "m.updated_at", "DESC"
+
+    if after is not None:
+        operator = "<" if direction == "DESC" else ">"
+        where.append(f"({sort_key}, m.id) {operator} (:after_key, :after_id)")
+        bind["after_key"], bind["after_id"] = after
+
+    where = f"WHERE {' AND '.join(where)}" if where else ""
+    limit = f"LIMIT {int(limit)}" if limit else ""
+
+    sql = f"""
+    SELECT {columns}, {sort_key} AS sort_key
+    FROM {source}
+    {where}
+    ORDER BY {sort_key} {direction}, m.id {direction}
+    {limit}
+    """
+    return sql, bind
+
+
+def search_models(
+    db, limit: int, after=None, **filters
+) -> typing.Tuple[typing.List[data_classes.Model], typing.Optional[list]]:
+    """
+    returns a page of the models matching the filters of build_search_query, and
+    the `after` cursor of the next page, None on the last page.
+
+    the page is found through the indexes and its rows are then read by id with
+    their creator, as the model gallery does.
+    """
+    statement, bind = build_search_query(
+        columns="m.id", after=after, limit=limit, **filters
+    )
+    query = _exec(db, statement, bind)
+
+    ids = []
+    cursor = None
+    while query.next():
+        ids.append(query.value(0))
+        cursor = [query.value(1), query.value(0)]
+    query.finish()
+
+    if not ids:
+        return [], None
+
+    placeholders = ", ".join("?" for _ in ids)
+    query = _exec(
+        db,
+        f"SELECT {creators.MODEL_COLUMNS} FROM {creators.MODEL_SOURCE} "
+        f"WHERE m.id IN ({placeholders})",
+        ids,
+    )
+    models = {}
+    while query.next():
+        model = data_classes.Model.from_record(query.record())
+        models[model.id] = model
+    query.finish()
+
+    models = [models[model_id] for model_id in ids if model_id in models]
+    return models, cursor if len(ids) == limit else None
+
+
+def create_search_index(db):
+    columns = ", ".join(COLUMNS)
+    _exec(
+        db,
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE_NAME} USING fts5("
+        f"{columns}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    )
+    _exec(
+        db,
+        f"INSERT INTO {TABLE_NAME}({TABLE_NAME}, rank) VALUES('rank', ?)",
+        [RANK],
+    )
+
+
+def _insert_documents(db, documents):
+    placeholder = ", ".join(["?"] * (len(COLUMNS) + 1))
+    statement = (
+        f"INSERT INTO {TABLE_NAME}(rowid, {', '.join(COLUMNS)}) VALUES({placeholder})"
+    )
+
+    query = QtSql.QSqlQuery(db)
+    query.prepare(statement)
+    for document in documents:
+        for index, value in enumerate(document):
+            query.bindValue(index, value)
+
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to execute statement: {statement}, {query.lastError().text()}"
+            )
+
+
+def _document(model_id, name, creator_name, description, versions):
+    version_names = " ".join(version_name for version_name, _ in versions)
+    trained_words = " ".join(word for _, words in versions for word in words)
+
+    return (
+        model_id,
+        name,
+        creator_name,
+        strip_html(description),
+        version_names,
+        trained_words,
+    )
+
+
+def unindex_models(db, model_ids: typing.Iterable[int]):
+    query = QtSql.QSqlQuery(db)
+    query.prepare(f"DELETE FROM {TABLE_NAME} WHERE rowid = ?")
+    for model_id in model_ids:
+        query.bindValue(0, model_id)
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to remove model from search index: {query.lastError().text()}"
+            )
+
+
+def index_models(
+    db,
+    models: typing.Sequence[data_classes.Model],
+    versions: typing.Sequence[data_classes.ModelVersion],
+):
+    """
+    replace the index entries of a set of models, the caller owns the transaction.
+    """
+    model_versions = {model.id: [] for model in models}
+    for version in versions:
+        if version.model_id in model_versions:
+            model_versions[version.model_id].append(
+                (version.name, version.trained_words)
+            )
+
+    unindex_models(db, model_versions)
+    _insert_documents(
+        db,
+        (
+            _document(
+                model.id,
+                model.name,
+                model.creator_name,
+                model.description,
+                model_versions[model.id],
+            )
+            for model in models
+        ),
+    )
+
+
+def build_search_index(db):
+    """
+    (re)create the index from the model tables, the caller owns the transaction.
+    """
+    start = time.time()
+    logger.info("building search index")
+
+    _exec(db, f"DROP TABLE IF EXISTS {TABLE_NAME}")
+    create_search_index(db)
+
+    versions = {}
+    query = _exec(db, "SELECT model_id, name, trained_words FROM model_version")
+    while query.next():
+        trained_words = codec.LazySequence(query.value(2))
+        versions.setdefault(query.value(0), []).append((query.value(1), trained_words))
+
+    # descriptions are inline in databases that predate the cold storage tables.
+    cold = cold_storage.COLD_TABLES["model"]
+    creator_name = creators.creator_name_column(db)
+    if cold.name in db.tables():
+        query = _exec(
+            db,
+            f"SELECT m.id, m.name, {creator_name}, d.{cold.column} FROM model m "
+            f"LEFT JOIN {cold.name} d ON d.{cold.key} = m.id",
+        )
+        description = cold_storage.decompress
+    else:
+        query = _exec(
+            db, f"SELECT m.id, m.name, {creator_name}, m.description FROM model m"
+        )
+
+        def description(value) -> str:
+            # NULL would otherwise be indexed as the text "None".
+            return value or ""
+
+    def documents():
+        while query.next():
+            model_id = query.value(0)
+            yield _document(
+                model_id,
+                query.value(1),
+                query.value(2),
+                description(query.value(3)),
+                versions.get(model_id, []),
+            )
+
+    _insert_documents(db, documents())
+    logger.info(f"built search index in {time.time() - start:.2f}s")
+
+
+def rebuild_search_index(db):
+    db.transaction()
+    try:
+        build_search_index(db)
+    except Exception:
+        db.rollback()
+        raise
+
+    db.commit()
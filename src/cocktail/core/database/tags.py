@@ -0,0 +1,278 @@
+"""
+Normalised model tags and tag filtering.
+
+Tag names are stored once in `tag`, `model_tag` holds a (tag_id, model_id) row per
+tag of each model. Its primary key is the inverted index: the models of a tag are a
+single range of it, and whether a model has a tag is a single lookup. A second
+index by model id finds the tags of a model when it is replaced or deleted.
+
+tag.model_count is maintained incrementally, it orders the tags in the search
+view and picks the rarest tag to drive a filter that must match every tag.
+"""
+__all__ = [
+    "TAG_MODES",
+    "normalise_tag",
+    "TAG_SEPARATOR",
+    "create_tag_tables",
+    "tag_names_column",
+    "backfill_category_tags",
+    "add_models",
+    "remove_models",
+    "tag_condition",
+    "tag_counts",
+    "select_model_tags",
+    "get_model_tags",
+]
+
+import logging
+import time
+import typing
+
+from PySide6 import QtSql
+
+logger = logging.getLogger(__name__)
+
+# every selected tag must match, or any of them.
+TAG_MODES = ["All", "Any"]
+
+# joins the tag names of tag_names_column, a control character no name contains.
+TAG_SEPARATOR = "\x1f"
+
+
+def normalise_tag(name: str) -> str:
+    return " ".join(name.split()).lower()
+
+
+def _exec(db, statement, bind=()):
+    query = QtSql.QSqlQuery(db)
+    query.setForwardOnly(True)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    if isinstance(bind, dict):
+        for key, value in bind.items():
+            query.bindValue(f":{key}", value)
+    else:
+        for index, value in enumerate(bind):
+            query.bindValue(index, value)
+
+    if not query.exec():
+        raise RuntimeError(
+            f"Failed to execute statement: {statement}, {query.lastError().text()}"
+        )
+
+    return query
+
+
+def _exec_for_each(db, statement, values):
+    query = QtSql.QSqlQuery(db)
+    if not query.prepare(statement):
+        raise RuntimeError(
+            f"Failed to prepare statement: {statement}, {query.lastError().text()}"
+        )
+
+    for value in values:
+        if not isinstance(value, tuple):
+            value = (value,)
+
+        for index, item in enumerate(value):
+            query.bindValue(index, item)
+
+        if not query.exec():
+            raise RuntimeError(
+                f"Failed to execute statement: {statement}, {query.lastError().text()}"
+            )
+
+
+def create_tag_tables(db):
+    _exec(
+        db,
+        "CREATE TABLE IF NOT EXISTS tag (id INTEGER PRIMARY KEY, "
+        "name TEXT NOT NULL UNIQUE, model_count INTEGER NOT NULL DEFAULT 0)",
+    )
+    _exec(
+        db,
+        "CREATE TABLE IF NOT EXISTS model_tag (tag_id INTEGER NOT NULL, "
+        "model_id INTEGER NOT NULL, PRIMARY KEY (tag_id, model_id)) WITHOUT ROWID",
+    )
+    _exec(
+        db,
+        "CREATE INDEX IF NOT EXISTS model_tag_model_id ON model_tag (model_id)",
+    )
+
+
+def tag_names_column(db, alias: str = "m") -> str:
+    """
+    the tag names of a model row joined by TAG_SEPARATOR, for statements that also
+    run on databases that predate the tag tables, where it is NULL.
+    """
+    if "model_tag" not in db.tables():
+        return "NULL"
+
+    return (
+        "(SELECT group_concat(t.name, char(31)) FROM model_tag mt "
+        f"JOIN tag t ON t.id = mt.tag_id WHERE mt.model_id = {alias}.id)"
+    )
+
+
+def backfill_category_tags(db):
+    """
+    create the tag tables and tag every model with its category.
+
+    the remaining tags were not stored before, they are filled in as models are
+    synced again.
+    """
+    start = time.time()
+    create_tag_tables(db)
+    _exec(
+        db,
+        "INSERT OR IGNORE INTO tag (name) "
+        "SELECT DISTINCT category FROM model WHERE category != 'other'",
+    )
+    _exec(
+        db,
+        "INSERT OR IGNORE INTO model_tag (tag_id, model_id) "
+        "SELECT t.id, m.id FROM model m JOIN tag t ON t.name = m.category",
+    )
+    _exec(
+        db,
+        "UPDATE tag SET model_count = "
+        "(SELECT COUNT(*) FROM model_tag WHERE tag_id = tag.id)",
+    )
+    logger.info(f"tagged models by category in {time.time() - start:.2f}s")
+
+
+def remove_models(db, model_ids: typing.Iterable[int]):
+    """
+    untag models, call before they are replaced or deleted. the caller owns the
+    transaction.
+    """
+    model_ids = list(model_ids)
+    _exec_for_each(
+        db,
+        "UPDATE tag SET model_count = model_count - 1 "
+        "WHERE id IN (SELECT tag_id FROM model_tag WHERE model_id = ?)",
+        model_ids,
+    )
+    _exec_for_each(db, "DELETE FROM model_tag WHERE model_id = ?", model_ids)
+
+
+def add_models(db, model_tags: typing.Iterable[typing.Tuple[int, str]]):
+    """
+    tag models from (model_id, name) pairs, call once their previous tags are
+    removed. the caller owns the transaction.
+    """
+    model_tags = {(model_id, normalise_tag(name)) for model_id, name in model_tags}
+    model_tags = [(model_id, name) for model_id, name in model_tags if name]
+    if not model_tags:
+        return
+
+    _exec_for_each(
+        db,
+        "INSERT OR IGNORE INTO tag (name) VALUES(?)",
+        {name for _, name in model_tags},
+    )
+    _exec_for_each(
+        db,
+        "INSERT OR IGNORE INTO model_tag (tag_id, model_id) "
+        "SELECT id, ? FROM tag WHERE name = ?",
+        model_tags,
+    )
+    _exec_for_each(
+        db,
+        "UPDATE tag SET model_count = model_count + 1 "
+        "WHERE id IN (SELECT tag_id FROM model_tag WHERE model_id = ?)",
+        {model_id for model_id, _ in model_tags},
+    )
+
+
+def tag_condition(
+    tags: typing.Sequence[str], tag_mode: str = "All", column: str = "m.id"
+) -> typing.Tuple[str, dict]:
+    """
+    build a condition on `column` matching models with every tag, or any tag, and
+    its named bound values.
+
+    matching every tag reads the models of the rarest tag and checks each of them
+    against the index, so the cost follows the rarest tag rather than the most
+    common one. a tag that does not exist matches nothing.
+    """
+    tags = sorted({normalise_tag(tag) for tag in tags} - {""})
+    bind = {f"tag_{index}": tag for index, tag in enumerate(tags)}
+    names = ", ".join(f":{key}" for key in bind)
+    tag_ids = f"SELECT id FROM tag WHERE name IN ({names})"
+
+    if tag_mode == "Any":
+        sql = (
+            f"{column} IN (SELECT model_id FROM model_tag WHERE tag_id IN ({tag_ids}))"
+        )
+        return sql, bind
+
+    bind["tag_count"] = len(tags)
+    sql = f"""{column} IN (
+        SELECT r.model_id FROM model_tag r
+        WHERE r.tag_id = ({tag_ids} ORDER BY model_count LIMIT 1)
+        AND (
+            SELECT COUNT(*) FROM model_tag x
+            WHERE x.tag_id IN ({tag_ids}) AND x.model_id = r.model_id
+        ) = :tag_count
+    )"""
+    return sql, bind
+
+
+def tag_counts(db, minimum: int = 1) -> typing.List[typing.Tuple[str, int]]:
+    """
+    returns (name, model count) of every tag, most used first.
+    """
+    query = _exec(
+        db,
+        "SELECT name, model_count FROM tag WHERE model_count >= ? "
+        "ORDER BY model_count DESC, name",
+        [minimum],
+    )
+
+    counts = []
+    while query.next():
+        counts.append((query.value(0), query.value(1)))
+
+    return counts
+
+
+def select_model_tags(db, since: int) -> typing.List[typing.Tuple[int, str]]:
+    """
+    returns (model_id, name) for the tags of every model updated after `since`.
+    """
+    query = _exec(
+        db,
+        "SELECT mt.model_id, t.name FROM model m "
+        "JOIN model_tag mt ON mt.model_id = m.id "
+        "JOIN tag t ON t.id = mt.tag_id "
+        "WHERE m.updated_at > ?",
+        [since],
+    )
+
+    model_tags = []
+    while query.next():
+        model_tags.append((query.value(0), query.value(1)))
+
+    return model_tags
+
+
+def get_model_tags(db, model_id: int) -> typing.List[str]:
+    """
+    returns the tag names of a model, most used first.
+    """
+    query = _exec(
+        db,
+        "SELECT t.name FROM model_tag mt JOIN tag t ON t.id = mt.tag_id "
+        "WHERE mt.model_id = ? ORDER BY t.model_count DESC, t.name",
+        [model_id],
+    )
+
+    names = []
+    while query.next():
+        names.append(query.value(0))
+
+    return names
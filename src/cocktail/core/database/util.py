@@ -1,45 +1,34 @@
 import json
 import os
+import re
 
 # additional words that indicate nsfw content. Civitai's nsfw tag is not very reliable.
 # I never thought I'd have to put these words in a repo but here we are.
 NSFW_WORDS = [
-    "blood",
-    "gore",
     "nsfw",
-    "sex",
-    "nude",
+    "nudity",
     "naked",
     "areola",
-    "breast",
-    "nipple" "tits",
+    "nipple",
     "titjob",
     "fuck",
     "boob",
     "topless",
-    "ass",
-    "anal",
     "pussy",
     "cameltoe",
     "vagina",
     "hentai",
-    "furry",
-    "anthro",
     "underwear",
     "lingerie",
     "pantie",
     "tentacle",
     "fetish",
-    "gag",
     "bondage",
     "penis",
-    "cock",
-    "bbc",
-    "bj",
-    "futa",
     "deepthroat",
     "blowjob",
-    "cum",
+    "cumshot",
+    "cumming",
     "bukkake",
     "porn",
     "waifu",
@@ -47,9 +36,34 @@ NSFW_WORDS = [
     "fellatio",
     "prolapse",
     "peeing",
+]
+
+# words that are part of common words, "unisex" or "philanthropy", only match at
+# the start of a word.
+NSFW_PREFIX_WORDS = [
+    "blood",
+    "gore",
+    "sex",
+    "nude",
+    "breast",
+    "tits",
+    "furry",
+    "anthro",
+    "futa",
     "bimbo",
 ]
 
+# short words that begin common words, "class" or "cumulus", only match on their own.
+NSFW_WHOLE_WORDS = [
+    "ass",
+    "anal",
+    "gag",
+    "cock",
+    "cum",
+    "bbc",
+    "bj",
+]
+
 # creators who produce NSFW content and don't mark their models
 NSFW_CREATORS = [
     "wisematronai",
@@ -77,6 +91,77 @@ NSFW_CREATORS = [
     "hoshi119",
 ]
 
+# the level a model flagged by the word or creator lists is raised to, civitai's X.
+NSFW_FLAGGED_LEVEL = 8
+
+
+def _alternation(words) -> str:
+    return "|".join(
+        re.escape(word) for word in sorted(set(words), key=len, reverse=True)
+    )
+
+
+# the start of a word, after a non letter or where a camel case word begins.
+WORD_START = r"(?:(?<![A-Za-z])|(?<=[a-z])(?=[A-Z]))"
+# the end of a word, before a non letter or a camel case word, but not inside an
+# upper case word.
+WORD_END = r"(?![a-z])(?!(?<=[A-Z])[A-Z])"
+
+
+def compile_nsfw_words(words=NSFW_WORDS) -> re.Pattern:
+    """
+    compile the words matched anywhere, including inside compound and camel case
+    names such as "realPornMix", into an alternation searched in lower case text.
+
+    a case insensitive alternation is several times slower to search.
+    """
+    return re.compile(_alternation(word.lower() for word in words))
+
+
+def compile_nsfw_word_starts(
+    prefix_words=NSFW_PREFIX_WORDS, whole_words=NSFW_WHOLE_WORDS
+) -> re.Pattern:
+    """
+    compile the words that only match at the start of a word, where camel case
+    words start too.
+
+    prefix words match the start of a word, so "sex" matches "sexy" and "SexyMix"
+    but not "unisex", and "breast" matches "BigBreasts" but is not found in
+    "abreast" or "bigbreasts". whole words match only with an optional plural
+    ending, so "ass" matches "asses" and "BigAss" but not "class", "asset" or
+    "ASSET".
+    """
+    return re.compile(
+        rf"{WORD_START}(?:(?i:{_alternation(prefix_words)})"
+        rf"|(?i:{_alternation(whole_words)})(?i:e?s)?{WORD_END})"
+    )
+
+
+NSFW_PATTERN = compile_nsfw_words()
+NSFW_WORD_START_PATTERN = compile_nsfw_word_starts()
+NSFW_CREATOR_NAMES = frozenset(NSFW_CREATORS)
+
+
+def is_nsfw_text(*texts: str) -> bool:
+    # one search per pattern over the joined texts instead of one per word and text.
+    text = "\n".join(texts)
+    return (
+        NSFW_PATTERN.search(text.lower()) is not None
+        or NSFW_WORD_START_PATTERN.search(text) is not None
+    )
+
+
+def classify_nsfw(level: int, creator: str, name: str, tags=(), prompt="") -> int:
+    """
+    combine civitai's nsfw level with the word and creator lists.
+    """
+    level = level or 0
+    if creator.lower() in NSFW_CREATOR_NAMES or is_nsfw_text(name, prompt, *tags):
+        return max(level, NSFW_FLAGGED_LEVEL)
+
+    return level
+
+
 CATEGORIES = [
     "character",
     "style",
@@ -154,51 +239,17 @@ def select_category(tags):
 
 def is_file_safe(file_data: dict):
     return (
-            file_data["pickleScanResult"] == "Success"
-            and file_data["virusScanResult"] == "Success"
+        file_data["pickleScanResult"] == "Success"
+        and file_data["virusScanResult"] == "Success"
     )
 
 
 def detect_nsfw(model_data: dict, image: dict):
-    if "nsfwLevel" in model_data:
-        return model_data["nsfwLevel"]
-    else:
-        try:
-            if detect_nsfw(model_data, image):
-                return 50
-        except KeyError:
-            return False
-
-
-def detect_nsfw_legacy(model_data: dict, image: dict):
-    creator = model_data["creator"]["username"]
-    if creator.lower() in NSFW_CREATORS:
-        return True
-
-    image = image if image is not None else {}
-
-    nsfw_prompt = False
-    nsfw_name = False
-    nsfw_tag = False
-
-    meta = image.get("meta", {}) or {}
-    prompt = meta.get("prompt", "").lower()
-    model_name = model_data["name"].lower()
-
-    for nsfw_word in NSFW_WORDS:
-        for tag in model_data["tags"]:
-            if nsfw_word in tag.lower():
-                nsfw_tag = True
-                break
-
-    for nsfw_word in NSFW_WORDS:
-        if nsfw_word in model_name.lower():
-            nsfw_name = True
-            break
-
-    for nsfw_word in NSFW_WORDS:
-        if nsfw_word in prompt.lower():
-            nsfw_prompt = True
-            break
-
-    return nsfw_tag or nsfw_prompt or nsfw_name
+    meta = (image or {}).get("meta", {}) or {}
+    return classify_nsfw(
+        model_data.get("nsfwLevel", 0),
+        (model_data.get("creator") or {}).get("username", ""),
+        model_data["name"],
+        model_data.get("tags", []),
+        meta.get("prompt", "") or "",
+    )
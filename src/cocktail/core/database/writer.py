@@ -0,0 +1,133 @@
+__all__ = ["DatabaseWriter"]
+
+import logging
+import queue as queue_api
+import time
+
+from PySide6 import QtCore, QtSql
+from cocktail.core.database import api as db_api, connections
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseWriter(QtCore.QObject):
+    """
+    Ingests pages from a queue using a dedicated connection.
+
+    The writer is intended to be moved to its own QThread, the writer connection of
+    the database is taken lazily on first use so that it belongs to that thread.
+
+    A page that fails to insert is dropped and reported with pageFailed, which
+    frees its place in the queue just as pageCommitted does. The high water mark is
+    not advanced by a sync with a failed page, `failed_pages` holds the count of
+    the last finished sync.
+
+    beginRefresh marks the next sync as a period refresh, its completion is stored
+    as the last refresh unless it lost a page, see db_api.get_refresh_period.
+    """
+
+    pageCommitted = QtCore.Signal(int)
+    pageFailed = QtCore.Signal()
+    finished = QtCore.Signal()
+
+    def __init__(self, queue: queue_api.Queue, filepath=None, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        self.filepath = filepath
+        self.connection: QtSql.QSqlDatabase = None
+        self.insert_time = 0.0
+        self.newest_update = 0
+        self.failed_pages = 0
+        self._failed = 0
+        # the high water mark before the first page of a sync was written.
+        self._start_mark: int = None
+        self._refreshing = False
+
+    def open(self):
+        if self.connection is None:
+            self.connection = connections.get_registry(self.filepath).writer()
+
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection = None
+            connections.get_registry(self.filepath).release_writer()
+
+    def beginRefresh(self):
+        self._refreshing = True
+
+    def processQueue(self):
+        """
+        insert every page currently waiting in the queue.
+        """
+        connection = self.open()
+
+        while True:
+            try:
+                page = self.queue.get_nowait()
+            except queue_api.Empty:
+                return
+
+            if self._start_mark is None:
+                self._start_mark = db_api.get_high_water_mark(connection) or 0
+
+            start = time.time()
+            try:
+                db_api.insert_page(connection, page)
+            except Exception:
+                logger.exception("failed to insert page")
+                self._failed += 1
+                self.pageFailed.emit()
+                continue
+            finally:
+                self.queue.task_done()
+
+            elapsed = time.time() - start
+            self.insert_time += elapsed
+            self.newest_update = max(
+                [self.newest_update, *(model.updated_at for model in page.models)]
+            )
+            logger.debug(
+                f"committed page of {len(page.models)} models in {elapsed:.2f}s"
+            )
+            self.pageCommitted.emit(len(page.models))
+
+    def finish(self, caught_up=False, failed=False):
+        """
+        drain the queue and record the update time.
+
+        the high water mark is only advanced when the sync caught up with every model
+        newer than it and every page was written, otherwise an interrupted sync
+        would leave a permanent gap. `failed` reports pages the sync lost before
+        they reached the queue.
+        """
+        self.processQueue()
+        connection = self.open()
+        db_api.set_last_updated(connection)
+
+        high_water_mark = db_api.get_high_water_mark(connection) or 0
+        if self._failed:
+            # stored explicitly, the fallback to the newest model would skip the gap.
+            high_water_mark = self._start_mark or 0
+            db_api.set_high_water_mark(connection, high_water_mark)
+            logger.warning(
+                f"{self._failed} pages failed to insert, "
+                f"the high water mark stays at {high_water_mark}"
+            )
+        elif caught_up and self.newest_update > high_water_mark:
+            db_api.set_high_water_mark(connection, self.newest_update)
+            logger.info(f"high water mark advanced to {self.newest_update}")
+
+        if self._refreshing and not (failed or self._failed):
+            db_api.set_last_refreshed(connection)
+        elif self._refreshing:
+            logger.warning("the refresh lost pages, it is retried by the next sync")
+
+        logger.info(f"database updated, insert: {self.insert_time:.2f}s")
+        self.insert_time = 0.0
+        self.newest_update = 0
+        self.failed_pages, self._failed = self._failed, 0
+        self._start_mark = None
+        self._refreshing = False
+        self.finished.emit()
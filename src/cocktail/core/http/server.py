@@ -0,0 +1,338 @@
+"""
+A local JSON api over the catalog database.
+
+    GET /models                   search, see below
+    GET /models/{id}              a model with its description and tags
+    GET /models/{id}/versions     the versions of a model with their files
+    GET /versions/{id}            a version with its files and stored images
+    GET /files/{id}               a file
+
+/models takes the filters of search.build_search_query as query parameters:
+text, type, category, base_model, nsfw, tag (repeated), tag_mode, creator_id and
+sort. Pages hold `limit` models, and `next` is the `after` parameter of the
+following page.
+
+Requests are handled by a fixed pool of worker threads, each reading through its
+own connection from the ConnectionRegistry, so requests run concurrently without
+opening the database for each of them. ETags are derived from the state of the
+database files and the request, so a matching If-None-Match is answered with 304
+before any query runs.
+"""
+__all__ = ["CatalogServer", "CatalogRequestHandler", "serve"]
+
+import base64
+import hashlib
+import http
+import http.server
+import json
+import logging
+import os
+import queue as queue_api
+import re
+import threading
+import typing
+import urllib.parse
+
+from cocktail.core.database import api as db_api, codec, connections, images
+from cocktail.core.database import search, tags
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# sqlite integers are 64 bit, larger values cannot be bound to a query.
+MIN_INTEGER = -(2**63)
+MAX_INTEGER = 2**63 - 1
+
+
+class RequestError(Exception):
+    def __init__(self, status: http.HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(cursor: typing.Optional[list]) -> typing.Optional[str]:
+    if cursor is None:
+        return None
+
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_cursor(value: str) -> list:
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(value.encode()))
+    except ValueError:
+        raise RequestError(http.HTTPStatus.BAD_REQUEST, "invalid after cursor")
+
+    if not isinstance(cursor, list) or len(cursor) != 2:
+        raise RequestError(http.HTTPStatus.BAD_REQUEST, "invalid after cursor")
+
+    return cursor
+
+
+def _integer(params: dict, name: str, default=None):
+    values = params.get(name)
+    if not values:
+        return default
+
+    try:
+        value = int(values[0])
+    except ValueError:
+        raise RequestError(http.HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+
+    if not MIN_INTEGER <= value <= MAX_INTEGER:
+        raise RequestError(http.HTTPStatus.BAD_REQUEST, f"{name} is out of range")
+
+    return value
+
+
+def _id(value: str) -> int:
+    value = int(value)
+    # no row has an id sqlite cannot store.
+    if value > MAX_INTEGER:
+        raise RequestError(http.HTTPStatus.NOT_FOUND, "not found")
+
+    return value
+
+
+def _text(params: dict, name: str, default: str = "") -> str:
+    values = params.get(name)
+    return values[0] if values else default
+
+
+def _not_found(value):
+    if value is None:
+        raise RequestError(http.HTTPStatus.NOT_FOUND, "not found")
+
+    return value
+
+
+def _model_json(model) -> dict:
+    data = model._asdict()
+    # descriptions are read separately, only for a single model.
+    data.pop("description")
+    return data
+
+
+def _version_json(db, version) -> dict:
+    data = version._asdict()
+    data.pop("description")
+    data["files"] = [file._asdict() for file in db_api.get_model_files(db, version.id)]
+    return data
+
+
+def get_models(db, params: dict) -> dict:
+    limit = _integer(params, "limit", DEFAULT_LIMIT)
+    if not 0 < limit <= MAX_LIMIT:
+        raise RequestError(
+            http.HTTPStatus.BAD_REQUEST, f"limit must be between 1 and {MAX_LIMIT}"
+        )
+
+    after = _text(params, "after")
+    sort_order = _text(params, "sort", "Relevance")
+    if sort_order not in search.SORT_ORDERS:
+        raise RequestError(http.HTTPStatus.BAD_REQUEST, f"unknown sort: {sort_order}")
+
+    tag_mode = _text(params, "tag_mode", "All")
+    if tag_mode not in tags.TAG_MODES:
+        raise RequestError(http.HTTPStatus.BAD_REQUEST, f"unknown tag_mode: {tag_mode}")
+
+    models, cursor = search.search_models(
+        db,
+        limit,
+        after=decode_cursor(after) if after else None,
+        text=_text(params, "text"),
+        model_type=_text(params, "type", "All"),
+        category=_text(params, "category", "All"),
+        base_model=_text(params, "base_model", "All"),
+        nsfw=_integer(params, "nsfw"),
+        tags=params.get("tag", []),
+        tag_mode=tag_mode,
+        creator_id=_integer(params, "creator_id"),
+        sort_order=sort_order,
+    )
+    return {
+        "count": len(models),
+        "models": [_model_json(model) for model in models],
+        "next": encode_cursor(cursor),
+    }
+
+
+def get_model(db, model_id: int) -> dict:
+    data = _not_found(db_api.get_model(db, model_id))._asdict()
+    data["description"] = db_api.get_model_description(db, model_id)
+    data["tags"] = tags.get_model_tags(db, model_id)
+    return data
+
+
+def get_model_versions(db, model_id: int) -> dict:
+    _not_found(db_api.get_model(db, model_id))
+    versions = db_api.get_model_versions(db, model_id)
+    return {"versions": [_version_json(db, version) for version in versions]}
+
+
+def get_version(db, model_version_id: int) -> dict:
+    version = _not_found(db_api.get_model_version(db, model_version_id))
+    data = _version_json(db, version)
+    data["description"] = db_api.get_model_version_description(db, version.id)
+    data["images"] = [
+        image._asdict() for image in db_api.get_model_images(db, version.id)
+    ]
+    # the rest of the gallery is only available from the civitai api.
+    data["images_pruned"] = images.is_pruned(db, version.id)
+    return data
+
+
+def get_file(db, file_id: int) -> dict:
+    return _not_found(db_api.get_model_file(db, file_id))._asdict()
+
+
+# path pattern, handler taking the connection and the path's id or query parameters.
+ROUTES = [
+    (re.compile(r"/models"), get_models),
+    (re.compile(r"/models/(\d+)"), get_model),
+    (re.compile(r"/models/(\d+)/versions"), get_model_versions),
+    (re.compile(r"/versions/(\d+)"), get_version),
+    (re.compile(r"/files/(\d+)"), get_file),
+]
+
+
+class CatalogRequestHandler(http.server.BaseHTTPRequestHandler):
+    server: "CatalogServer"
+    server_version = "cocktail"
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        for pattern, handler in ROUTES:
+            match = pattern.fullmatch(url.path.rstrip("/") or "/")
+            if match is not None:
+                break
+        else:
+            self.send_json(http.HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+
+        etag = self.server.etag(self.path)
+        if etag in self.headers.get("If-None-Match", ""):
+            self.send_response(http.HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        db = self.server.registry.reader()
+        try:
+            if match.groups():
+                body = handler(db, _id(match.group(1)))
+            else:
+                body = handler(db, urllib.parse.parse_qs(url.query))
+        except RequestError as error:
+            self.send_json(error.status, {"error": str(error)})
+            return
+        except Exception:
+            logger.exception(f"failed to handle {self.path}")
+            self.send_json(
+                http.HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+            )
+            return
+
+        self.send_json(http.HTTPStatus.OK, body, etag=etag)
+
+    def send_json(self, status: http.HTTPStatus, body, etag: str = None):
+        data = json.dumps(body, default=codec.to_json).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            # clients may keep the response, but must revalidate it.
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class CatalogServer(http.server.HTTPServer):
+    """
+    Serves the catalog api of a database from a pool of `workers` threads.
+    """
+
+    def __init__(
+        self,
+        address: typing.Tuple[str, int],
+        filepath: str = None,
+        workers: int = 4,
+        handler=CatalogRequestHandler,
+    ):
+        self.registry = connections.get_registry(filepath)
+        if not os.path.exists(self.registry.filepath):
+            raise RuntimeError(f"Database does not exist: {self.registry.filepath}")
+
+        super().__init__(address, handler)
+        self._requests = queue_api.Queue()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"catalog-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def etag(self, path: str) -> str:
+        """
+        an entity tag for a request path, which changes with every commit.
+
+        under WAL a commit appends to the log and a checkpoint rewrites the
+        database, so their sizes and modification times identify its state.
+        """
+        state = [path]
+        for suffix in ("", "-wal"):
+            try:
+                stat = os.stat(f"{self.registry.filepath}{suffix}")
+                state.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+            except OSError:
+                state.append("")
+
+        digest = hashlib.sha1("|".join(state).encode("utf-8")).hexdigest()
+        return f'"{digest[:20]}"'
+
+    def process_request(self, request, client_address):
+        self._requests.put((request, client_address))
+
+    def _work(self):
+        try:
+            while True:
+                item = self._requests.get()
+                if item is None:
+                    return
+
+                request, client_address = item
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+        finally:
+            self.registry.release_reader()
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+
+
+def serve(filepath: str = None, host="127.0.0.1", port=8765, workers=4):
+    """
+    serve the catalog api until interrupted.
+    """
+    server = CatalogServer((host, port), filepath, workers=workers)
+    logger.info(f"serving {server.registry.filepath} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
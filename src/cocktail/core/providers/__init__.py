@@ -1 +1,2 @@
 from .image import *
+from .version_images import *
@@ -84,6 +84,21 @@ class ImageProvider(QtCore.QObject):
 
         return self._cache[url]
 
+    def requestImage(self, url, callback):
+        """
+        download an image without caching it, for callers that keep their own.
+        """
+        reply = self.network_manager.get(url)
+        reply.finished.connect(partial(self.onImageRequested, reply, callback))
+
+    def onImageRequested(self, reply: QtNetwork.QNetworkReply, callback):
+        image = QtGui.QImage()
+        if reply.error() == QtNetwork.QNetworkReply.NoError:
+            image = QtGui.QImage.fromData(reply.readAll())
+
+        reply.deleteLater()
+        callback(None if image.isNull() else image)
+
     def onImageDownloaded(self, reply: QtNetwork.QNetworkReply, callback):
         if reply.error() != QtNetwork.QNetworkReply.NoError:
             self._cache[reply.url().toString()] = None
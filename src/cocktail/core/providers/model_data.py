@@ -1,8 +1,13 @@
-__all__ = ["ModelDataProvider"]
+__all__ = ["ModelDataProvider", "PageParser", "extract_metadata"]
 import logging
 
+import collections
+import concurrent.futures
 import json
-from PySide6 import QtCore, QtGui, QtNetwork
+import multiprocessing
+import time
+import typing
+from PySide6 import QtCore, QtNetwork
 from cocktail.core.database import data_classes
 
 import queue as queue_api
@@ -13,45 +18,245 @@ logger = logging.getLogger(__name__)
 API_URL = "https://civitai.com/api/v1"
 
 
+def extract_metadata(raw: bytes) -> dict:
+    """
+    extract the pagination metadata from a raw models response.
+
+    the api places the metadata object after the items, so it can be decoded from
+    the tail of the response without parsing the whole page.
+    """
+    position = raw.rfind(b'"metadata"')
+    if position != -1:
+        start = raw.find(b"{", position)
+        try:
+            metadata, _ = json.JSONDecoder().raw_decode(raw[start:].decode("utf-8"))
+            return metadata
+        except ValueError:
+            pass
+
+    return json.loads(raw)["metadata"]
+
+
+class PageParser(QtCore.QObject):
+    """
+    Deserialises raw pages and places them in a queue.
+
+    Intended to be moved to a worker thread so that parsing overlaps with the
+    network fetch of the next page and the database insert of the previous one.
+
+    With more than one process, pages are deserialised in a process pool instead so
+    that parsing scales with the number of cores and never holds this process's
+    GIL. Pages are still queued in the order they were received.
+    """
+
+    pageParsed = QtCore.Signal(float, int)
+    # a page that could not be deserialised, nothing is queued for it.
+    parseFailed = QtCore.Signal()
+    parseDone = QtCore.Signal()
+
+    def __init__(self, queue: queue_api.Queue, processes=0, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        self.processes = processes
+        self._executor: concurrent.futures.ProcessPoolExecutor = None
+        self._pending = collections.deque()
+        self.parseDone.connect(self.drain)
+
+    def parse(self, raw: bytes):
+        if self.processes > 1:
+            future = self.executor().submit(data_classes.deserialise_page, raw)
+            self._pending.append((time.time(), future))
+            # called on a pool thread, the signal queues the drain on this thread.
+            future.add_done_callback(lambda _: self.parseDone.emit())
+            return
+
+        start = time.time()
+        try:
+            page = data_classes.deserialise_page(raw)
+        except Exception:
+            logger.exception("failed to parse page")
+            self.parseFailed.emit()
+            return
+
+        self._put(page, time.time() - start)
+
+    def executor(self):
+        if self._executor is None:
+            logger.debug(f"starting {self.processes} parser processes")
+            # fork is unsafe once qt has started its threads.
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+
+        return self._executor
+
+    def drain(self):
+        """
+        queue every pooled page that has finished, in the order they were received.
+        """
+        while self._pending and self._pending[0][1].done():
+            start, future = self._pending.popleft()
+            try:
+                page = future.result()
+            except Exception:
+                logger.exception("failed to parse page")
+                self.parseFailed.emit()
+                continue
+
+            self._put(page, time.time() - start)
+
+    def close(self):
+        """
+        stop the process pool, it is started again by the next pooled parse.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+        self._pending.clear()
+
+    def _put(self, page: data_classes.Page, elapsed: float):
+        newest = max((model.updated_at for model in page.models), default=0)
+
+        # block while the writer catches up, this is what throttles the fetcher.
+        while True:
+            try:
+                self.queue.put(page, timeout=0.5)
+                break
+            except queue_api.Full:
+                if QtCore.QThread.currentThread().isInterruptionRequested():
+                    return
+
+        self.pageParsed.emit(elapsed, newest)
+
+
 class ModelDataProvider(QtCore.QObject):
     """
     A provider for Civitai model data.
+
+    In pipelined mode the next page is requested as soon as its cursor is known,
+    while the current page is deserialised on a worker thread, or in a pool of
+    `parse_processes` processes when more than one is given.
+
+    endRequest reports whether the request caught up with everything newer than the
+    high water mark, only then is it safe to advance the mark, and whether it
+    failed. `failed` is set when the request lost a page, to a fetch out of
+    retries or a page that failed to parse.
     """
 
     pageReady = QtCore.Signal()
     beginRequest = QtCore.Signal()
     progress = QtCore.Signal(int, int)
-    endRequest = QtCore.Signal()
+    # caught up, failed
+    endRequest = QtCore.Signal(bool, bool)
+    parseRequested = QtCore.Signal(bytes)
 
-    def __init__(self, parent=None):
+    def __init__(
+        self, max_pending_pages=8, pipelined=True, parse_processes=0, parent=None
+    ):
         super().__init__(parent)
         self.network_manager = QtNetwork.QNetworkAccessManager()
-        self.queue = queue_api.Queue()
+        self.queue = queue_api.Queue(maxsize=max_pending_pages)
+        self.pipelined = pipelined
+        self.timings = {}
         self._busy = False
+        self._fetching = False
+        self._pending_parses = 0
         self._total_pages = None
         self._retries = {}
+        self._pending_url = None
+        self._request_times = {}
+        self._start_time = 0.0
+        self._high_water_mark = None
+        self._caught_up = False
+        self._reply: QtNetwork.QNetworkReply = None
+        self.failed = False
+
+        self.parser = PageParser(self.queue, processes=parse_processes)
+        self.parser_thread = QtCore.QThread()
+        self.parser.moveToThread(self.parser_thread)
+        self.parseRequested.connect(self.parser.parse)
+        self.parser.pageParsed.connect(self.onPageParsed)
+        self.parser.parseFailed.connect(self.onParseFailed)
+        # the pool is only kept for as long as a request runs.
+        self.endRequest.connect(self.parser.close)
+        if self.pipelined:
+            self.parser_thread.start()
 
     def requestModelData(self, period):
+        """
+        request every model updated within the given period.
+        """
         if self._busy:
             return
 
+        logger.info(f"requesting model data for period: {period.value}")
+        url = f"{API_URL}/models?period={period.value}&limit=100"
+        self._beginRequest(url, caught_up=period == data_classes.Period.AllTime)
+
+    def requestModelUpdates(self, high_water_mark: typing.Optional[int]):
+        """
+        request models newest first, stopping at the first page that is entirely
+        older than the high water mark.
+
+        the api orders Newest by creation, while the mark is the newest update, so
+        an older model that gets a new version or edit is further down the feed
+        than where this stops. those updates are only caught by a period request,
+        see db_api.get_refresh_period.
+        """
+        if self._busy:
+            return
+
+        logger.info(f"requesting model data newer than: {high_water_mark}")
+        url = f"{API_URL}/models?sort=Newest&period=AllTime&limit=100"
+        self._beginRequest(url, caught_up=True, high_water_mark=high_water_mark)
+
+    def _beginRequest(self, url, caught_up, high_water_mark=None):
         self._busy = True
+        self._caught_up = caught_up
+        self._high_water_mark = high_water_mark
+        self.failed = False
+        self._fetching = True
+        self._pending_parses = 0
         self._total_pages = None
-        logger.info(f"requesting model data for period: {period.value}")
+        self._pending_url = None
+        self._start_time = time.time()
+        self.timings = {"fetch": 0.0, "parse": 0.0}
         self._retries.clear()
 
-        url = f"{API_URL}/models?period={period.value}&limit=100"
         self._requestPage(url)
         self.beginRequest.emit()
 
+    def shutdown(self):
+        self.parser_thread.requestInterruption()
+        self.parser_thread.quit()
+        self.parser_thread.wait()
+        self.parser.close()
+
     def _requestPage(self, url):
         request = QtNetwork.QNetworkRequest(QtCore.QUrl(url))
         request.setRawHeader(b"Accept", b"application/json")
         request.setRawHeader(b"Accept-Encoding", b"identity")
 
-        reply = self.network_manager.get(request)
+        self._request_times[url] = time.time()
+        reply = self._reply = self.network_manager.get(request)
         reply.finished.connect(lambda: self.onRequestFinished(reply))
 
+    def resume(self):
+        """
+        request the next page if fetching was paused because the queue was full.
+        """
+        if self._pending_url is None or self._saturated():
+            return
+
+        url, self._pending_url = self._pending_url, None
+        self._requestPage(url)
+
+    def _saturated(self):
+        # pooled parses are not in the queue yet, they count towards its size so
+        # that the fetcher cannot run ahead of the pool.
+        return self._pending_parses + self.queue.qsize() >= self.queue.maxsize
+
     def onRequestFailed(self, reply: QtNetwork.QNetworkReply):
         retries = self._retries.get(reply.url().toString(), 0)
         url = reply.url().toString()
@@ -61,24 +266,114 @@ class ModelDataProvider(QtCore.QObject):
             self._retries[url] = retries + 1
             self._requestPage(url)
         else:
-            logger.debug(f"request failed, retries exceeded: {url}")
-            self._busy = False
-            self.endRequest.emit()
+            logger.warning(f"request failed, retries exceeded: {url}")
+            self.failed = True
+            self._fetching = False
+            self._caught_up = False
+            self._finishIfIdle()
 
     def onRequestFinished(self, reply: QtNetwork.QNetworkReply):
+        if reply is self._reply:
+            self._reply = None
+
+        if not self._fetching:
+            # the request was stopped early and this reply is no longer needed.
+            reply.deleteLater()
+            self._finishIfIdle()
+            return
+
         if reply.error() != QtNetwork.QNetworkReply.NetworkError.NoError:
             self.onRequestFailed(reply)
             return
 
-        data = reply.readAll()
-        data = json.loads(bytearray(data))
-        items = data["items"]
+        url = reply.url().toString()
+        fetch_time = time.time() - self._request_times.pop(url, time.time())
+        self.timings["fetch"] += fetch_time
+
+        raw = bytes(reply.readAll())
+        reply.deleteLater()
+
+        if self.pipelined:
+            metadata = extract_metadata(raw)
+            self._pending_parses += 1
+            self.parseRequested.emit(raw)
+        else:
+            start = time.time()
+            try:
+                page = data_classes.deserialise_page(raw)
+            except Exception:
+                logger.exception("failed to parse page")
+                self.failed = True
+                self._stopFetching(caught_up=False)
+                return
+
+            self.queue.put(page)
+            self.timings["parse"] += time.time() - start
+            self.pageReady.emit()
+            metadata = extract_metadata(raw)
+
+            newest = max((model.updated_at for model in page.models), default=0)
+            if self._reachedHighWaterMark(newest):
+                return
 
-        self.queue.put(data_classes.deserialise_items(items))
+        logger.debug(f"fetched page in {fetch_time:.2f}s: {url}")
+        self._updateProgress(metadata)
+
+        next_page = metadata.get("nextPage")
+
+        if next_page and self._saturated():
+            logger.debug("page queue is full, waiting for the writer to catch up")
+            self._pending_url = next_page
+        elif next_page:
+            self._requestPage(next_page)
+        else:
+            self._fetching = False
+            self._finishIfIdle()
+
+    def onPageParsed(self, parse_time: float, newest: int):
+        self._pending_parses -= 1
+        self.timings["parse"] += parse_time
+        logger.debug(f"parsed page in {parse_time:.2f}s")
         self.pageReady.emit()
 
-        metadata = data["metadata"]
+        if not self._reachedHighWaterMark(newest):
+            self._finishIfIdle()
+
+    def onParseFailed(self):
+        self._pending_parses -= 1
+        self.failed = True
+        self._stopFetching(caught_up=False)
+
+    def _stopFetching(self, caught_up=True):
+        """
+        stop requesting pages, a request that lost a page has not caught up.
+        """
+        if not caught_up:
+            self._caught_up = False
 
+        self._fetching = False
+        self._pending_url = None
+
+        if self._reply is not None:
+            self._reply.abort()
+        else:
+            self._finishIfIdle()
+
+    def _reachedHighWaterMark(self, newest: int):
+        """
+        stop fetching once a whole page is older than the high water mark.
+        """
+        if self._high_water_mark is None or not self._fetching:
+            return False
+
+        if newest > self._high_water_mark:
+            return False
+
+        logger.info("reached the high water mark, stopping")
+        self._stopFetching()
+        return True
+
+    def _updateProgress(self, metadata: dict):
         try:
             next_cursor = metadata["nextCursor"]
             elements = next_cursor.split("|")
@@ -92,10 +387,14 @@ class ModelDataProvider(QtCore.QObject):
         except Exception:
             logger.exception(f"failed to detect progress")
 
-        next_page = metadata.get("nextPage")
+    def _finishIfIdle(self):
+        if self._fetching or self._pending_parses or not self._busy:
+            return
 
-        if next_page:
-            self._requestPage(next_page)
-        else:
-            self._busy = False
-            self.endRequest.emit()
+        self._busy = False
+        self._high_water_mark = None
+        logger.info(
+            f"model data received in {time.time() - self._start_time:.2f}s, "
+            f"fetch: {self.timings['fetch']:.2f}s, parse: {self.timings['parse']:.2f}s"
+        )
+        self.endRequest.emit(self._caught_up, self.failed)
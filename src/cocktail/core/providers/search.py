@@ -0,0 +1,242 @@
+__all__ = ["SearchProvider", "SearchWorker"]
+
+import array
+import logging
+import pathlib
+import sqlite3
+import time
+
+from PySide6 import QtCore
+from cocktail.core.database import connections, facets, search
+
+logger = logging.getLogger(__name__)
+
+
+class SearchWorker(QtCore.QObject):
+    """
+    Runs model searches on a read only connection of its own.
+
+    The standard library driver is used rather than QtSql as it exposes
+    sqlite3_interrupt, which aborts a running statement from another thread.
+    Results are produced in keyset pages so that a superseded search stops between
+    pages and no read transaction is held open for the whole result.
+
+    Once a search finishes, the facet counts under its filters are read through
+    the thread's reader of the ConnectionRegistry.
+    """
+
+    idsFound = QtCore.Signal(int, object, bool)
+    searchFinished = QtCore.Signal(int, int, float)
+    # generation, {facet: [(value, count)]}
+    facetCountsFound = QtCore.Signal(int, object)
+
+    def __init__(self, filepath, first_page_size=256, page_size=4096, parent=None):
+        super().__init__(parent)
+        self.filepath = filepath
+        self.first_page_size = first_page_size
+        self.page_size = page_size
+        self.latest = 0
+        self.busy = False
+        self.connection: sqlite3.Connection = None
+
+    def open(self):
+        if self.connection is None:
+            uri = f"{pathlib.Path(self.filepath).resolve().as_uri()}?mode=ro"
+            self.connection = sqlite3.connect(uri, uri=True)
+            for name, value in connections.READ_PRAGMAS.items():
+                self.connection.execute(f"PRAGMA {name} = {value}")
+
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def interrupt(self):
+        """
+        abort the running statement, safe to call from any thread.
+        """
+        connection = self.connection
+        if self.busy and connection is not None:
+            connection.interrupt()
+
+    def run(self, generation: int, filters: dict):
+        if generation != self.latest:
+            return
+
+        self.busy = True
+        start = time.time()
+        try:
+            count = self._search(generation, filters)
+        except sqlite3.OperationalError as e:
+            if generation != self.latest:
+                logger.debug(f"search {generation} interrupted")
+                return
+            logger.exception(f"search failed: {e}")
+            count = 0
+        finally:
+            self.busy = False
+
+        if count is None:
+            return
+
+        elapsed = time.time() - start
+        logger.debug(f"search {generation} found {count} models in {elapsed:.3f}s")
+        self.searchFinished.emit(generation, count, elapsed)
+
+        try:
+            self._countFacets(generation, filters)
+        except RuntimeError:
+            logger.exception("failed to count facets")
+
+    def _countFacets(self, generation, filters):
+        db = connections.get_registry(self.filepath).reader()
+        filters = {key: value for key, value in filters.items() if key != "sort_order"}
+
+        counts = {}
+        for facet in facets.FACETS:
+            if generation != self.latest:
+                return
+
+            counts[facet] = facets.facet_counts(db, facet, **filters)
+
+        self.facetCountsFound.emit(generation, counts)
+
+    def _search(self, generation, filters):
+        connection = self.open()
+
+        # paging a text search would match and sort every result again per page.
+        paged = search.match_expression(filters.get("text", "")) is None
+
+        count = 0
+        after = None
+        limit = self.first_page_size
+        while True:
+            page_limit = limit if paged else None
+            sql, bind = search.build_search_query(
+                **filters, columns="m.id", after=after, limit=page_limit
+            )
+            cursor = connection.execute(sql, bind)
+
+            statement_count = 0
+            while True:
+                rows = cursor.fetchmany(limit)
+                if generation != self.latest:
+                    return None
+
+                if not rows:
+                    break
+
+                ids = array.array("q", (row[0] for row in rows))
+                self.idsFound.emit(generation, ids, count == 0)
+                count += len(ids)
+                statement_count += len(ids)
+                after = (rows[-1][1], rows[-1][0])
+                limit = self.page_size
+
+            if not paged or statement_count < page_limit:
+                return count
+
+
+class SearchProvider(QtCore.QObject):
+    """
+    Debounces search requests and runs them on a worker thread.
+
+    A request that supersedes a running search interrupts it, results of stale
+    searches are dropped. The ids of the latest search are delivered as they are
+    found, first through resultsReset and then resultsAppended. A refresh of the
+    current search delivers every id at once through resultsRefreshed, so the
+    results can be swapped without losing the view's place. The facet counts of
+    the latest search follow through facetCountsReady.
+    """
+
+    resultsReset = QtCore.Signal(object)
+    resultsAppended = QtCore.Signal(object)
+    resultsRefreshed = QtCore.Signal(object)
+    searchFinished = QtCore.Signal(int, float)
+    facetCountsReady = QtCore.Signal(object)
+    searchRequested = QtCore.Signal(int, dict)
+
+    def __init__(self, filepath, debounce_interval=150, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self._filters = {}
+        self._refresh_ids = None
+
+        self.worker = SearchWorker(filepath)
+        self.worker_thread = QtCore.QThread()
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.finished.connect(self.worker.close)
+        self.searchRequested.connect(self.worker.run)
+        self.worker.idsFound.connect(self.onIdsFound)
+        self.worker.searchFinished.connect(self.onSearchFinished)
+        self.worker.facetCountsFound.connect(self.onFacetCountsFound)
+        self.worker_thread.start()
+
+        self.debounce_timer = QtCore.QTimer()
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_interval)
+        self.debounce_timer.timeout.connect(self.searchNow)
+
+    def search(self, **filters):
+        """
+        request a search once the filters stop changing, see search.build_search_query.
+        """
+        self._filters = filters
+        self.debounce_timer.start()
+
+    def searchNow(self):
+        self._refresh_ids = None
+        self._run()
+
+    def refresh(self):
+        """
+        run the current search again, unless a newer one is already waiting.
+        """
+        if self.debounce_timer.isActive():
+            return
+
+        self._refresh_ids = array.array("q")
+        self._run()
+
+    def _run(self):
+        self.debounce_timer.stop()
+        self.generation += 1
+        self.worker.latest = self.generation
+        self.worker.interrupt()
+        self.searchRequested.emit(self.generation, self._filters)
+
+    def onIdsFound(self, generation, ids, first):
+        if generation != self.generation:
+            return
+
+        if self._refresh_ids is not None:
+            self._refresh_ids.extend(ids)
+        elif first:
+            self.resultsReset.emit(ids)
+        else:
+            self.resultsAppended.emit(ids)
+
+    def onSearchFinished(self, generation, count, elapsed):
+        if generation != self.generation:
+            return
+
+        if self._refresh_ids is not None:
+            ids, self._refresh_ids = self._refresh_ids, None
+            self.resultsRefreshed.emit(ids)
+        elif count == 0:
+            self.resultsReset.emit(array.array("q"))
+
+        self.searchFinished.emit(count, elapsed)
+
+    def onFacetCountsFound(self, generation, counts):
+        if generation == self.generation:
+            self.facetCountsReady.emit(counts)
+
+    def shutdown(self):
+        self.debounce_timer.stop()
+        self.worker.latest = -1
+        self.worker.interrupt()
+        self.worker_thread.quit()
+        self.worker_thread.wait()
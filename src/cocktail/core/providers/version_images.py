@@ -0,0 +1,77 @@
+__all__ = ["VersionImageProvider"]
+import json
+import logging
+
+from PySide6 import QtCore, QtNetwork
+
+from cocktail.core.cache import FixedLengthMapping
+from cocktail.core.database import data_classes
+from cocktail.core.http import NetworkManager
+from cocktail.core.providers.model_data import API_URL
+
+logger = logging.getLogger(__name__)
+
+
+class VersionImageProvider(QtCore.QObject):
+    """
+    Fetches the full image gallery of a model version from the api.
+
+    Used for versions whose images were pruned from the database, see
+    cocktail.core.database.images. Galleries are kept in a cache of their own so
+    that reopening a version does not request it again.
+    """
+
+    # version id, list of ModelImage newest first, empty when the request failed.
+    imagesReady = QtCore.Signal(int, object)
+
+    def __init__(self, max_versions=64, parent=None):
+        super().__init__(parent)
+        self.network_manager = NetworkManager()
+        self._cache = FixedLengthMapping(max_entries=max_versions)
+        self._pending = set()
+
+    def hasImages(self, version_id: int) -> bool:
+        return version_id in self._cache
+
+    def getImages(self, version_id: int) -> list:
+        return self._cache[version_id]
+
+    def requestImages(self, version_id: int):
+        if version_id in self._cache:
+            self.imagesReady.emit(version_id, self._cache[version_id])
+            return
+
+        if version_id in self._pending:
+            return
+
+        self._pending.add(version_id)
+        reply = self.network_manager.get(f"{API_URL}/model-versions/{version_id}")
+        reply.finished.connect(lambda: self.onRequestFinished(version_id, reply))
+
+    def onRequestFinished(self, version_id: int, reply: QtNetwork.QNetworkReply):
+        self._pending.discard(version_id)
+        if reply.error() != QtNetwork.QNetworkReply.NetworkError.NoError:
+            logger.warning(
+                f"failed to fetch images of version {version_id}: {reply.errorString()}"
+            )
+            reply.deleteLater()
+            self.imagesReady.emit(version_id, [])
+            return
+
+        raw = bytes(reply.readAll())
+        reply.deleteLater()
+
+        try:
+            data = json.loads(raw)
+            images = [
+                data_classes.ModelImage.from_json(data["modelId"], version_id, image)
+                for image in data["images"]
+            ]
+        except (KeyError, TypeError, ValueError):
+            logger.exception(f"failed to read images of version {version_id}")
+            self.imagesReady.emit(version_id, [])
+            return
+
+        images.sort(key=lambda image: image.id, reverse=True)
+        self._cache[version_id] = images
+        self.imagesReady.emit(version_id, images)
@@ -1,5 +1,6 @@
 import logging
 import argparse
+import multiprocessing
 
 from PySide6 import QtWidgets, QtCore
 from cocktail import resources
@@ -26,10 +27,17 @@ def list_resources(root=None):
 
 
 def main():
+    # pages are parsed in spawned processes, which frozen builds must hand off here.
+    multiprocessing.freeze_support()
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--debug", action="store_true")
     parser.add_argument("--no-update", action="store_true")
     parser.add_argument("--list-resources", action="store_true")
+    parser.add_argument(
+        "--release-source",
+        help="releases url or local directory to fetch the database and its patches from",
+    )
 
     args = parser.parse_args()
 
@@ -64,7 +72,7 @@ def main():
         if not args.no_update:
             MAIN_CONTROLLER.database_controller.updateModelData()
 
-    start_up_controller = StartupController()
+    start_up_controller = StartupController(release_source=args.release_source)
     start_up_controller.complete.connect(start)
     start_up_controller.start()
 
@@ -2,46 +2,164 @@ __all__ = ["DatabaseController"]
 
 from PySide6 import QtCore, QtWidgets, QtSql
 import logging
+import os
 import cocktail.core.database
-from cocktail.core.database import data_classes, api as db_api
+from cocktail.core import util
+from cocktail.core.database import data_classes, maintenance, api as db_api
+from cocktail.core.database.writer import DatabaseWriter
 from cocktail.core.providers.model_data import ModelDataProvider
 from cocktail.ui.database.view import DatabaseView
 from cocktail.ui.logger import LogController
 
 
 class DatabaseController(QtCore.QObject):
+    """
+    Syncs model data into the database.
+
+    dataUpdated is coalesced while a sync writes pages: it is emitted at most once
+    per refresh interval, and once more when the sync finishes. The interval is
+    read from the "database/refresh_interval" setting in milliseconds.
+
+    Pages are deserialised in a pool of "database/parse_processes" processes, 0 or
+    1 parses on a thread instead.
+
+    Maintenance runs on the writer thread once the database has been idle for
+    "database/maintenance_idle" milliseconds after startup or a sync. It also
+    applies the "database/images_per_version" image retention limit when that
+    setting is present, 0 keeps every image.
+    """
+
+    REFRESH_INTERVAL = 2000
+    # leave a core for the ui and one for the writer.
+    PARSE_PROCESSES = min(max((os.cpu_count() or 1) - 2, 0), 4)
+    MAINTENANCE_IDLE = 60000
+
     updateComplete = QtCore.Signal()
     updateProgress = QtCore.Signal(int)
     updateMessage = QtCore.Signal(str)
     dataUpdated = QtCore.Signal()
+    maintenanceRequested = QtCore.Signal()
+    refreshRequested = QtCore.Signal()
 
     def __init__(self, connection, view=None, parent=None):
         super().__init__(parent)
         self.view = view or DatabaseView()
         self.connection: QtSql.QSqlDatabase = connection
-        self.model_data_provider = ModelDataProvider()
-        self.model_data_provider.pageReady.connect(self.onPageReady)
+        settings = QtCore.QSettings("cocktail", "cocktail")
+        self.model_data_provider = ModelDataProvider(
+            parse_processes=int(
+                settings.value("database/parse_processes", self.PARSE_PROCESSES)
+            )
+        )
+
+        self.refresh_timer = QtCore.QTimer()
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(
+            int(settings.value("database/refresh_interval", self.REFRESH_INTERVAL))
+        )
+        self.refresh_timer.timeout.connect(self.flushDataUpdated)
+        self._data_pending = False
+
+        # pages are written on a dedicated thread so the ui stays responsive.
+        self.writer = DatabaseWriter(
+            self.model_data_provider.queue, self.connection.databaseName()
+        )
+        self.writer_thread = QtCore.QThread()
+        self.writer.moveToThread(self.writer_thread)
+        self.writer_thread.finished.connect(self.writer.close)
+
+        # maintenance shares the writer's thread and so its connection.
+        self.maintenance = maintenance.DatabaseMaintenance(
+            self.connection.databaseName(),
+            idle_interval=int(
+                settings.value("database/maintenance_idle", self.MAINTENANCE_IDLE)
+            ),
+            images_per_version=self._imagesPerVersion(settings),
+        )
+        self.maintenance.moveToThread(self.writer_thread)
+        self.writer_thread.finished.connect(self.maintenance.close)
+        self.writer_thread.start()
+
+        self.model_data_provider.pageReady.connect(self.writer.processQueue)
         self.model_data_provider.beginRequest.connect(self.onUpdateBegin)
         self.model_data_provider.progress.connect(self.onUpdateProgress)
         self.model_data_provider.endRequest.connect(self.onUpdateEnd)
+        self.model_data_provider.endRequest.connect(self.writer.finish)
+        self.writer.pageCommitted.connect(self.onPageCommitted)
+        self.writer.pageCommitted.connect(self.model_data_provider.resume)
+        self.writer.pageFailed.connect(self.model_data_provider.resume)
+        self.writer.finished.connect(self.onWriteFinished)
+        self.writer.finished.connect(self.maintenance.requestMaintenance)
+        self.model_data_provider.beginRequest.connect(self.maintenance.postpone)
+        self.maintenanceRequested.connect(self.maintenance.requestMaintenance)
+        self.refreshRequested.connect(self.writer.beginRefresh)
+        self.maintenance.maintenanceFinished.connect(self.onMaintenanceFinished)
         self.view.updateClicked.connect(self.updateModelData)
 
+        app = QtCore.QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
         self.logger = logging.getLogger(cocktail.core.database.__name__)
         self.log_controller = LogController(self.logger, self.view.log_view)
         self.log_controller.logMessageReceived.connect(self.updateMessage)
 
+        report = maintenance.get_maintenance_report(self.connection)
+        if report is not None:
+            self.onMaintenanceFinished(report)
+        self.maintenanceRequested.emit()
+
+    @staticmethod
+    def _imagesPerVersion(settings: QtCore.QSettings):
+        value = settings.value("database/images_per_version")
+        if value is None:
+            return None
+
+        try:
+            return max(int(value), 0)
+        except (TypeError, ValueError):
+            return None
+
     def updateModelData(self, period: data_classes.Period = None):
+        """
+        sync models newer than the high water mark, or every model within an
+        explicitly requested period.
+
+        models created before the mark are not reached by the incremental sync, so
+        once a refresh is due every model updated since the last one is synced.
+        """
         if period is None:
-            period = db_api.get_db_update_period(self.connection)
+            period = db_api.get_refresh_period(self.connection)
+            if period is not None:
+                self.logger.info(f"Refreshing model data for period: {period.value}")
+                # queued to the writer thread ahead of the request's first page.
+                self.refreshRequested.emit()
+                self.model_data_provider.requestModelData(period)
+                return
+
+            high_water_mark = db_api.get_high_water_mark(self.connection)
+            if high_water_mark is None:
+                # a sync of every model is a refresh of its own.
+                self.refreshRequested.emit()
+            self.logger.info(f"Updating model data since: {high_water_mark}")
+            self.model_data_provider.requestModelUpdates(high_water_mark)
+            return
 
         self.logger.info(f"Updating model data for period: {period.value}")
 
         self.model_data_provider.requestModelData(period)
 
-    def onPageReady(self):
-        page = self.model_data_provider.queue.get()
-        db_api.insert_page(self.connection, page)
-        self.dataUpdated.emit()
+    def onPageCommitted(self, model_count):
+        # the timer is not restarted, so a long sync still refreshes every interval.
+        self._data_pending = True
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+
+    def flushDataUpdated(self):
+        self.refresh_timer.stop()
+        if self._data_pending:
+            self._data_pending = False
+            self.dataUpdated.emit()
 
     def onUpdateBegin(self):
         self.updateMessage.emit("Querying API")
@@ -54,12 +172,36 @@ class DatabaseController(QtCore.QObject):
         self.view.setProgress(value, total)
 
     def onUpdateEnd(self):
+        self.view.setProgress(0, 0)
+        self.view.setProgressText("Writing Updates")
+        self.updateMessage.emit("Writing Updates")
+
+    def onWriteFinished(self):
+        self.flushDataUpdated()
         self.view.setProgress(0, 100)
         self.view.setProgressText("Update Complete")
         self.updateMessage.emit("Update Complete")
-        db_api.set_last_updated(self.connection)
         self.updateComplete.emit()
 
+    def onMaintenanceFinished(self, report: dict):
+        before, after = report["before"], report["after"]
+        steps = ", ".join(
+            f"{name} {seconds:.2f}s" for name, seconds in report["steps"].items()
+        )
+        self.view.setMaintenanceReport(
+            f"Last maintenance {report['started_at']}: "
+            f"database {util.format_bytes(before['database'])} -> "
+            f"{util.format_bytes(after['database'])}, "
+            f"log {util.format_bytes(before['wal'])} -> "
+            f"{util.format_bytes(after['wal'])} ({steps})"
+        )
+
+    def shutdown(self):
+        self.refresh_timer.stop()
+        self.model_data_provider.shutdown()
+        self.writer_thread.quit()
+        self.writer_thread.wait()
+
 
 if __name__ == "__main__":
     import logging
@@ -11,11 +11,14 @@ class DatabaseView(QtWidgets.QWidget):
         super().__init__(parent)
         self.update_button = QtWidgets.QPushButton("Update")
         self.progress_bar = QtWidgets.QProgressBar()
+        self.maintenance_label = QtWidgets.QLabel("No maintenance has run yet")
+        self.maintenance_label.setProperty("class", "maintenance-report")
         self.log_view = LogView()
 
         layout = QtWidgets.QVBoxLayout(self)
         layout.addWidget(self.update_button, 1)
         layout.addWidget(self.progress_bar, 1)
+        layout.addWidget(self.maintenance_label, 1)
         layout.addWidget(self.log_view, 100)
 
         self.update_button.clicked.connect(self.updateClicked)
@@ -26,3 +29,6 @@ class DatabaseView(QtWidgets.QWidget):
 
     def setProgressText(self, text):
         self.progress_bar.setFormat(text)
+
+    def setMaintenanceReport(self, text):
+        self.maintenance_label.setText(text)
@@ -6,7 +6,7 @@ import platform
 import subprocess
 from PySide6 import QtCore, QtSql, QtGui, QtNetwork, QtWidgets
 
-from cocktail.core.database import data_classes
+from cocktail.core.database import codec, data_classes, api as db_api
 from cocktail.ui.download.view import DownloadDialog, ModelDownloadView
 
 logger = logging.getLogger(__name__)
@@ -137,6 +137,16 @@ class ModelDownloadController(QtCore.QObject):
 
         json_path = os.path.join(dirname, f"{filename}.json")
 
+        # descriptions are not loaded with the rows, see cold_storage.
+        model = model._replace(
+            description=db_api.get_model_description(self.db_connection, model.id)
+        )
+        model_version = model_version._replace(
+            description=db_api.get_model_version_description(
+                self.db_connection, model_version.id
+            )
+        )
+
         metadata = {
             "name": model.name,
             "activation text": ",".join(model_version.trained_words),
@@ -147,7 +157,7 @@ class ModelDownloadController(QtCore.QObject):
         }
 
         with open(json_path, "w") as f:
-            json.dump(metadata, f, indent=4)
+            json.dump(metadata, f, indent=4, default=codec.to_json)
 
         reply = self._download(model_file.url, final_path)
 
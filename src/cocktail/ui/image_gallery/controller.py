@@ -2,17 +2,36 @@ __all__ = ["ImageGalleryController"]
 
 from PySide6 import QtCore, QtSql
 from cocktail.ui.image_gallery.view import ImageGalleryView
-from cocktail.ui.image_gallery.model import ImageGalleryProxyModel
-from cocktail.core.database import data_classes
+from cocktail.ui.image_gallery.model import ImageGalleryModel, ImageGalleryProxyModel
+from cocktail.core.database import data_classes, images as db_images
+from cocktail.core.providers import VersionImageProvider
 
 
 class ImageGalleryController(QtCore.QObject):
+    """
+    Shows the images of a model version.
+
+    When the database only keeps some of a version's images, the stored ones are
+    shown right away and the rest are fetched from the api and appended.
+    """
+
     imageChanged = QtCore.Signal(data_classes.ModelImage)
 
-    def __init__(self, connection, image_provider, view=None, parent=None):
+    def __init__(
+        self,
+        connection,
+        image_provider,
+        version_image_provider=None,
+        view=None,
+        parent=None,
+    ):
         super().__init__(parent=parent)
         self.connection = connection
-        self.model = QtSql.QSqlQueryModel()
+        self.version_image_provider = version_image_provider or VersionImageProvider()
+        self.version_image_provider.imagesReady.connect(self.onImagesReady)
+        self._version_id = 0
+
+        self.model = ImageGalleryModel()
         self.proxy_model = ImageGalleryProxyModel(image_provider)
         self.proxy_model.setSourceModel(self.model)
         self.view = view or ImageGalleryView()
@@ -22,12 +41,16 @@ class ImageGalleryController(QtCore.QObject):
 
     def onIndexChanged(self, index: QtCore.QModelIndex):
         index = self.proxy_model.mapToSource(index)
-        record = self.model.record(index.row())
-        image = data_classes.ModelImage.from_record(record)
-        self.imageChanged.emit(image)
+        if not index.isValid():
+            return
+
+        self.imageChanged.emit(self.model.image(index.row()))
 
     def setVersionId(self, version_id: int):
+        self._version_id = version_id
+
         query = QtSql.QSqlQuery(self.connection)
+        query.setForwardOnly(True)
         query.prepare(
             """
             SELECT * FROM model_image WHERE model_version_id = :model_version_id
@@ -42,4 +65,16 @@ class ImageGalleryController(QtCore.QObject):
                 f"Failed to execute query: {query.lastError().text()}, {query.lastQuery()}"
             )
 
-        self.model.setQuery(query)
+        images = []
+        while query.next():
+            images.append(data_classes.ModelImage.from_record(query.record()))
+        query.finish()
+
+        self.model.setImages(images)
+
+        if db_images.is_pruned(self.connection, version_id):
+            self.version_image_provider.requestImages(version_id)
+
+    def onImagesReady(self, version_id: int, images: list):
+        if version_id == self._version_id:
+            self.model.addImages(images)
@@ -1,15 +1,55 @@
-__all__ = ["ImageGalleryProxyModel"]
+__all__ = ["ImageGalleryModel", "ImageGalleryProxyModel"]
+import typing
+
 from PySide6 import QtCore
 
+from cocktail.core.database import data_classes
 from cocktail.core.providers import ImageProviderProxyModel
 
 
+class ImageGalleryModel(QtCore.QAbstractListModel):
+    """
+    The images of a model version, read from the database or fetched from the api.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._images: typing.List[data_classes.ModelImage] = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._images)
+
+    def data(self, index: QtCore.QModelIndex, role: int = ...):
+        return None
+
+    def image(self, row: int) -> data_classes.ModelImage:
+        return self._images[row]
+
+    def setImages(self, images: typing.Sequence[data_classes.ModelImage]):
+        self.beginResetModel()
+        self._images = list(images)
+        self.endResetModel()
+
+    def addImages(self, images: typing.Sequence[data_classes.ModelImage]):
+        """
+        append the images that are not shown yet, keeping the current rows.
+        """
+        shown = {image.id for image in self._images}
+        images = [image for image in images if image.id not in shown]
+        if not images:
+            return
+
+        start = len(self._images)
+        self.beginInsertRows(QtCore.QModelIndex(), start, start + len(images) - 1)
+        self._images.extend(images)
+        self.endInsertRows()
+
+
 class ImageGalleryProxyModel(ImageProviderProxyModel):
     def getUrl(self, index: QtCore.QModelIndex, role):
-        record = self.sourceModel().record(index.row())
-        return record.value("url")
+        return self.sourceModel().image(index.row()).url
 
     def getBlurHash(self, index, role):
-        record = self.sourceModel().record(index.row())
-        value = record.value("blur_hash")
-        return value
+        return self.sourceModel().image(index.row()).blur_hash
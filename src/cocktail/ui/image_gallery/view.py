@@ -173,9 +173,11 @@ class ImageGalleryView(QtWidgets.QWidget):
         if self._model:
             self._model.dataChanged.disconnect(self.onModelDataChanged)
             self._model.modelReset.disconnect(self.onModelReset)
+            self._model.rowsInserted.disconnect(self.onRowsInserted)
 
         model.dataChanged.connect(self.onModelDataChanged)
         model.modelReset.connect(self.onModelReset)
+        model.rowsInserted.connect(self.onRowsInserted)
 
         self._model = model
         self._row = 0
@@ -204,6 +206,19 @@ class ImageGalleryView(QtWidgets.QWidget):
         self._row = 0
         self.updateImage()
 
+    def onRowsInserted(self, parent, first, last):
+        # images appended to the gallery keep the current one in place.
+        inserted = last - first + 1
+        was_empty = self._model.rowCount() == inserted
+        if not was_empty and first <= self._row:
+            self._row += inserted
+
+        self.navigation_group.setItemCount(self._model.rowCount())
+        self.navigation_group.setIndex(self._row)
+
+        if was_empty:
+            self.updateImage()
+
     def paintEvent(self, event: QtGui.QPaintEvent) -> None:
         if self.borderRadius:
             mask = QtGui.QPainterPath()
@@ -9,13 +9,14 @@ from cocktail.ui.database import DatabaseController
 from cocktail.ui.search import SearchController
 from cocktail.ui.settings import SettingsController
 
-from cocktail.core.database import get_connection
+from cocktail.core.database import connections
 
 
 class MainWindowController(QtCore.QObject):
     def __init__(self, parent=None):
         super().__init__(parent=parent)
-        self.connection = get_connection()
+        # the ui reads on its own connection, syncs write on the writer thread.
+        self.connection = connections.get_registry().reader()
         self.image_provider = ImageProvider()
 
         self.view = MainWindow()
@@ -51,8 +52,13 @@ class MainWindowController(QtCore.QObject):
             self.model_gallery_controller.base_model,
             self.view.central_widget.search_view,
         )
-        self.database_controller.dataUpdated.connect(self.search_controller.update)
-        self.database_controller.dataUpdated.connect(self.search_controller.onSearchChanged)
+        self.model_info_controller.browseCreator.connect(
+            self.search_controller.setCreator
+        )
+        self.model_gallery_controller.browseCreator.connect(
+            self.search_controller.setCreator
+        )
+        self.database_controller.dataUpdated.connect(self.search_controller.refresh)
         self.database_controller.updateMessage.connect(self.view.statusBar().showMessage)
 
         self.settings_controller = SettingsController(
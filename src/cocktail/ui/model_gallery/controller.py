@@ -3,18 +3,19 @@ __all__ = ["ModelGalleryController"]
 from PySide6 import QtCore, QtGui, QtWidgets, QtSql
 
 from cocktail.ui.model_gallery.view import ModelGalleryView
-from cocktail.ui.model_gallery.model import ModelGalleryProxyModel
-from cocktail.core.database import data_classes
+from cocktail.ui.model_gallery.model import ModelGalleryModel, ModelGalleryProxyModel
+from cocktail.core.database import data_classes, api as db_api
 
 
 class ModelGalleryController(QtCore.QObject):
     modelDataChanged = QtCore.Signal(data_classes.Model)
     requestDownloadModel = QtCore.Signal(data_classes.Model)
+    browseCreator = QtCore.Signal(int, str)
 
     def __init__(self, connection, view=None, parent=None):
         super().__init__(parent)
         self.db_connection: QtSql.QSqlDatabase = connection
-        self.base_model = QtSql.QSqlQueryModel()
+        self.base_model = ModelGalleryModel(connection)
         self.proxy_model = ModelGalleryProxyModel()
         self.proxy_model.setSourceModel(self.base_model)
 
@@ -23,34 +24,71 @@ class ModelGalleryController(QtCore.QObject):
 
         self.view.modelIndexChanged.connect(self.onModelIndexChanged)
         self.view.contextMenuRequested.connect(self.onContextMenuRequested)
-        self.update()
 
-    def update(self):
-        self.setQuery("SELECT * FROM model")
+        # model ids of the current and top visible item across a refresh.
+        self._refresh_anchor = (None, None)
+        self.base_model.aboutToRefresh.connect(self.onAboutToRefresh)
+        self.base_model.refreshed.connect(self.onRefreshed)
+
+    def modelAt(self, row: int) -> data_classes.Model:
+        return db_api.get_model(self.db_connection, self.base_model.modelId(row))
+
+    def _modelIdAt(self, proxy_index):
+        if not proxy_index.isValid():
+            return None
+
+        return self.base_model.modelId(self.proxy_model.mapToSource(proxy_index).row())
+
+    def _proxyIndexOf(self, model_id):
+        row = -1 if model_id is None else self.base_model.rowOf(model_id)
+        if row < 0:
+            return QtCore.QModelIndex()
+
+        return self.proxy_model.mapFromSource(self.base_model.index(row, 0))
+
+    def onAboutToRefresh(self):
+        self._refresh_anchor = (
+            self._modelIdAt(self.view.currentIndex()),
+            self._modelIdAt(self.view.topIndex()),
+        )
+
+    def onRefreshed(self):
+        current_id, top_id = self._refresh_anchor
+        self._refresh_anchor = (None, None)
+
+        current = self._proxyIndexOf(current_id)
+        if current.isValid():
+            self.view.setCurrentIndex(current)
+
+        top = self._proxyIndexOf(top_id)
+        if top.isValid():
+            self.view.scrollToTop(top)
 
     def onContextMenuRequested(self, index):
-        record = self.base_model.record(index.row())
-        model_data = data_classes.Model.from_record(record)
+        if not index.isValid():
+            return
+
+        model_data = self.modelAt(index.row())
+        if model_data is None:
+            return
 
         menu = QtWidgets.QMenu(self.view)
         menu.addAction("Download")
+        if model_data.creator_id:
+            menu.addAction("Browse Creator")
 
         action = menu.exec_(QtGui.QCursor.pos())
         if action:
             if action.text() == "Download":
                 self.requestDownloadModel.emit(model_data)
+            elif action.text() == "Browse Creator":
+                self.browseCreator.emit(model_data.creator_id, model_data.creator_name)
 
     def onModelIndexChanged(self, proxy_index):
         index = self.proxy_model.mapToSource(proxy_index)
-        record = self.base_model.record(index.row())
-        model_data = data_classes.Model.from_record(record)
-        self.modelDataChanged.emit(model_data)
-
-    def setQuery(self, text):
-        query = QtSql.QSqlQuery(self.db_connection)
-        query.prepare(text)
-        query.exec()
-        self.base_model.setQuery(query)
+        model_data = self.modelAt(index.row())
+        if model_data is not None:
+            self.modelDataChanged.emit(model_data)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,130 @@
-from PySide6 import QtCore
+import array
+import typing
 
+from PySide6 import QtCore, QtSql
+
+from cocktail.core.cache import FixedLengthMapping
 from cocktail.core.providers import ImageProviderProxyModel
-from cocktail.core.database import data_classes
+from cocktail.core.database import creators, data_classes
+
+
+class ModelGalleryModel(QtCore.QAbstractListModel):
+    """
+    A list model of search results holding only the columns the gallery paints.
+
+    The model holds the ids of every result, the painted columns are loaded by id a
+    window at a time and stored column-wise. Windows are evicted beyond a fixed
+    count and reloaded when revisited, so memory stays bounded for any number of
+    results.
+    """
+
+    COLUMNS = ["id", "name", "type", "image", "image_blur_hash", "creator_image"]
+    # columns which are not on the model table itself.
+    COLUMN_EXPRESSIONS = {"creator_image": "c.image"}
+
+    aboutToRefresh = QtCore.Signal()
+    refreshed = QtCore.Signal()
+
+    def __init__(self, connection, window_size=256, max_windows=16, parent=None):
+        super().__init__(parent)
+        self.connection: QtSql.QSqlDatabase = connection
+        self.window_size = window_size
+        self._ids = array.array("q")
+        self._windows = FixedLengthMapping(max_entries=max_windows)
+
+    def setIds(self, ids: typing.Iterable[int]):
+        self.beginResetModel()
+        self._ids = array.array("q", ids)
+        self._windows.clear()
+        self.endResetModel()
+
+    def refreshIds(self, ids: typing.Iterable[int]):
+        """
+        replace the results of the current search after the data changed, unlike
+        setIds views are expected to keep their place.
+        """
+        self.aboutToRefresh.emit()
+        self.setIds(ids)
+        self.refreshed.emit()
+
+    def appendIds(self, ids: typing.Iterable[int]):
+        ids = array.array("q", ids)
+        if not ids:
+            return
+
+        # the last window may be partial, it is reloaded with the new rows.
+        self._windows.pop(len(self._ids) // self.window_size, None)
+
+        first = len(self._ids)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(ids) - 1)
+        self._ids.extend(ids)
+        self.endInsertRows()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self._ids)
+
+    def _window(self, row):
+        window_index = row // self.window_size
+        try:
+            return self._windows[window_index]
+        except KeyError:
+            pass
+
+        start = window_index * self.window_size
+        ids = self._ids[start : start + self.window_size]
+        placeholders = ", ".join(["?"] * len(ids))
+        query = QtSql.QSqlQuery(self.connection)
+        query.setForwardOnly(True)
+        columns = ", ".join(
+            self.COLUMN_EXPRESSIONS.get(column, f"m.{column}")
+            for column in self.COLUMNS
+        )
+        query.prepare(
+            f"SELECT {columns} FROM {creators.MODEL_SOURCE} "
+            f"WHERE m.id IN ({placeholders})"
+        )
+        for index, model_id in enumerate(ids):
+            query.bindValue(index, model_id)
+        query.exec()
+
+        rows = {}
+        while query.next():
+            rows[query.value(0)] = [
+                query.value(index) for index in range(len(self.COLUMNS))
+            ]
+
+        # models deleted since the search keep their row, with empty values.
+        empty = [None] * len(self.COLUMNS)
+        window = {
+            column: [rows.get(model_id, empty)[index] for model_id in ids]
+            for index, column in enumerate(self.COLUMNS)
+        }
+        self._windows[window_index] = window
+        return window
+
+    def value(self, row: int, column: str):
+        return self._window(row)[column][row % self.window_size]
+
+    def modelId(self, row: int) -> int:
+        return self._ids[row]
+
+    def rowOf(self, model_id: int) -> int:
+        try:
+            return self._ids.index(model_id)
+        except ValueError:
+            return -1
+
+    def data(self, index: QtCore.QModelIndex, role: int = ...):
+        if not index.isValid():
+            return None
+
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self.value(index.row(), "name")
+
+        return None
 
 
 class ModelGalleryProxyModel(ImageProviderProxyModel):
@@ -23,16 +146,13 @@ class ModelGalleryProxyModel(ImageProviderProxyModel):
 
     def data(self, index: QtCore.QModelIndex, role: int = ...):
         if role == QtCore.Qt.ItemDataRole.DisplayRole:
-            record = self.sourceModel().record(index.row())
-            return record.value("name")
+            return self.sourceModel().value(index.row(), "name")
 
         elif role == ModelGalleryProxyModel.NameRole:
-            record = self.sourceModel().record(index.row())
-            return record.value("name")
+            return self.sourceModel().value(index.row(), "name")
 
         elif role == ModelGalleryProxyModel.TypeRole:
-            record = self.sourceModel().record(index.row())
-            return record.value("type")
+            return self.sourceModel().value(index.row(), "type")
 
         return super().data(index, role)
 
@@ -40,10 +160,7 @@ class ModelGalleryProxyModel(ImageProviderProxyModel):
         self, index: QtCore.QModelIndex, role=QtCore.Qt.ItemDataRole.DecorationRole
     ):
         name = self.ImageRoles[role]
-        record = self.sourceModel().record(index.row())
-        return record.value(name)
+        return self.sourceModel().value(index.row(), name)
 
     def getBlurHash(self, index, role=QtCore.Qt.ItemDataRole.DecorationRole):
-        record = self.sourceModel().record(index.row())
-        value = record.value("image_blur_hash")
-        return value
+        return self.sourceModel().value(index.row(), "image_blur_hash")
@@ -81,3 +81,19 @@ class ModelGalleryView(QtWidgets.QWidget):
 
     def setModel(self, model):
         self._list_view.setModel(model)
+
+    def currentIndex(self) -> QtCore.QModelIndex:
+        return self._list_view.currentIndex()
+
+    def setCurrentIndex(self, index: QtCore.QModelIndex):
+        self._list_view.setCurrentIndex(index)
+
+    def topIndex(self) -> QtCore.QModelIndex:
+        """
+        the first item visible in the viewport.
+        """
+        spacing = self._list_view.spacing()
+        return self._list_view.indexAt(QtCore.QPoint(spacing + 1, spacing + 1))
+
+    def scrollToTop(self, index: QtCore.QModelIndex):
+        self._list_view.scrollTo(index, QtWidgets.QAbstractItemView.PositionAtTop)
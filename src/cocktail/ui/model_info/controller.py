@@ -1,20 +1,81 @@
 __all__ = ["ModelInfoController"]
 
+from functools import partial
+
 from PySide6 import QtCore, QtGui, QtWidgets, QtSql
 from cocktail.ui.model_info.view import CreatorInfoView, VersionInfoView, ModelInfoView
+from cocktail.core.cache import FixedLengthMapping
 from cocktail.core.providers import ImageProvider
-from cocktail.core.database import data_classes
+from cocktail.core.database import data_classes, api as db_api
 from cocktail.ui.image_gallery import ImageGalleryController
 
 
 class CreatorInfoController(QtCore.QObject):
-    def __init__(self, image_provider, view=None, parent=None):
+    """
+    Shows the creator of the current model.
+
+    Avatars are kept in a cache of their own keyed by creator, scaled to the view
+    once when downloaded, so they are not requested or decoded again for every
+    model of the same creator and do not compete with the gallery images.
+    """
+
+    creatorClicked = QtCore.Signal(int, str)
+
+    AVATAR_SIZE = 64
+
+    def __init__(self, image_provider, view=None, max_avatars=256, parent=None):
         super().__init__(parent=parent)
         self.image_provider: ImageProvider = image_provider
         self.view = view or CreatorInfoView()
 
-    def setImageUrl(self, url: str):
-        self.image_provider.queueImageDownload(url, self.setImage)
+        self._avatars = FixedLengthMapping(max_entries=max_avatars)
+        self._pending = set()
+        self._creator_id = 0
+        self._name = ""
+
+        self.view.creatorClicked.connect(self.onCreatorClicked)
+
+    def setCreator(self, creator_id: int, name: str, url: str):
+        self._creator_id = creator_id
+        self._name = name
+        self.view.setName(name)
+
+        if creator_id in self._avatars:
+            self.view.setImage(self._avatars[creator_id])
+            return
+
+        if not url:
+            self._avatars[creator_id] = None
+            self.view.setImage(None)
+            return
+
+        self.view.setImage(QtGui.QImage())
+        if creator_id not in self._pending:
+            self._pending.add(creator_id)
+            self.image_provider.requestImage(
+                url, partial(self.onAvatarDownloaded, creator_id)
+            )
+
+    def onAvatarDownloaded(self, creator_id: int, image: QtGui.QImage):
+        self._pending.discard(creator_id)
+        if image is not None:
+            image = image.scaled(
+                self.AVATAR_SIZE,
+                self.AVATAR_SIZE,
+                QtCore.Qt.AspectRatioMode.KeepAspectRatioByExpanding,
+                QtCore.Qt.TransformationMode.SmoothTransformation,
+            )
+            rect = QtCore.QRect(0, 0, self.AVATAR_SIZE, self.AVATAR_SIZE)
+            rect.moveCenter(image.rect().center())
+            image = image.copy(rect)
+            self._avatars[creator_id] = image
+
+        if creator_id == self._creator_id:
+            self.view.setImage(image)
+
+    def onCreatorClicked(self):
+        if self._creator_id:
+            self.creatorClicked.emit(self._creator_id, self._name)
 
     def setImage(self, image: QtGui.QImage):
         self.view.setImage(image)
@@ -53,7 +114,12 @@ class VersionInfoController(QtCore.QObject):
 
         query = QtSql.QSqlQuery(self.connection)
 
-        fields = [f for f in data_classes.ModelVersion._fields if f not in ["name"]]
+        # the description is stored separately and not needed to pick a version.
+        fields = [
+            f
+            for f in data_classes.ModelVersion._fields
+            if f not in ["name", "description"]
+        ]
 
         fields.insert(0, "name")
 
@@ -125,6 +191,8 @@ class ModelInfoController(QtCore.QObject):
     This class is responsible for populating the ModelInfoView when a model is picked.
     """
 
+    browseCreator = QtCore.Signal(int, str)
+
     def __init__(
         self,
         connection: QtSql.QSqlDatabase,
@@ -140,6 +208,7 @@ class ModelInfoController(QtCore.QObject):
         self.creator_controller = CreatorInfoController(
             view=self.view.header_view.creator_info, image_provider=self.image_provider
         )
+        self.creator_controller.creatorClicked.connect(self.browseCreator)
 
         self.version_info_controller = VersionInfoController(
             self.connection, view=self.view.version_info
@@ -161,16 +230,20 @@ class ModelInfoController(QtCore.QObject):
     def setModelData(self, model: data_classes.Model):
         self.view.requestFocus.emit(self.view)
         self.view.setModelData(model)
+        self.view.setDescription(
+            db_api.get_model_description(self.connection, model.id)
+        )
         self.view.setEnabled(True)
 
-        self.creator_controller.setImageUrl(model.creator_image)
-        self.creator_controller.setName(model.creator_name)
+        self.creator_controller.setCreator(
+            model.creator_id, model.creator_name, model.creator_image
+        )
         self.version_info_controller.setModel(model)
 
 
 if __name__ == "__main__":
     import sys
-    from cocktail.core.database import get_connection
+    from cocktail.core.database import creators, get_connection
     from cocktail.core.providers import ImageProvider
 
     app = QtWidgets.QApplication(sys.argv)
@@ -179,10 +252,10 @@ if __name__ == "__main__":
 
     query = QtSql.QSqlQuery(db)
     query.prepare(
-        """
-        SELECT *
-        FROM model
-        WHERE id = 34553
+        f"""
+        SELECT {creators.MODEL_COLUMNS}
+        FROM {creators.MODEL_SOURCE}
+        WHERE m.id = 34553
         """
     )
 
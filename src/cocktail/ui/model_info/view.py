@@ -1,4 +1,6 @@
 __all__ = ["ModelInfoView", "CreatorInfoView", "ModelInfoHeader"]
+import html
+
 from PySide6 import QtCore, QtWidgets, QtGui
 from cocktail.ui.image_gallery import ImageWidget, ImageGalleryView
 from cocktail.core.database import data_classes
@@ -48,6 +50,8 @@ class CreatorInfoView(QtWidgets.QWidget):
     This widget displays the author's name and image
     """
 
+    creatorClicked = QtCore.Signal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setProperty("class", "creator-info")
@@ -56,12 +60,16 @@ class CreatorInfoView(QtWidgets.QWidget):
         self.creator_image.setFixedSize(64, 64)
         self.creator_image.borderPen = QtGui.QPen(QtGui.QColor(255, 255, 255, 64), 2)
         self.creator_name = QtWidgets.QLabel("Name")
+        self.creator_name.setTextFormat(QtCore.Qt.TextFormat.RichText)
+        self.creator_name.setToolTip("Browse models by this creator")
 
         layout = QtWidgets.QHBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         layout.addWidget(self.creator_image)
         layout.addWidget(self.creator_name)
 
+        self.creator_name.linkActivated.connect(lambda *_: self.creatorClicked.emit())
+
     def setImage(self, image: QtGui.QImage):
         mask = QtGui.QPainterPath()
         mask.addEllipse(2, 2, 60, 60)
@@ -69,7 +77,8 @@ class CreatorInfoView(QtWidgets.QWidget):
         self.creator_image.setImage(image)
 
     def setName(self, name: str):
-        self.creator_name.setText(name)
+        name = html.escape(name)
+        self.creator_name.setText(f'<a href="creator">{name}</a>' if name else "")
 
 
 class ModelInfoHeader(QtWidgets.QWidget):
@@ -91,7 +100,7 @@ class ModelInfoHeader(QtWidgets.QWidget):
         layout = QtWidgets.QHBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         layout.addWidget(self.model_name_label, 1, QtCore.Qt.AlignmentFlag.AlignCenter)
-        # layout.addWidget(self.creator_info, 0, QtCore.Qt.AlignmentFlag.AlignRight)
+        layout.addWidget(self.creator_info, 0, QtCore.Qt.AlignmentFlag.AlignRight)
 
 
 class ImageInfoView(CollapsibleGroup):
@@ -199,9 +208,11 @@ class ModelInfoView(QtWidgets.QWidget):
         layout.addWidget(self.description, 100)
 
     def setModelData(self, model: data_classes.Model):
-        self.description.setText(model.description)
         self.header_view.model_name_label.setText(model.name)
 
+    def setDescription(self, description: str):
+        self.description.setText(description)
+
     def setImageData(self, image: data_classes.ModelImage):
         self.image_info.setImageData(image)
 
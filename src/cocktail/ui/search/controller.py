@@ -3,25 +3,42 @@ from PySide6 import QtCore, QtWidgets, QtGui, QtSql
 from PySide6.QtGui import QStandardItemModel
 
 from cocktail.ui.search.view import SearchView
-from cocktail.core.database import util as db_util
+from cocktail.ui.model_gallery.model import ModelGalleryModel
+from cocktail.core.providers.search import SearchProvider
+from cocktail.core.database import facets, tags, util as db_util
 
 
 class SearchController(QtCore.QObject):
     def __init__(self, connection, model, view=None, parent=None):
         super().__init__(parent)
-        self.model: QtSql.QSqlQueryModel = model
+        self.model: ModelGalleryModel = model
         self.category_model = QtGui.QStandardItemModel()
         self.type_model = QtGui.QStandardItemModel()
         self.sort_order_model = QtGui.QStandardItemModel()
         self.base_model_model = QtGui.QStandardItemModel()
+        self.tag_mode_model = QtGui.QStandardItemModel()
+        self.tag_model = QtCore.QStringListModel()
 
         self.connection: QtSql.QSqlDatabase = connection
 
+        # searches run off the ui thread, results arrive as lists of model ids.
+        self.search_provider = SearchProvider(self.connection.databaseName())
+        self.search_provider.resultsReset.connect(self.model.setIds)
+        self.search_provider.resultsAppended.connect(self.model.appendIds)
+        self.search_provider.resultsRefreshed.connect(self.model.refreshIds)
+        self.search_provider.facetCountsReady.connect(self.setFacetCounts)
+
+        app = QtCore.QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.search_provider.shutdown)
+
         self.view = view or SearchView()
         self.view.setCategoryModel(self.category_model)
         self.view.setTypeModel(self.type_model)
         self.view.setSortOrderModel(self.sort_order_model)
         self.view.setBaseModelModel(self.base_model_model)
+        self.view.setTagModeModel(self.tag_mode_model)
+        self.view.setTagCompletionModel(self.tag_model)
 
         self.view.searchChanged.connect(self.onSearchChanged)
 
@@ -41,153 +58,141 @@ class SearchController(QtCore.QObject):
         self.updateNSFWLevels()
         self.updateSortOrder()
         self.updateBaseModels()
+        self.updateTagModes()
+        self.updateTags()
+        self.onSearchChanged()
+
+    def refresh(self):
+        """
+        update the filters and results after the data changed, without starting a
+        new search.
+        """
+        # rebuilding the combos changes their selection, which would be a new search.
+        blocker = QtCore.QSignalBlocker(self.view)
+        self.updateCategories()
+        self.updateTypes()
+        self.updateNSFWLevels()
+        self.updateBaseModels()
+        self.updateTags()
+        blocker.unblock()
+
+        # the facet counts follow the refreshed results.
+        self.search_provider.refresh()
+
+    def setCreator(self, creator_id: int, name: str):
+        """
+        browse the models of a single creator, most recently updated first.
+        """
+        blocker = QtCore.QSignalBlocker(self.view)
+        self.view.setCreator(creator_id, name)
+        self.view.setSortOrder("Updated")
+        blocker.unblock()
         self.onSearchChanged()
 
     def updateSortOrder(self):
         value = self.view.sortOrder()
         self.sort_order_model.clear()
+        self.sort_order_model.appendRow(QtGui.QStandardItem("Relevance"))
         self.sort_order_model.appendRow(QtGui.QStandardItem("Updated"))
         self.sort_order_model.appendRow(QtGui.QStandardItem("Name"))
         self.sort_order_model.appendRow(QtGui.QStandardItem("Id"))
         if value:
             self.view.setSortOrder(value)
 
-    def updateNSFWLevels(self):
-        sql = """
-        SELECT MIN(nsfw),MAX(nsfw) FROM model
-        """
-        query = QtSql.QSqlQuery(self.connection)
-        query.exec(sql)
+    def updateTagModes(self):
+        value = self.view.tagMode()
+        self.tag_mode_model.clear()
+        for mode in tags.TAG_MODES:
+            self.tag_mode_model.appendRow(QtGui.QStandardItem(mode))
+        if value:
+            self.view.setTagMode(value)
 
-        if query.next():
-            minimum = query.value(0) or 0
-            maximum = query.value(1) or 100
-            self.view.setNSFWRanges(minimum, maximum)
+    def updateTags(self):
+        # most used first, which is the order they are completed in.
+        self.tag_model.setStringList(
+            [name for name, _ in tags.tag_counts(self.connection)]
+        )
 
-    def updateBaseModels(self):
-        value = self.view.baseModel()
+    def updateNSFWLevels(self):
+        minimum, maximum = facets.nsfw_range(self.connection) or (0, 100)
+        self.view.setNSFWRanges(minimum or 0, maximum or 100)
 
-        self.base_model_model.clear()
-        all_item = QtGui.QStandardItem("All")
-        all_item.setIcon(qtawesome.icon("mdi6.tag"))
-        self.base_model_model.appendRow(all_item)
+    def _facetItem(self, value, icon):
+        item = QtGui.QStandardItem(value)
+        item.setData(value, QtCore.Qt.ItemDataRole.UserRole)
+        item.setIcon(icon)
+        return item
 
-        sql = """
-        SELECT DISTINCT base_model FROM model_version ORDER BY base_model
+    def _setFacetItems(self, facet, model, icons, default_icon):
+        """
+        replace the values of a facet combo, the value is kept in the item data as
+        the text also shows its count.
         """
-        query = QtSql.QSqlQuery(self.connection)
-        query.exec(sql)
+        values = [value for value, _ in facets.facet_counts(self.connection, facet)]
 
-        while query.next():
-            icon = qtawesome.icon("mdi6.brain")
-            item = QtGui.QStandardItem(query.value(0))
-            item.setIcon(icon)
-            self.base_model_model.appendRow(item)
+        model.clear()
+        model.appendRow(self._facetItem("All", qtawesome.icon("mdi6.tag")))
+        for value in values:
+            model.appendRow(self._facetItem(value, icons.get(value, default_icon)))
 
+    def updateBaseModels(self):
+        value = self.view.baseModel()
+        icon = qtawesome.icon("mdi6.brain")
+        self._setFacetItems("base_model", self.base_model_model, {}, icon)
         if value:
             self.view.setBaseModel(value)
 
     def updateCategories(self):
-        sql = """
-        SELECT DISTINCT category FROM model ORDER BY category
-        """
-        query = QtSql.QSqlQuery(self.connection)
-        query.exec(sql)
-
         value = self.view.category()
-
-        self.category_model.clear()
-        item = QtGui.QStandardItem("All")
-        item.setIcon(qtawesome.icon("mdi6.tag"))
-        self.category_model.appendRow(item)
-
-        while query.next():
-            icon = self.category_icons.get(query.value(0), qtawesome.icon("mdi6.tag"))
-            item = QtGui.QStandardItem(query.value(0))
-            item.setIcon(icon)
-            self.category_model.appendRow(item)
-
+        icon = qtawesome.icon("mdi6.tag")
+        self._setFacetItems("category", self.category_model, self.category_icons, icon)
         self.view.setCategory(value)
 
     def updateTypes(self):
-        sql = """
-        SELECT DISTINCT type FROM model ORDER BY type
-        """
-        query = QtSql.QSqlQuery(self.connection)
-        query.exec(sql)
-
         value = self.view.type()
-
-        self.type_model.clear()
-        item = QtGui.QStandardItem("All")
-        item.setIcon(qtawesome.icon("mdi6.tag"))
-        self.type_model.appendRow(item)
-
-        while query.next():
-            icon = self.type_icons.get(query.value(0), qtawesome.icon("mdi6.tag"))
-            item = QtGui.QStandardItem(query.value(0))
-            item.setIcon(icon)
-            self.type_model.appendRow(item)
-
+        icon = qtawesome.icon("mdi6.tag")
+        self._setFacetItems("model_type", self.type_model, self.type_icons, icon)
         self.view.setType(value)
 
-    def onSearchChanged(self):
-        where = []
-        join = ""
-
-        text = self.view.search_text.text()
-        model_type = self.view.type()
-        model_category = self.view.category()
-        base_model = self.view.baseModel()
-
-        bind = {}
-
-        if text:
-            where.append("m.name LIKE :text")
-            bind["text"] = f"%{text}%"
-
-        if model_type != "All":
-            where.append("m.type = :type")
-            bind["type"] = model_type
-
-        if model_category != "All":
-            where.append("m.category = :category")
-            bind["category"] = model_category
-
-        if base_model != "All":
-            where.append("mv.base_model = :base_model")
-            bind["base_model"] = base_model
-            join = "JOIN model_version  mv ON m.id=mv.model_id"
-
-        if self.view.nsfw():
-            where.append(f"nsfw <= {self.view.nsfw()}")
-
-        sort_order = self.view.sortOrder()
-        if sort_order == "Id":
-            order_by = "id DESC"
-        elif sort_order == "Name":
-            order_by = "name ASC"
-        else:
-            order_by = "updated_at DESC"
-
-        if where:
-            where = " AND ".join(where)
-            where = f"WHERE {where}"
-        else:
-            where = ""
-
-        sql = f"""
-        SELECT DISTINCT m.* 
-        FROM model m
-        {join}
-        {where}
-        ORDER BY {order_by}
+    def setFacetCounts(self, facet_counts: dict):
         """
+        show the number of models each value would find under the search text and
+        the other filters, counted by the search provider with the results.
 
-        query = QtSql.QSqlQuery(self.connection)
-        query.prepare(sql)
-        for k, v in bind.items():
-            query.bindValue(f":{k}", v)
+        only the item text changes, so the selection and the search are untouched.
+        """
+        for facet, model in [
+            ("model_type", self.type_model),
+            ("category", self.category_model),
+            ("base_model", self.base_model_model),
+        ]:
+            counts = dict(facet_counts.get(facet, ()))
+            total = 0
+            for row in range(1, model.rowCount()):
+                item = model.item(row)
+                value = item.data(QtCore.Qt.ItemDataRole.UserRole)
+                count = counts.get(value, 0)
+                total += count
+                item.setText(f"{value} ({count})")
+
+            # models have a single type and category, but may have several base models.
+            if facet != "base_model" and model.rowCount():
+                model.item(0).setText(f"All ({total})")
+
+    def filters(self) -> dict:
+        return {
+            "model_type": self.view.type(),
+            "category": self.view.category(),
+            "base_model": self.view.baseModel(),
+            "nsfw": self.view.nsfw(),
+            "tags": self.view.tags(),
+            "tag_mode": self.view.tagMode(),
+            "creator_id": self.view.creatorId(),
+        }
 
-        query.exec()
-        self.model.setQuery(query)
+    def onSearchChanged(self):
+        self.search_provider.search(
+            text=self.view.search_text.text(),
+            sort_order=self.view.sortOrder(),
+            **self.filters(),
+        )
@@ -10,6 +10,19 @@ class SearchView(QtWidgets.QWidget):
         self.setWindowFlags(QtCore.Qt.WindowFlags.FramelessWindowHint)
         self.search_text = QtWidgets.QLineEdit()
         self.search_text.setPlaceholderText("Search")
+        self.tag_edit = QtWidgets.QLineEdit()
+        self.tag_edit.setPlaceholderText("Tags")
+        # the completer is driven by hand as it completes the last of the comma
+        # separated tags rather than the whole text.
+        self.tag_completer = QtWidgets.QCompleter(self)
+        self.tag_completer.setWidget(self.tag_edit)
+        self.tag_completer.setCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+        self.tag_completer.setFilterMode(QtCore.Qt.MatchFlag.MatchContains)
+        self.tag_mode_selector = QtWidgets.QComboBox()
+        # shown while browsing a single creator, clicking it clears the filter.
+        self.creator_button = QtWidgets.QPushButton()
+        self.creator_button.setToolTip("Show models by every creator")
+        self.creator_button.setVisible(False)
         self.base_model_selector = QtWidgets.QComboBox()
         self.nsfw_slider = QtWidgets.QSlider(QtCore.Qt.Orientation.Horizontal)
         self.nsfw_slider.setProperty("class", "nsfw-slider")
@@ -20,6 +33,10 @@ class SearchView(QtWidgets.QWidget):
 
         layout = QtWidgets.QHBoxLayout(self)
         layout.addWidget(self.search_text, 100)
+        layout.addWidget(self.creator_button, 1)
+        layout.addWidget(QtWidgets.QLabel("Tags"), 1)
+        layout.addWidget(self.tag_edit, 30)
+        layout.addWidget(self.tag_mode_selector, 1)
         layout.addWidget(QtWidgets.QLabel("Category"), 1)
         layout.addWidget(self.category_selector, 1)
         layout.addWidget(QtWidgets.QLabel("Type"), 1)
@@ -32,10 +49,20 @@ class SearchView(QtWidgets.QWidget):
         layout.addWidget(self.sort_order_selector, 1)
 
         self.search_text.textChanged.connect(lambda *_: self.searchChanged.emit())
-        self.category_selector.currentTextChanged.connect(
+        # tags are only applied once the list is finished, not for every character.
+        self.tag_edit.editingFinished.connect(self._onTagsEdited)
+        self.tag_edit.textEdited.connect(self._onTagTextEdited)
+        self.tag_completer.activated[str].connect(self._onTagCompleted)
+        self.tag_mode_selector.currentTextChanged.connect(self._onTagModeChanged)
+        self._applied_tags = []
+        self.creator_button.clicked.connect(self._onCreatorCleared)
+        self._creator_id = 0
+        # item text carries a count which changes with the filters, the selected
+        # value is kept in the item data.
+        self.category_selector.currentIndexChanged.connect(
             lambda *_: self.searchChanged.emit()
         )
-        self.type_selector.currentTextChanged.connect(
+        self.type_selector.currentIndexChanged.connect(
             lambda *_: self.searchChanged.emit()
         )
         self.base_model_selector.currentIndexChanged.connect(
@@ -44,6 +71,42 @@ class SearchView(QtWidgets.QWidget):
         self.nsfw_slider.sliderReleased.connect(lambda *_: self.searchChanged.emit())
         self.sort_order_selector.currentTextChanged.connect(lambda *_: self.searchChanged.emit())
 
+    def _onTagTextEdited(self, text: str):
+        prefix = text.split(",")[-1].strip()
+        if not prefix:
+            self.tag_completer.popup().hide()
+            return
+
+        self.tag_completer.setCompletionPrefix(prefix)
+        self.tag_completer.complete()
+
+    def _onTagCompleted(self, tag: str):
+        tags = [tag.strip() for tag in self.tag_edit.text().split(",")[:-1]]
+        self.tag_edit.setText(", ".join([*tags, tag]) + ", ")
+        self._onTagsEdited()
+
+    def _onTagsEdited(self):
+        tags = self._editedTags()
+        if tags != self._applied_tags:
+            self._applied_tags = tags
+            self.searchChanged.emit()
+
+    def _onCreatorCleared(self):
+        self.setCreator(0, "")
+        self.searchChanged.emit()
+
+    def _onTagModeChanged(self):
+        if self._applied_tags:
+            self.searchChanged.emit()
+
+    def creatorId(self):
+        return self._creator_id
+
+    def setCreator(self, creator_id: int, name: str):
+        self._creator_id = creator_id
+        self.creator_button.setText(f"{name} \u2715")
+        self.creator_button.setVisible(bool(creator_id))
+
     def nsfw(self):
         return self.nsfw_slider.value()
 
@@ -56,23 +119,36 @@ class SearchView(QtWidgets.QWidget):
     def setNSFWLevel(self, level):
         self.nsfw_slider.setValue(level)
 
+    @staticmethod
+    def _currentValue(selector: QtWidgets.QComboBox):
+        value = selector.currentData(QtCore.Qt.ItemDataRole.UserRole)
+        return selector.currentText() if value is None else value
+
+    @staticmethod
+    def _setCurrentValue(selector: QtWidgets.QComboBox, value):
+        index = selector.findData(value, QtCore.Qt.ItemDataRole.UserRole)
+        if index >= 0:
+            selector.setCurrentIndex(index)
+        else:
+            selector.setCurrentText(value)
+
     def type(self):
-        return self.type_selector.currentText()
+        return self._currentValue(self.type_selector)
 
     def setType(self, name: str):
-        self.type_selector.setCurrentText(name)
+        self._setCurrentValue(self.type_selector, name)
 
     def setTypeModel(self, model):
         self.type_selector.setModel(model)
 
     def category(self):
-        return self.category_selector.currentText()
+        return self._currentValue(self.category_selector)
 
     def setCategoryModel(self, model):
         self.category_selector.setModel(model)
 
     def setCategory(self, category):
-        self.category_selector.setCurrentText(category)
+        self._setCurrentValue(self.category_selector, category)
 
     def setSortOrderModel(self, model):
         self.sort_order_selector.setModel(model)
@@ -87,7 +163,33 @@ class SearchView(QtWidgets.QWidget):
         self.base_model_selector.setModel(model)
 
     def setBaseModel(self, name: str):
-        self.base_model_selector.setCurrentText(name)
+        self._setCurrentValue(self.base_model_selector, name)
 
     def baseModel(self):
-        return self.base_model_selector.currentText()
+        return self._currentValue(self.base_model_selector)
+
+    def _editedTags(self):
+        tags = (tag.strip() for tag in self.tag_edit.text().split(","))
+        return [tag for tag in tags if tag]
+
+    def tags(self):
+        """
+        the tags as of the last finished edit, not the ones still being typed.
+        """
+        return list(self._applied_tags)
+
+    def setTags(self, tags):
+        self.tag_edit.setText(", ".join(tags))
+        self._applied_tags = self._editedTags()
+
+    def setTagCompletionModel(self, model):
+        self.tag_completer.setModel(model)
+
+    def tagMode(self):
+        return self.tag_mode_selector.currentText()
+
+    def setTagModeModel(self, model):
+        self.tag_mode_selector.setModel(model)
+
+    def setTagMode(self, mode: str):
+        self.tag_mode_selector.setCurrentText(mode)
@@ -1,11 +1,11 @@
 import os
-import io
 import json
 import zipfile
 import logging
 from PySide6 import QtCore, QtNetwork
 from cocktail.ui.startup.view import CocktailSplashScreen, SetupWizard
-from cocktail.core.database import api as db_api
+from PySide6 import QtSql
+from cocktail.core.database import api as db_api, connections, migrations, patches
 
 
 logger = logging.getLogger(__name__)
@@ -21,6 +21,38 @@ def get_db_url(data):
                 return asset["browser_download_url"]
 
 
+def get_patch_assets(data):
+    """
+    collect the patch assets from every release, patches stay valid after a newer
+    snapshot is released.
+    """
+    assets = {}
+    for item in data:
+        if item["prerelease"]:
+            continue
+        for asset in item["assets"]:
+            if patches.parse_patch_name(asset["name"]) is not None:
+                assets[asset["name"]] = asset["browser_download_url"]
+
+    return assets
+
+
+def list_directory_releases(path):
+    """
+    present a local directory of release assets in the shape of the releases api.
+    """
+    assets = [
+        {
+            "name": name,
+            "browser_download_url": QtCore.QUrl.fromLocalFile(
+                os.path.join(path, name)
+            ).toString(),
+        }
+        for name in sorted(os.listdir(path))
+    ]
+    return [{"prerelease": False, "assets": assets}]
+
+
 class DownloadStep(QtCore.QObject):
     """
     download a file from a url.
@@ -47,37 +79,136 @@ class DownloadStep(QtCore.QObject):
         self.complete.emit(self.sender())
 
 
+class FileDownloadStep(QtCore.QObject):
+    """
+    stream a download to a file as it arrives, so the response is never held in
+    memory.
+    """
+
+    progress = QtCore.Signal("qint64", "qint64")
+    complete = QtCore.Signal(str)
+    failed = QtCore.Signal(str)
+
+    def __init__(self, network_manager: QtNetwork.QNetworkAccessManager, parent=None):
+        super().__init__(parent)
+        self.network_manager = network_manager
+        self.file = None
+        self.filepath = None
+
+    def download(self, url, filepath: str):
+        self.filepath = filepath
+        self.file = open(filepath, "wb")
+
+        request = QtNetwork.QNetworkRequest()
+        request.setUrl(url)
+        request.setAttribute(
+            QtNetwork.QNetworkRequest.Attribute.RedirectPolicyAttribute,
+            QtNetwork.QNetworkRequest.RedirectPolicy.NoLessSafeRedirectPolicy,
+        )
+        reply = self.network_manager.get(request)
+        reply.readyRead.connect(self.onReadyRead)
+        reply.downloadProgress.connect(self.onProgress)
+        reply.finished.connect(self.onFinished)
+
+    def onProgress(self, bytesReceived: int, bytesTotal: int):
+        self.progress.emit(bytesReceived, bytesTotal)
+
+    def onReadyRead(self):
+        reply: QtNetwork.QNetworkReply = self.sender()
+        self.file.write(reply.readAll().data())
+
+    def onFinished(self):
+        reply: QtNetwork.QNetworkReply = self.sender()
+        reply.deleteLater()
+        self.file.write(reply.readAll().data())
+        self.file.close()
+        self.file = None
+
+        if reply.error() != QtNetwork.QNetworkReply.NetworkError.NoError:
+            os.remove(self.filepath)
+            self.failed.emit(reply.errorString())
+            return
+
+        self.complete.emit(self.filepath)
+
+
 class UnZipStep(QtCore.QObject):
     """
     unzip a file into a directory.
+
+    each member is extracted to a temporary file and moved into place once
+    complete, so an interrupted extraction never leaves a truncated database.
     """
 
-    progress = QtCore.Signal(int, int)
+    progress = QtCore.Signal("qint64", "qint64")
     complete = QtCore.Signal()
+    failed = QtCore.Signal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.CHUNK_SIZE = 1024 * 1024
 
-    def extract(self, reply: QtNetwork.QNetworkReply, destination: str):
+    def extract(self, filepath: str, destination: str):
         os.makedirs(destination, exist_ok=True)
-        buffer = io.BytesIO(reply.readAll().data())
-
-        with zipfile.ZipFile(buffer) as zip_file:
-            total_size = sum(info.file_size for info in zip_file.infolist())
-            current_size = 0
-            for info in zip_file.infolist():
-                with zip_file.open(info) as file, open(
-                    os.path.join(destination, info.filename), "wb"
-                ) as output_file:
-                    while True:
-                        chunk = file.read(self.CHUNK_SIZE)
-                        if not chunk:
-                            break
-
-                        output_file.write(chunk)
-                        current_size += len(chunk)
-                        self.progress.emit(current_size, total_size)
+
+        try:
+            with zipfile.ZipFile(filepath) as zip_file:
+                members = [info for info in zip_file.infolist() if not info.is_dir()]
+                total_size = sum(info.file_size for info in members)
+                current_size = 0
+                for info in members:
+                    output_path = os.path.join(
+                        destination, os.path.basename(info.filename)
+                    )
+                    temp_path = f"{output_path}.part"
+                    with zip_file.open(info) as file, open(
+                        temp_path, "wb"
+                    ) as output_file:
+                        while True:
+                            chunk = file.read(self.CHUNK_SIZE)
+                            if not chunk:
+                                break
+
+                            output_file.write(chunk)
+                            current_size += len(chunk)
+                            self.progress.emit(current_size, total_size)
+
+                    os.replace(temp_path, output_path)
+        except Exception as e:
+            logger.exception(f"failed to extract: {filepath}")
+            self.failed.emit(str(e))
+            return
+        finally:
+            os.remove(filepath)
+
+        self.complete.emit()
+
+
+class MigrateStep(QtCore.QObject):
+    """
+    migrate a database to the current schema version.
+    """
+
+    progress = QtCore.Signal(int, int)
+    complete = QtCore.Signal()
+    failed = QtCore.Signal(str)
+
+    connection_name = "cocktail-migrate"
+
+    def migrate(self, filepath: str):
+        connection = db_api.get_connection(
+            filepath, connection_name=self.connection_name
+        )
+        try:
+            migrations.migrate(connection, progress=self.progress.emit)
+        except Exception as e:
+            logger.exception(f"failed to migrate: {filepath}")
+            self.failed.emit(str(e))
+            return
+        finally:
+            connection.close()
+            connection = None
+            QtSql.QSqlDatabase.removeDatabase(self.connection_name)
 
         self.complete.emit()
 
@@ -88,36 +219,66 @@ class StartupController(QtCore.QObject):
 
     - Check if the database exists.
     - If not, download it and extract it.
+    - Migrate it to the current schema version.
+    - Apply any patches released since the database snapshot.
     - signal completion.
+
+    The release source is the releases api by default, it can be overridden with
+    the `database/release_source` setting, either with another url serving the
+    same json or with a local directory of release assets.
     """
 
     complete = QtCore.Signal()
     canceled = QtCore.Signal()
+    extractRequested = QtCore.Signal(str, str)
+    migrateRequested = QtCore.Signal(str)
 
     api_url = "https://api.github.com/repos/cocktail-collective/cocktail/releases"
 
-    def __init__(self, parent=None):
+    def __init__(self, release_source=None, parent=None):
         super().__init__(parent)
         self.splash = CocktailSplashScreen()
         self.wizard = SetupWizard()
         self.database_path = db_api.get_database_path()
         self.network_manager = QtNetwork.QNetworkAccessManager()
 
+        settings = QtCore.QSettings("cocktail", "cocktail")
+        self.release_source = release_source or settings.value(
+            "database/release_source", self.api_url
+        )
+        self.connection = None
+        self.database_ready = False
+        self.downloaded = False
+        self.patch_assets = {}
+        self.pending_patches = []
+
         self.get_releases_step = DownloadStep(self.network_manager)
-        self.download_db_step = DownloadStep(self.network_manager)
+        self.download_db_step = FileDownloadStep(self.network_manager)
+        self.download_patch_step = DownloadStep(self.network_manager)
         self.unzip_db_step = UnZipStep()
+        self.migrate_step = MigrateStep()
 
-        # move the unzip step to a thread so it doesn't block the ui.
+        # move the unzip and migrate steps to a thread so they don't block the ui.
         self.unzip_thread = QtCore.QThread()
         self.unzip_db_step.moveToThread(self.unzip_thread)
+        self.migrate_step.moveToThread(self.unzip_thread)
+        self.extractRequested.connect(self.unzip_db_step.extract)
+        self.migrateRequested.connect(self.migrate_step.migrate)
+        self.unzip_thread.start()
 
         self.get_releases_step.progress.connect(self.splash.setProgress)
-        self.download_db_step.progress.connect(self.splash.setProgress)
-        self.unzip_db_step.progress.connect(self.splash.setProgress)
+        self.download_db_step.progress.connect(self.onByteProgress)
+        self.unzip_db_step.progress.connect(self.onByteProgress)
+        self.migrate_step.progress.connect(self.splash.setProgress)
 
         self.get_releases_step.complete.connect(self.onReleasesReady)
         self.download_db_step.complete.connect(self.onZipDownloaded)
+        self.download_patch_step.complete.connect(self.onPatchDownloaded)
         self.unzip_db_step.complete.connect(self.onZipExtracted)
+        self.download_db_step.failed.connect(self.onBootstrapFailed)
+        self.unzip_db_step.failed.connect(self.onBootstrapFailed)
+        self.migrate_step.complete.connect(self.onMigrated)
+        self.migrate_step.failed.connect(self.onMigrationFailed)
         self.wizard.rejected.connect(self.onCanceled)
         self.wizard.accepted.connect(self.onCompleted)
 
@@ -130,51 +291,179 @@ class StartupController(QtCore.QObject):
         if os.path.exists(self.database_path):
             logger.info("checking database schema...")
             connection = db_api.get_connection(self.database_path)
-            if db_api.get_schema_version(connection) == db_api.CURRENT_SCHEMA_VERSION:
-                logger.info("database schema is up to date.")
-                self.onCompleted()
+            version = db_api.get_schema_version(connection)
+            if version == db_api.CURRENT_SCHEMA_VERSION:
+                logger.info("database schema is up to date, checking for patches.")
+                self.connection = connection
+                self.database_ready = True
+                self.requestReleases()
+                return
+            elif migrations.can_migrate(version):
+                logger.info("database schema is out of date, migrating database.")
+                self.connection = connection
+                self.migrateDatabase()
                 return
             else:
-                logger.info("database schema is out of date, downloading database.")
+                logger.info("database schema is not supported, downloading database.")
                 connection.close()
-                os.remove(self.database_path)
+                connections.remove_database(self.database_path)
         else:
             logger.info("database not found, downloading database.")
 
+        self.downloadDatabase()
+
+    def downloadDatabase(self):
         self.splash.show()
         self.splash.setText("Getting database...")
         self.splash.setProgress(0, 0)
-        self.get_releases_step.download(self.api_url)
+        self.requestReleases()
+
+    def requestReleases(self):
+        if os.path.isdir(self.release_source):
+            self.onReleasesData(list_directory_releases(self.release_source))
+        else:
+            self.get_releases_step.download(QtCore.QUrl(self.release_source))
 
     def onReleasesReady(self, reply: QtNetwork.QNetworkReply):
+        reply.deleteLater()
+        if reply.error() != QtNetwork.QNetworkReply.NetworkError.NoError:
+            logger.warning(f"failed to query releases: {reply.errorString()}")
+            if self.database_ready:
+                # offline, carry on with the database we have.
+                self.onPatchesApplied()
+            return
+
+        raw_data = reply.readAll().data().decode("utf-8")
+        self.onReleasesData(json.loads(raw_data))
+
+    def onReleasesData(self, data):
         """
         after querying the releases api, we need to find the latest release with a database asset.
         """
-        raw_data = reply.readAll().data().decode("utf-8")
-        data = json.loads(raw_data)
+        patch_assets = get_patch_assets(data)
+        if self.database_ready:
+            self.applyPatches(patch_assets)
+            return
 
+        self.patch_assets = patch_assets
         url = get_db_url(data)
 
         if url is None:
             return
 
+        directory = os.path.dirname(self.database_path)
+        os.makedirs(directory, exist_ok=True)
+
         self.splash.setText("Downloading database...")
         self.splash.setProgress(0, 0)
-        self.download_db_step.download(url)
+        self.download_db_step.download(
+            QtCore.QUrl(url), os.path.join(directory, "database.zip.part")
+        )
 
-    def onZipDownloaded(self, reply: QtNetwork.QNetworkReply):
+    def onByteProgress(self, current: int, total: int):
+        # the progress bar is limited to 32 bits, so report in KiB.
+        self.splash.setProgress(current // 1024, max(total, 0) // 1024)
+
+    def onZipDownloaded(self, filepath: str):
         """
-        after downloading the database, we need to extract it.
+        after downloading the database, we need to extract it on the unzip thread.
         """
         self.splash.setText("Extracting database...")
         self.splash.setProgress(0, 0)
-        self.unzip_db_step.extract(reply, os.path.dirname(self.database_path))
+        self.extractRequested.emit(filepath, os.path.dirname(self.database_path))
+
+    def onBootstrapFailed(self, message: str):
+        logger.error(f"failed to get database: {message}")
+        self.onCanceled()
 
     def onZipExtracted(self):
         """
-        after extracting the database, we need to show the setup wizard.
+        after extracting the database, the release may predate the current schema.
+        """
+        self.downloaded = True
+        self.migrateDatabase()
+
+    def migrateDatabase(self):
+        self.splash.show()
+        self.splash.setText("Upgrading database...")
+        self.splash.setProgress(0, 0)
+        self.migrateRequested.emit(self.database_path)
+
+    def onMigrated(self):
+        """
+        once migrated, bring the database up to date with the released patches.
+        """
+        self.database_ready = True
+        if self.downloaded:
+            self.applyPatches(self.patch_assets)
+        else:
+            self.requestReleases()
+
+    def onMigrationFailed(self, message: str):
+        if self.downloaded:
+            self.onBootstrapFailed(message)
+            return
+
+        logger.warning("failed to migrate database, downloading database.")
+        self.connection.close()
+        self.connection = None
+        connections.remove_database(self.database_path)
+        self.downloadDatabase()
+
+    def applyPatches(self, patch_assets):
+        if self.connection is None:
+            self.connection = db_api.get_connection(self.database_path)
+
+        snapshot_version = patches.get_snapshot_version(self.connection)
+        self.pending_patches = patches.select_patches(patch_assets, snapshot_version)
+
+        if not self.pending_patches:
+            logger.info(f"database snapshot {snapshot_version} is up to date.")
+            self.onPatchesApplied()
+            return
+
+        logger.info(f"applying {len(self.pending_patches)} database patches.")
+        self.splash.show()
+        self.downloadNextPatch()
+
+    def downloadNextPatch(self):
+        from_version, to_version, url = self.pending_patches[0]
+        self.splash.setText(f"Updating database to {to_version}...")
+        self.splash.setProgress(0, 0)
+        self.download_patch_step.download(QtCore.QUrl(url))
+
+    def onPatchDownloaded(self, reply: QtNetwork.QNetworkReply):
+        """
+        apply each patch as it arrives, a failed patch leaves the database at the
+        last good snapshot and the remaining models are left to the api sync.
+        """
+        reply.deleteLater()
+        from_version, to_version, url = self.pending_patches.pop(0)
+
+        try:
+            if reply.error() != QtNetwork.QNetworkReply.NetworkError.NoError:
+                raise RuntimeError(reply.errorString())
+
+            patches.apply_patch(self.connection, reply.readAll().data())
+        except Exception:
+            logger.exception(f"failed to apply patch {from_version}-{to_version}")
+            self.pending_patches = []
+
+        if self.pending_patches:
+            self.downloadNextPatch()
+        else:
+            self.onPatchesApplied()
+
+    def onPatchesApplied(self):
+        """
+        once the database is up to date, a freshly downloaded database needs the
+        setup wizard.
         """
         self.splash.close()
+        if not self.downloaded:
+            self.onCompleted()
+            return
+
         logger.info("checking paths setup...")
 
         settings = QtCore.QSettings("cocktail", "cocktail")
@@ -189,6 +478,7 @@ class StartupController(QtCore.QObject):
         """
         logger.info("startup complete.")
         self.unzip_thread.quit()
+        self.unzip_thread.wait()
         self.splash.close()
         self.complete.emit()
 
@@ -198,6 +488,7 @@ class StartupController(QtCore.QObject):
         """
         logger.info("startup canceled.")
         self.unzip_thread.quit()
+        self.unzip_thread.wait()
         self.splash.close()
         self.canceled.emit()
 
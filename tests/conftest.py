@@ -0,0 +1,7 @@
+import pytest
+from PySide6 import QtCore
+
+
+@pytest.fixture(scope="session")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
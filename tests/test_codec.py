@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from cocktail.core.database import codec
+
+GENERATION_DATA = {
+    "prompt": "portrait of a knight, " * 20,
+    "negativePrompt": "blurry, lowres",
+    "seed": 3141592653,
+    "steps": 30,
+    "cfgScale": 7.5,
+    "sampler": "DPM++ 2M Karras",
+    "resources": [{"name": "detail", "type": "lora", "weight": 0.6}],
+    "Clip skip": None,
+}
+
+
+@pytest.mark.parametrize(
+    "value",
+    [GENERATION_DATA, {"prompt": "short"}, ["castle", "forest"], [], {}, None],
+)
+def test_round_trip(value):
+    assert codec.loads(codec.encode(value).data()) == value
+
+
+def test_long_bodies_are_compressed():
+    data = bytes(codec.encode(GENERATION_DATA).data())
+    assert data[0] == codec.FORMAT_VERSION | codec.FLAG_COMPRESSED
+    assert len(data) < len(json.dumps(GENERATION_DATA)) / 2
+
+
+def test_short_bodies_are_not_compressed():
+    data = bytes(codec.encode(["castle"]).data())
+    assert data[0] == codec.FORMAT_VERSION
+
+
+def test_legacy_json():
+    assert codec.loads(json.dumps(GENERATION_DATA)) == GENERATION_DATA
+    assert codec.LazyMapping(json.dumps(GENERATION_DATA)) == GENERATION_DATA
+
+
+def test_lazy_values():
+    mapping = codec.LazyMapping(codec.encode(GENERATION_DATA))
+    assert mapping["steps"] == 30
+    assert dict(mapping) == GENERATION_DATA
+    assert codec.LazySequence(None) == []
+    assert json.loads(json.dumps(mapping, default=codec.to_json)) == GENERATION_DATA
+
+
+def test_lazy_values_keep_their_encoding():
+    data = codec.encode(GENERATION_DATA)
+    assert codec.encode(codec.LazyMapping(data)) == data
+
+
+def test_lazy_values_are_not_hashable():
+    with pytest.raises(TypeError):
+        hash(codec.LazyMapping(codec.encode({})))
+    with pytest.raises(TypeError):
+        hash(codec.LazySequence(codec.encode([])))
+
+
+def test_unknown_version():
+    with pytest.raises(ValueError):
+        codec.loads(b"\x01\x00")
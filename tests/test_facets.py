@@ -0,0 +1,74 @@
+import collections
+import os
+import random
+
+import pytest
+from PySide6 import QtSql
+
+from cocktail.core.database import api as db_api, benchmark, facets, search
+
+
+@pytest.fixture(scope="module")
+def db(app, tmp_path_factory):
+    filepath = os.path.join(tmp_path_factory.mktemp("db"), "cocktail.sqlite3")
+    db = db_api.get_connection(filepath, connection_name="test-facets")
+    random.seed(3)
+    for page in benchmark.make_pages(3, 100):
+        db_api.insert_page(db, page)
+    yield db
+    db.close()
+
+
+def _rows(db, statement, bind) -> list:
+    query = QtSql.QSqlQuery(db)
+    query.prepare(statement)
+    for key, value in bind.items():
+        query.bindValue(f":{key}", value)
+    assert query.exec(), query.lastError().text()
+
+    rows = []
+    while query.next():
+        rows.append(tuple(query.value(index) for index in range(3)))
+    query.finish()
+    return rows
+
+
+def _expected(db, facet, filters) -> list:
+    """
+    count the values of a facet over the models the search itself finds.
+    """
+    filters = dict(filters, **{facet: "All"})
+    statement, bind = search.build_search_query(
+        columns="m.id, m.type, m.category", **filters
+    )
+    counts = collections.Counter()
+    for model_id, model_type, category in _rows(db, statement, bind):
+        if facet == "model_type":
+            counts[model_type] += 1
+        elif facet == "category":
+            counts[category] += 1
+        else:
+            for base_model, *_ in _rows(
+                db,
+                "SELECT base_model, 0, 0 FROM model_base_model WHERE model_id = :id",
+                {"id": model_id},
+            ):
+                counts[base_model] += 1
+
+    return sorted(counts.items())
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {},
+        {"model_type": "LORA", "nsfw": 2},
+        {"text": "model 12"},
+        {"text": "castle", "model_type": "LORA", "base_model": "Pony"},
+        {"tags": ["style"]},
+        {"tags": ["style", "concept"], "tag_mode": "Any", "text": "forest"},
+    ],
+)
+@pytest.mark.parametrize("facet", list(facets.FACETS))
+def test_counts_match_search(db, facet, filters):
+    assert facets.facet_counts(db, facet, **filters) == _expected(db, facet, filters)
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from cocktail.core.database import api as db_api, maintenance
+
+
+@pytest.fixture
+def db(app, tmp_path):
+    db = db_api.get_connection(
+        os.path.join(tmp_path, "cocktail.sqlite3"), connection_name="test-maintenance"
+    )
+    yield db
+    db.close()
+
+
+def test_optimize_gathers_statistics_once(db, monkeypatch):
+    # the schema is analyzed as it is created.
+    maintenance._exec(db, "DROP TABLE sqlite_stat1")
+    assert not maintenance._has_statistics(db)
+    maintenance._optimize(db)
+    assert maintenance._has_statistics(db)
+
+    statements = []
+    monkeypatch.setattr(
+        maintenance, "_exec", lambda db, statement: statements.append(statement)
+    )
+    maintenance._optimize(db)
+    assert statements == []
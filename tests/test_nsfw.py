@@ -0,0 +1,41 @@
+import os
+import random
+
+import pytest
+from PySide6 import QtSql
+
+from cocktail.core.database import api as db_api, benchmark, data_classes, nsfw, util
+
+
+@pytest.fixture
+def db(app, tmp_path):
+    db = db_api.get_connection(
+        os.path.join(tmp_path, "cocktail.sqlite3"), connection_name="test-nsfw"
+    )
+    yield db
+    db.close()
+
+
+def _nsfw(db, model_id: int) -> int:
+    query = QtSql.QSqlQuery(db)
+    query.exec(f"SELECT nsfw FROM model WHERE id = {model_id}")
+    query.next()
+    value = query.value(0)
+    query.finish()
+    return value
+
+
+def test_reclassify_keeps_models_flagged_by_tags(db):
+    random.seed(0)
+    model = benchmark.make_model_json(1)
+    model.update(name="landscape", nsfwLevel=1, tags=["style", "hentai"])
+    clean = benchmark.make_model_json(2)
+    clean.update(name="landscape", nsfwLevel=1, tags=["style"])
+    db_api.insert_page(db, data_classes.deserialise_items([model, clean]))
+    assert _nsfw(db, 1) == util.NSFW_FLAGGED_LEVEL
+    assert _nsfw(db, 2) == 1
+
+    read, updated = nsfw.reclassify_nsfw(db)
+    assert (read, updated) == (2, 0)
+    assert _nsfw(db, 1) == util.NSFW_FLAGGED_LEVEL
+    assert _nsfw(db, 2) == 1
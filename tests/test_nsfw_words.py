@@ -0,0 +1,73 @@
+import pytest
+
+from cocktail.core.database import util
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "nsfw",
+        "sexy",
+        "fucking",
+        "pornographic",
+        "erotica",
+        "nudity",
+        "cumshot",
+        "breasts",
+        "Topless",
+        "asses",
+        "big ass",
+        "cock",
+        "futanari",
+        "anal_sex",
+        # embedded in compound and camel case names.
+        "realPornMix",
+        "hentaimodel",
+        "NSFWmerge",
+        "animeNipples",
+        "SexyMix",
+        "BigBreasts",
+        "BigAss",
+        "ASS",
+        "cuteBj",
+    ],
+)
+def test_flagged(text):
+    assert util.is_nsfw_text(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "class",
+        "asset",
+        "assassin",
+        "analog film",
+        "analysis",
+        "cockpit",
+        "cumulus clouds",
+        "cucumber",
+        "unisex",
+        "classic portrait",
+        # prefix and whole words are not matched inside other words.
+        "Sussex",
+        "ESSEX",
+        "philanthropy",
+        "abreast",
+        "bigbreasts",
+        "ClassicPortrait",
+        "CLASSIC",
+        "ASSET",
+        "bjorn",
+        "SuperGagaMix",
+    ],
+)
+def test_not_flagged(text):
+    assert not util.is_nsfw_text(text)
+
+
+def test_classify_nsfw():
+    assert util.classify_nsfw(1, "someone", "sexy portrait") == util.NSFW_FLAGGED_LEVEL
+    assert util.classify_nsfw(1, "someone", "classic portrait") == 1
+    assert util.classify_nsfw(16, "someone", "classic portrait") == 16
+    assert util.classify_nsfw(0, "Tipzy", "landscape") == util.NSFW_FLAGGED_LEVEL
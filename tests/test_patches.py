@@ -0,0 +1,45 @@
+import os
+import random
+
+from cocktail.core.database import api as db_api, benchmark, patches
+
+
+def _connect(tmp_path, name):
+    db = db_api.get_connection(
+        os.path.join(tmp_path, f"{name}.sqlite3"), connection_name=f"test-{name}"
+    )
+    random.seed(5)
+    for page in benchmark.make_pages(2, 50):
+        db_api.insert_page(db, page)
+    return db
+
+
+def test_patch_deletes_models_gone_upstream(app, tmp_path):
+    base = _connect(tmp_path, "base")
+    db = _connect(tmp_path, "synced")
+
+    model_ids = sorted(patches._model_ids(db))
+    deleted = model_ids[:3]
+    db.transaction()
+    db_api.delete_models(db, deleted)
+    db.commit()
+
+    _, to_version, data = patches.create_patch(db, 0, base)
+    patches.apply_patch(base, data)
+
+    assert patches._model_ids(base) == set(model_ids[3:])
+    assert patches.get_snapshot_version(base) == to_version
+
+    base.close()
+    db.close()
+
+
+def test_patch_without_base_deletes_nothing(app, tmp_path):
+    db = _connect(tmp_path, "target")
+    model_ids = patches._model_ids(db)
+
+    _, _, data = patches.create_patch(db, 0)
+    patches.apply_patch(db, data)
+
+    assert patches._model_ids(db) == model_ids
+    db.close()
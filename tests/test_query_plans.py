@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+from cocktail.core.database import api as db_api, query_plans
+
+
+@pytest.fixture(scope="module")
+def db(app, tmp_path_factory):
+    filepath = os.path.join(tmp_path_factory.mktemp("db"), "cocktail.sqlite3")
+    db = db_api.get_connection(filepath, connection_name="test-query-plans")
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize(
+    "plan", query_plans.QUERY_PLANS, ids=[plan.name for plan in query_plans.QUERY_PLANS]
+)
+def test_query_plan(db, plan):
+    assert query_plans.check_query_plans(db, [plan]) == []
@@ -0,0 +1,40 @@
+import datetime
+import os
+import random
+
+import pytest
+
+from cocktail.core.database import api as db_api, benchmark, data_classes
+
+
+@pytest.fixture
+def db(app, tmp_path):
+    db = db_api.get_connection(
+        os.path.join(tmp_path, "cocktail.sqlite3"), connection_name="test-refresh"
+    )
+    yield db
+    db.close()
+
+
+def test_empty_database_syncs_every_model(db):
+    assert db_api.get_high_water_mark(db) is None
+    assert db_api.get_refresh_period(db) is None
+
+
+def test_legacy_database_refreshes_the_last_week(db):
+    random.seed(0)
+    for page in benchmark.make_pages(1, 2):
+        db_api.insert_page(db, page)
+
+    assert db_api.get_last_refreshed(db) is None
+    assert db_api.get_refresh_period(db) == data_classes.Period.Week
+
+
+def test_refresh_interval(db):
+    db_api.set_high_water_mark(db, 1)
+    db_api.set_last_refreshed(db)
+    assert db_api.get_refresh_period(db) is None
+
+    last_refreshed = datetime.datetime.now() - datetime.timedelta(days=40)
+    db_api.set_last_refreshed(db, last_refreshed)
+    assert db_api.get_refresh_period(db) == data_classes.Period.Year
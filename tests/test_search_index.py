@@ -0,0 +1,34 @@
+import os
+import random
+
+import pytest
+
+from cocktail.core.database import api as db_api, benchmark, search
+
+
+@pytest.fixture
+def db(app, tmp_path):
+    db = db_api.get_connection(
+        os.path.join(tmp_path, "cocktail.sqlite3"), connection_name="test-search-index"
+    )
+    yield db
+    db.close()
+
+
+def _ids(db, text):
+    models, _ = search.search_models(db, 10, text=text)
+    return [model.id for model in models]
+
+
+def test_inline_null_descriptions_are_not_indexed_as_none(db):
+    random.seed(0)
+    for page in benchmark.make_pages(1, 2):
+        db_api.insert_page(db, page)
+
+    # descriptions are inline and may be NULL before the cold storage tables.
+    search._exec(db, "DROP TABLE model_description")
+    search._exec(db, "ALTER TABLE model ADD COLUMN description")
+    search.rebuild_search_index(db)
+
+    assert _ids(db, "none") == []
+    assert len(_ids(db, "model")) == 2
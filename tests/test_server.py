@@ -0,0 +1,48 @@
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from cocktail.core.database import api as db_api
+from cocktail.core.http import server
+
+
+@pytest.fixture(scope="module")
+def base_url(app, tmp_path_factory):
+    filepath = os.path.join(tmp_path_factory.mktemp("db"), "cocktail.sqlite3")
+    db_api.get_connection(filepath, connection_name="test-server").close()
+
+    catalog = server.CatalogServer(("127.0.0.1", 0), filepath, workers=2)
+    thread = threading.Thread(target=catalog.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{catalog.server_address[1]}"
+    catalog.shutdown()
+    catalog.server_close()
+
+
+def status(url: str) -> int:
+    try:
+        return urllib.request.urlopen(url).status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/models", 200),
+        ("/models/1", 404),
+        (f"/models/{2**63 - 1}", 404),
+        (f"/models/{2**63}", 404),
+        ("/models/99999999999999999999999", 404),
+        ("/models/99999999999999999999999/versions", 404),
+        ("/versions/99999999999999999999999", 404),
+        ("/files/99999999999999999999999", 404),
+        ("/models?creator_id=99999999999999999999999", 400),
+        ("/models?nsfw=-99999999999999999999999", 400),
+    ],
+)
+def test_status(base_url, path, expected):
+    assert status(base_url + path) == expected
@@ -0,0 +1,31 @@
+import os
+import queue as queue_api
+
+import pytest
+
+from cocktail.core.database import api as db_api
+from cocktail.core.database.writer import DatabaseWriter
+
+
+@pytest.fixture
+def writer(app, tmp_path):
+    writer = DatabaseWriter(
+        queue_api.Queue(), os.path.join(tmp_path, "cocktail.sqlite3")
+    )
+    yield writer
+    writer.close()
+
+
+def test_refresh_that_lost_pages_is_not_recorded(writer):
+    writer.beginRefresh()
+    writer.finish(False, True)
+    assert db_api.get_last_refreshed(writer.open()) is None
+
+    writer.beginRefresh()
+    writer.finish(False, False)
+    assert db_api.get_last_refreshed(writer.open()) is not None
+
+
+def test_sync_is_not_a_refresh(writer):
+    writer.finish(True, False)
+    assert db_api.get_last_refreshed(writer.open()) is None